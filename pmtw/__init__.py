@@ -1,5 +1,12 @@
 from pmtw.toolbox import Toolbox
+from pmtw.changes import (ConstantsChanged, NoteAdded, NoteRemoved, UserPurged,
+                          UsernotesState, diff_usernotes, usernote_changes)
+from pmtw.manager import ToolboxManager
+from pmtw.poller import RevisionPoller
+from pmtw.ratelimit import RequestScheduler
 from pmtw.settings import ToolboxSettings
-from pmtw.usernotes import ToolboxNote, ToolboxUsernotes
+from pmtw.snapshot import SnapshotStore
+from pmtw.stream import CheckpointStore, FileCheckpointStore
+from pmtw.usernotes import NoteSummary, PruneResult, ToolboxNote, ToolboxUsernotes, UsernotesBatch
 from pmtw.classic import Note, Settings, Usernotes
 from pmtw.puni import puni_Note, puni_UserNotes
@@ -0,0 +1,493 @@
+"""
+asyncio counterparts of the Toolbox classes, for use with asyncpraw.
+
+The synchronous classes do the actual work on worker threads, so decoding and
+encoding the wiki pages never blocks the event loop. Their wiki requests are
+made through a bridge which runs the equivalent asyncpraw coroutine on the
+event loop and hands the result back to the worker thread.
+"""
+
+import asyncio
+import functools
+import threading
+import weakref
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Optional
+
+import prawcore.exceptions
+from asyncpraw.models import ListingGenerator, Redditor, WikiPage
+from asyncpraw.models.util import BoundedSet, ExponentialCounter
+from asyncprawcore.exceptions import ResponseException
+
+from pmtw.constants import DEFAULT_IDENTIFIER, SETTINGS_PAGE, USERNOTES_PAGE
+from pmtw.settings import ToolboxSettings
+from pmtw.stream import CheckpointStore, WikiRevision
+from pmtw.toolbox import Toolbox
+from pmtw.usernotes import ToolboxUsernotes
+
+class _Response:
+	"""Stand-in for a requests response, to re-raise asyncprawcore errors"""
+	def __init__(self, response):
+		self.status_code = getattr(response, 'status', None)
+		self.response = response
+
+class _Bridge:
+	"""
+	Base class for the objects standing in for praw models on worker threads.
+	Runs asyncpraw coroutines on the event loop and waits for their results.
+	"""
+	def __init__(self, loop):
+		self._loop = loop
+
+	def _wait(self, coro):
+		"""
+		Run a coroutine on the event loop and wait for its result. asyncprawcore
+		response errors are re-raised as their prawcore equivalents, which is
+		what the synchronous classes handle.
+		"""
+		try:
+			asyncio.get_running_loop()
+		except RuntimeError:
+			pass
+		else:
+			coro.close()
+			raise RuntimeError("pmtw can't wait for Reddit on the event loop; run this on a worker thread")
+		try:
+			return asyncio.run_coroutine_threadsafe(coro, self._loop.loop).result()
+		except ResponseException as e:
+			error = getattr(prawcore.exceptions, type(e).__name__, prawcore.exceptions.ResponseException)
+			raise error(_Response(e.response)) from e
+
+class _Loop:
+	"""Holds the event loop a bridge was last used from"""
+	loop = None
+
+# keyed on id(), since each bridge holds its session; entries go with the bridge
+_sessions = weakref.WeakValueDictionary()
+_sessionsLock = threading.Lock()
+
+def _reddit_bridge(reddit):
+	"""The bridge for an asyncpraw session, created if there isn't one"""
+	with _sessionsLock:
+		bridge = _sessions.get(id(reddit))
+		if bridge is None: bridge = _sessions[id(reddit)] = _RedditBridge(reddit)
+		return bridge
+
+class _SubredditBridge(_Bridge):
+	"""Stands in for a praw Subreddit, backed by an asyncpraw Subreddit"""
+	def __init__(self, subreddit):
+		reddit = _reddit_bridge(subreddit._reddit)
+		super().__init__(reddit._loop)
+		self._subreddit = subreddit
+		self.display_name = subreddit.display_name
+		self.wiki = _WikiBridge(self)
+		self._reddit = reddit
+
+	def __str__(self):
+		return str(self._subreddit)
+
+class _RedditBridge(_Bridge):
+	"""
+	Stands in for `praw.Reddit`, as far as `user.me()` goes. There's one per 
+	asyncpraw session, shared by every subreddit bridge using it, so they 
+	share the session's request scheduler too.
+	"""
+	def __init__(self, reddit):
+		super().__init__(_Loop())
+		self.user = self
+		self.__reddit = reddit
+		self.__me = None
+
+	@property
+	def auth(self):
+		"""the asyncpraw session's auth, for the rate limit it last saw"""
+		return self.__reddit.auth
+
+	def me(self):
+		if self.__me is None: self.__me = self._wait(self.__reddit.user.me())
+		return self.__me
+
+class _WikiBridge(_Bridge):
+	"""Stands in for a praw SubredditWiki"""
+	def __init__(self, subreddit):
+		super().__init__(subreddit._loop)
+		self.__subreddit = subreddit._subreddit
+
+	def __getitem__(self, name):
+		return _WikiPageBridge(self, self.__subreddit, name)
+
+	def create(self, name, content, reason=None, **other_settings):
+		return self._wait(self.__subreddit.wiki.create(name=name, content=content, reason=reason, **other_settings))
+
+class _WikiPageBridge(_Bridge):
+	"""Stands in for a praw WikiPage, fetching the page on first access"""
+	def __init__(self, wiki, subreddit, name):
+		super().__init__(wiki._loop)
+		self.__subreddit = subreddit
+		self.__name = name
+		self.__page = None
+		self.mod = _WikiPageModBridge(self)
+
+	def _page(self, fetch=True):
+		if self.__page is None or (fetch and not self.__page._fetched):
+			self.__page = self._wait(self.__subreddit.wiki.get_page(self.__name, fetch=fetch))
+		return self.__page
+
+	@property
+	def content_md(self):
+		return self._page().content_md
+
+	@property
+	def revision_id(self):
+		return self._page().revision_id
+
+	def edit(self, content, reason=None, **other_settings):
+		return self._wait(self._page(fetch=False).edit(content=content, reason=reason, **other_settings))
+
+	def revisions(self, limit=None):
+		async def collect(page):
+			return [revision async for revision in page.revisions(limit=limit)]
+		return iter(self._wait(collect(self._page(fetch=False))))
+
+class _WikiPageModBridge(_Bridge):
+	"""Stands in for a praw WikiPageModeration"""
+	def __init__(self, page):
+		super().__init__(page._loop)
+		self.__page = page
+
+	def update(self, listed, permlevel, **other_settings):
+		return self._wait(self.__page._page(fetch=False).mod.update(listed=listed, permlevel=permlevel, **other_settings))
+
+
+async def async_revisions_stream(
+	sub=None,
+	page=None,
+	attribute_name: str = "id",
+	pause_after: Optional[int] = None,
+	skip_existing: bool = False,
+	checkpoint: Optional[CheckpointStore] = None,
+	checkpoint_key: Optional[str] = None,
+) -> AsyncGenerator[Any, None]:
+	"""
+	Asynchronously yield new revisions of a wikipage of a subreddit as they
+	become available. The asyncpraw counterpart of `revisions_stream`.
+
+	Parameters
+	----------
+	sub: asyncpraw.subreddit object
+		The subreddit to stream wiki revisions from
+	page: String
+		the wiki page to stream from. If it's a subpage, you should pass the
+		path in the format `<folder>/<page>`
+	pause_after: [Optional] Integer (Default: `None`)
+		An integer representing the number of requests that result in no new
+		items before this function yields `None`. See `revisions_stream`.
+	skip_existing: [Optional] Boolean (Default: False)
+		When `True`, this does not yield any results from the first request
+		thereby skipping any items that existed in the stream prior to starting
+		the stream. Ignored when resuming from a checkpoint.
+	checkpoint: [Optional] CheckpointStore (Default: `None`)
+		store to resume the stream from, and to save its progress to. See
+		`revisions_stream`.
+	checkpoint_key: [Optional] String (Default: `<subreddit>/<page>`)
+		the key to save the stream's checkpoint under
+
+	Yields
+	------
+	WikiRevision object
+	"""
+	path = f'/r/{sub.display_name}/wiki/revisions/{page}'
+	if checkpoint_key is None: checkpoint_key = f"{sub.display_name}/{page}"
+	before_attribute = None
+	if checkpoint is not None:
+		before_attribute = checkpoint.load(checkpoint_key)
+		if before_attribute is not None: skip_existing = False
+	exponential_counter = ExponentialCounter(max_counter=16)
+	seen_attributes = BoundedSet(301)
+	without_before_counter = 0
+	responses_without_new = 0
+	valid_pause_after = pause_after is not None
+	while True:
+		found = False
+		limit = 100
+		params = None
+		if before_attribute is None:
+			limit -= without_before_counter
+			without_before_counter = (without_before_counter + 1) % 30
+		else:
+			params = {"before": "WikiRevision_" + before_attribute}
+		items = [item async for item in ListingGenerator(sub._reddit, path, limit=limit, params=params)]
+		for item in reversed(items):
+			attribute = item[attribute_name]
+			if attribute in seen_attributes: continue
+			found = True
+			seen_attributes.add(attribute)
+			# the newest revision seen is the cursor for the next request
+			before_attribute = item["id"]
+			if skip_existing: continue
+			yield WikiRevision(
+				Redditor(sub._reddit, name=item["author"]["data"]["name"]),
+				item["timestamp"],
+				WikiPage(sub._reddit, sub, item["page"], revision=item["id"]),
+				item["revision_hidden"],
+				item["reason"],
+				item["id"]
+			)
+			if checkpoint is not None: checkpoint.save(checkpoint_key, item["id"])
+		if skip_existing and checkpoint is not None and before_attribute is not None:
+			checkpoint.save(checkpoint_key, before_attribute)
+		skip_existing = False
+		if valid_pause_after and pause_after < 0:
+			yield None
+		elif found:
+			exponential_counter.reset()
+			responses_without_new = 0
+		else:
+			responses_without_new += 1
+			if valid_pause_after and responses_without_new > pause_after:
+				exponential_counter.reset()
+				responses_without_new = 0
+				yield None
+			else:
+				await asyncio.sleep(exponential_counter.counter())
+
+
+def _offloaded(cls, name):
+	"""
+	Build an async method which runs the method of the same name on the
+	wrapped synchronous object on a worker thread
+	"""
+	wrapped = getattr(cls, name)
+	async def method(self, *args, **kwargs):
+		return await self._run(getattr(self.local, name), *args, **kwargs)
+	method.__name__ = name
+	method.__qualname__ = name
+	method.__doc__ = f"Awaitable version of `{cls.__name__}.{name}`, run on a worker thread.\n{wrapped.__doc__ or ''}"
+	return method
+
+class _AsyncWrapper:
+	"""
+	Base class for the async classes. Runs calls on the wrapped synchronous
+	object one at a time, on worker threads.
+	"""
+	def __init__(self, subreddit, executor):
+		self._subreddit = subreddit
+		self._bridge = _SubredditBridge(subreddit)
+		self._executor = executor
+		self._lock = asyncio.Lock()
+		self._owner = None
+
+	def __getattr__(self, name):
+		"""Read attributes and local-only methods from the wrapped object"""
+		if name in ('local', '_subreddit', '_bridge', '_executor', '_lock', '_owner'): raise AttributeError(name)
+		return getattr(self.local, name)
+
+	async def _run(self, function, *args, **kwargs):
+		"""
+		Run a synchronous call on a worker thread. Calls are serialized, except
+		within the task holding the object, e.g. inside a batch.
+		"""
+		if self._owner is not None and self._owner is asyncio.current_task():
+			return await self._offload(function, *args, **kwargs)
+		async with self._lock:
+			return await self._offload(function, *args, **kwargs)
+
+	async def _offload(self, function, *args, **kwargs):
+		loop = asyncio.get_running_loop()
+		self._bridge._loop.loop = loop
+		return await loop.run_in_executor(self._executor, functools.partial(function, *args, **kwargs))
+
+
+class AsyncToolboxUsernotes(_AsyncWrapper):
+	"""
+	asyncio counterpart of ToolboxUsernotes, taking an asyncpraw subreddit.
+	Methods which may make requests, decode the usernotes page or wait for its
+	lock are awaitable and run on a worker thread; everything else is read 
+	straight from the wrapped ToolboxUsernotes, available as `local`.
+	"""
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, settingsWarnings=[], archiveThreshold=None, snapshots=None, executor=None):
+		"""
+		Constructor for the AsyncToolboxUsernotes class. Usernotes aren't
+		loaded until `load()` is awaited.
+
+		Parameters
+		----------
+		subreddit: asyncpraw.Subreddit object
+			The asyncpraw object representing the subreddit to pull notes from
+		identifier: String
+			string to identify all actions taken in the wiki save description
+		settingsWarnings: List
+			Note types which are in Settings which may or may not be present in
+			the usernotes wiki page
+		archiveThreshold: Integer
+			Optional. see ToolboxUsernotes
+		snapshots: SnapshotStore
+			Optional. see ToolboxUsernotes
+		executor: concurrent.futures.Executor
+			Optional. executor to run work on. Defaults to the event loop's
+			default executor
+		"""
+		super().__init__(subreddit, executor)
+		self.local = ToolboxUsernotes(
+			self._bridge,
+			identifier=identifier,
+			settingsWarnings=settingsWarnings,
+			lazy=True,
+			archiveThreshold=archiveThreshold,
+			snapshots=snapshots
+		)
+		self._batch = None
+
+	def __repr__(self):
+		"""Set display for an AsyncToolboxUsernotes object"""
+		return f"AsyncToolboxUsernotes(subreddit='{self._subreddit}')"
+
+	async def _run(self, function, *args, **kwargs):
+		"""
+		Run a synchronous call on a worker thread. Calls made from within a 
+		batch block are made part of the batch, whichever thread they run on.
+		"""
+		if self._batch is not None and self._owner is asyncio.current_task():
+			return await self._offload(self.local._batched, self._batch, function, *args, **kwargs)
+		return await super()._run(function, *args, **kwargs)
+
+	@asynccontextmanager
+	async def batch(self, reason='Bulk usernote update'):
+		"""
+		Async context manager version of `ToolboxUsernotes.batch`. Usernotes are
+		refreshed on entry and saved once on exit, on a worker thread; other
+		calls on these usernotes wait until the batch is finished, except those
+		made from within the block, which are part of the batch.
+
+		Yields
+		------
+		UsernotesBatch
+			object to make edits through, and which counts them
+		"""
+		async with self._lock:
+			self._owner = asyncio.current_task()
+			try:
+				batch = await self._offload(self.local._open_batch, reason)
+				self._batch = batch
+				try:
+					yield batch
+				except BaseException:
+					await self._offload(self.local._close_batch, batch, True)
+					raise
+				await self._offload(self.local._close_batch, batch)
+			finally:
+				self._owner = None
+				self._batch = None
+
+	async def stream(self, pause_after=None, skip_existing=False, checkpoint=None):
+		"""
+		Asynchronously yields new WikiRevision objects for the usernotes page
+		as they become available. See `ToolboxUsernotes.stream`.
+		"""
+		async for revision in async_revisions_stream(self._subreddit, USERNOTES_PAGE, pause_after=pause_after, skip_existing=skip_existing, checkpoint=checkpoint):
+			yield revision
+
+for _name in (
+	'load', 'refresh', 'save', 'add', 'remove', 'prune', 'archive',
+	'list_users', 'list_notes', 'list_archived_notes', 'list_all_notes',
+	'notes_between', 'newest_notes', 'query', 'page_size', 'estimated_size',
+	'pending_size', 'headroom', 'note_size', 'user_size', 'largest_users',
+	'has_notes', 'note_summary', 'start_write_behind', 'flush', 'stop_write_behind'
+):
+	setattr(AsyncToolboxUsernotes, _name, _offloaded(ToolboxUsernotes, _name))
+
+
+class AsyncToolboxSettings(_AsyncWrapper):
+	"""
+	asyncio counterpart of ToolboxSettings, taking an asyncpraw subreddit.
+	`load`, `refresh` and `save` are awaitable and run on a worker thread.
+	Settings are read from, and changed on, the wrapped ToolboxSettings,
+	available as `local`.
+	"""
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, snapshots=None, executor=None):
+		"""
+		Constructor for the AsyncToolboxSettings class. Settings aren't loaded
+		until `load()` is awaited.
+
+		Parameters
+		----------
+		subreddit: asyncpraw.Subreddit object
+			the subreddit to use the settings of
+		identifier: String
+			string that get's appended to all wikiedit discriptions identifying
+			pmtw as the actioner. Defaults to "via pmtw"
+		snapshots: SnapshotStore
+			Optional. see ToolboxSettings
+		executor: concurrent.futures.Executor
+			Optional. executor to run work on. Defaults to the event loop's
+			default executor
+		"""
+		super().__init__(subreddit, executor)
+		self.local = ToolboxSettings(self._bridge, identifier=identifier, lazy=True, snapshots=snapshots)
+
+	def __repr__(self):
+		"""Set display for an AsyncToolboxSettings object"""
+		return f"AsyncToolboxSettings(subreddit='{self._subreddit}')"
+
+	async def stream(self, pause_after=None, skip_existing=False, checkpoint=None):
+		"""
+		Asynchronously yields new WikiRevision objects for the settings page
+		as they become available. See `ToolboxSettings.stream`.
+		"""
+		async for revision in async_revisions_stream(self._subreddit, SETTINGS_PAGE, pause_after=pause_after, skip_existing=skip_existing, checkpoint=checkpoint):
+			yield revision
+
+for _name in ('load', 'refresh', 'save'):
+	setattr(AsyncToolboxSettings, _name, _offloaded(ToolboxSettings, _name))
+
+
+class AsyncToolbox:
+	"""asyncio counterpart of Toolbox, taking an asyncpraw subreddit"""
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, snapshots=None, executor=None):
+		"""
+		Constructor for the AsyncToolbox class. Nothing is loaded until
+		`load()` is awaited.
+
+		Parameters
+		----------
+		subreddit: asyncpraw.subreddit object
+			the subreddit to use the Toolbox object with
+		identifier: String
+			string that get's appended to all wikiedit discriptions identifying
+			pmtw as the actioner. Defaults to "via pmtw"
+		snapshots: SnapshotStore
+			Optional. local store of wiki page snapshots to load settings and
+			usernotes from when they haven't changed
+		executor: concurrent.futures.Executor
+			Optional. executor to run work on. Defaults to the event loop's
+			default executor
+		"""
+		self.identifier = identifier
+		self.settings = AsyncToolboxSettings(subreddit, identifier=identifier, snapshots=snapshots, executor=executor)
+		self.usernotes = AsyncToolboxUsernotes(subreddit, identifier=identifier, snapshots=snapshots, executor=executor)
+		self.__subreddit = subreddit
+		self.__toolbox = Toolbox(self.usernotes._bridge, lazy=True, identifier=identifier)
+		self.__toolbox.settings = self.settings.local
+		self.__toolbox.usernotes = self.usernotes.local
+
+	def __repr__(self):
+		"""Set display for an AsyncToolbox object"""
+		return f"AsyncToolbox(subreddit='{self.__subreddit}')"
+
+	async def load(self):
+		"""Load settings and usernotes concurrently"""
+		await asyncio.gather(self.settings.load(), self.usernotes.load())
+		self.usernotes.local.update_warnings(self.settings.local.warnings)
+		return self
+
+	async def prune_notes(self, *args, **kwargs):
+		"""Awaitable version of `Toolbox.prune_notes`, run on a worker thread"""
+		return await self.usernotes._run(self.__toolbox.prune_notes, *args, **kwargs)
+
+	async def search_notes(self, *args, **kwargs):
+		"""Awaitable version of `Toolbox.search_notes`, run on a worker thread"""
+		return await self.usernotes._run(self.__toolbox.search_notes, *args, **kwargs)
+
+	async def export_notes(self, *args, **kwargs):
+		"""Awaitable version of `Toolbox.export_notes`, run on a worker thread"""
+		return await self.usernotes._run(self.__toolbox.export_notes, *args, **kwargs)
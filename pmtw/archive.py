@@ -0,0 +1,242 @@
+import json
+
+from prawcore.exceptions import NotFound
+
+from pmtw.codec import decode_usernotes, deflate_blob, encode_usernotes, inflate_blob
+from pmtw.constants import (ARCHIVE_PAGE, ARCHIVE_VERSION, DEFAULT_IDENTIFIER,
+                            MAX_WIKI_SIZE, USERNOTES_VERSION)
+from pmtw.ratelimit import READ, WRITE, scheduled
+
+
+class UsernotesArchive:
+	"""
+	Represents the archive wiki pages holding usernotes moved off the main 
+	usernotes page. Each archive page, `usernotes/archive/<n>`, is a complete 
+	usernotes page in its own right. The `usernotes/archive` page holds a 
+	manifest of which users have notes on which archive page, so looking up a 
+	user only fetches the pages that user is on.
+	"""
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, pageSize=MAX_WIKI_SIZE):
+		"""
+		Constructor for the UsernotesArchive class.
+
+		Parameters
+		----------
+		subreddit: praw.Subreddit object
+			The subreddit the archive belongs to
+		identifier: String
+			string to identify all actions taken in the wiki save description
+		pageSize: Integer
+			maximum size, in bytes, of an archive page
+		"""
+		self.__subreddit = subreddit
+		self.__identifier = identifier
+		self.pageSize = pageSize
+		self.__manifest = None
+		self.__pages = {}
+		self.__pageUsers = {}
+
+	def __repr__(self):
+		"""Set display for a UsernotesArchive object"""
+		return f"UsernotesArchive(subreddit='{self.__subreddit}')"
+
+	def clear(self):
+		"""Forget the cached manifest and archive pages, so they're fetched again"""
+		self.__manifest = None
+		self.__pages = {}
+		self.__pageUsers = {}
+
+	def __get_manifest(self):
+		"""
+		Private method. Returns the manifest as a dictionary of archive page 
+		number -> set of casefolded usernames, fetching it on first use.
+		"""
+		if self.__manifest is None:
+			try:
+				manifest = json.loads(self.__read(ARCHIVE_PAGE))
+				pages = inflate_blob(manifest['blob'])
+			except NotFound:
+				pages = {}
+			self.__manifest = {int(number): set(users) for number, users in pages.items()}
+		return self.__manifest
+
+	def __get_page(self, number):
+		"""
+		Private method. Returns the decoded usernotes JSON of an archive page, 
+		fetching it on first use.
+		"""
+		if number not in self.__pages:
+			try:
+				page = decode_usernotes(self.__read(f"{ARCHIVE_PAGE}/{number}"))
+			except NotFound:
+				page = {'ver': USERNOTES_VERSION, 'constants': {'users': [], 'warnings': []}, 'users': {}}
+			self.__cache_page(number, page)
+		return self.__pages[number]
+
+	def __cache_page(self, number, page):
+		"""Private method. Caches a decoded archive page and its casefolded users"""
+		self.__pages[number] = page
+		users = {}
+		for user in page['users']: users.setdefault(user.casefold(), []).append(user)
+		self.__pageUsers[number] = users
+
+	def pages(self):
+		"""
+		List the archive pages
+
+		Returns
+		-------
+		List
+			numbers of every archive page, in order
+		"""
+		return sorted(self.__get_manifest())
+
+	def has_user(self, user):
+		"""
+		Check the manifest for archived notes on a user. Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to check
+
+		Returns
+		-------
+		Bool
+			True if any archive page has notes for the user
+		"""
+		user = str(user).casefold()
+		return any(user in users for users in self.__get_manifest().values())
+
+	def notes_for(self, user):
+		"""
+		Fetch a user's archived notes. Only the archive pages the manifest lists
+		for the user are fetched. Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to fetch notes for
+
+		Returns
+		-------
+		List
+			(user, note) tuples, where note is a dictionary in the format notes 
+			are stored in the usernotes JSON, but with the mod and warning names
+			in place of their indexes
+		"""
+		user = str(user).casefold()
+		manifest = self.__get_manifest()
+		results = []
+		for number in sorted(manifest):
+			if user not in manifest[number]: continue
+			page = self.__get_page(number)
+			mods = page['constants']['users']
+			warnings = page['constants']['warnings']
+			for key in self.__pageUsers[number].get(user, []):
+				for note in page['users'][key]['ns']:
+					results.append((key, dict(note, m=mods[note['m']], w=warnings[note['w']])))
+		return results
+
+	def append(self, notes, reason='Archived usernotes'):
+		"""
+		Add notes to the archive, filling the newest archive page and starting 
+		new ones as needed, then save the manifest.
+
+		Parameters
+		----------
+		notes: List
+			(user, note) tuples, in the format returned by `notes_for`
+		reason: String
+			Optional, set a custom reason for the wiki page descriptions
+
+		Returns
+		-------
+		List
+			numbers of the archive pages written to
+
+		Raises
+		------
+		OverflowError
+			if a single note is too big for an archive page
+		"""
+		reason = f"{reason} {self.__identifier}"
+		manifest = self.__get_manifest()
+		new_manifest = not manifest
+		written = []
+		self.__write(max(manifest, default=1), notes, reason, written)
+		content = json.dumps({
+			'ver': ARCHIVE_VERSION,
+			'blob': deflate_blob({str(number): sorted(users) for number, users in manifest.items()})
+		})
+		self.__save(ARCHIVE_PAGE, content, reason, new_manifest)
+		return written
+
+	def __write(self, number, notes, reason, written):
+		"""
+		Private method. Writes notes to an archive page, moving on to a new page
+		if they don't fit, and splitting them if they don't fit on an empty page
+		either.
+		"""
+		if not notes: return
+		manifest = self.__get_manifest()
+		page = self.__get_page(number)
+		merged = self.__merge(page, notes)
+		content = encode_usernotes(merged)
+		if len(content) <= self.pageSize:
+			self.__save(f"{ARCHIVE_PAGE}/{number}", content, reason, number not in manifest)
+			self.__cache_page(number, merged)
+			manifest.setdefault(number, set()).update(user.casefold() for user, note in notes)
+			if number not in written: written.append(number)
+		elif page['users']:
+			self.__write(max(manifest, default=number) + 1, notes, reason, written)
+		elif len(notes) > 1:
+			half = len(notes) // 2
+			self.__write(number, notes[:half], reason, written)
+			self.__write(max(manifest), notes[half:], reason, written)
+		else:
+			raise OverflowError(f'Usernote on {notes[0][0]} is too big to archive')
+
+	@staticmethod
+	def __merge(page, notes):
+		"""
+		Private method. Returns a copy of a decoded archive page with notes 
+		added, converting mod and warning names to the page's own indexes. The
+		cached page itself is left untouched, in case the result doesn't fit.
+		"""
+		mods = list(page['constants']['users'])
+		warnings = list(page['constants']['warnings'])
+		mod_index = {mod: i for i, mod in reversed(list(enumerate(mods)))}
+		warning_index = {warning: i for i, warning in reversed(list(enumerate(warnings)))}
+		users = dict(page['users'])
+		keys = {}
+		for user in users: keys.setdefault(user.casefold(), user)
+		touched = set()
+		for user, note in notes:
+			if note['m'] not in mod_index:
+				mod_index[note['m']] = len(mods)
+				mods.append(note['m'])
+			if note['w'] not in warning_index:
+				warning_index[note['w']] = len(warnings)
+				warnings.append(note['w'])
+			key = keys.setdefault(user.casefold(), user)
+			if key not in touched:
+				entry = users.get(key)
+				users[key] = dict(entry, ns=list(entry['ns'])) if entry else {'ns': []}
+				touched.add(key)
+			users[key]['ns'].append(dict(note, m=mod_index[note['m']], w=warning_index[note['w']]))
+		return {'ver': USERNOTES_VERSION, 'constants': {'users': mods, 'warnings': warnings}, 'users': users}
+
+	def __read(self, name):
+		"""Private method. Downloads an archive wiki page's content"""
+		sub = self.__subreddit
+		return scheduled(sub, READ, lambda: sub.wiki[name].content_md, key=(str(sub).lower(), name, 'content'))
+
+	def __save(self, name, content, reason, new):
+		"""Private method. Saves an archive wiki page, creating it hidden if new"""
+		sub = self.__subreddit
+		if new:
+			scheduled(sub, WRITE, lambda: sub.wiki.create(name=name, content=content, reason=reason))
+			scheduled(sub, WRITE, lambda: sub.wiki[name].mod.update(listed=False, permlevel=2))
+		else:
+			scheduled(sub, WRITE, lambda: sub.wiki[name].edit(content=content, reason=reason))
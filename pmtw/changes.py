@@ -0,0 +1,239 @@
+"""
+A feed of note-level changes, computed by decoding consecutive revisions of the
+usernotes page and diffing them
+"""
+
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, List, Optional
+
+from pmtw.codec import decode_usernotes
+from pmtw.constants import USERNOTES_PAGE
+from pmtw.ratelimit import READ, scheduled
+from pmtw.stream import CheckpointStore, latest_revision, revisions_stream
+from pmtw.usernotes import ToolboxNote
+
+@dataclass
+class NoteAdded:
+	"""A note which was added to a user"""
+	revision: Any
+	user: str
+	note: ToolboxNote
+
+@dataclass
+class NoteRemoved:
+	"""A note which was removed from a user who still has other notes"""
+	revision: Any
+	user: str
+	note: ToolboxNote
+
+@dataclass
+class UserPurged:
+	"""A user whose notes were all removed"""
+	revision: Any
+	user: str
+	notes: List[ToolboxNote] = field(default_factory=list)
+
+@dataclass
+class ConstantsChanged:
+	"""The page's list of mods or warnings changed"""
+	revision: Any
+	mods: List[str]
+	warnings: List[str]
+	previousMods: List[str]
+	previousWarnings: List[str]
+
+
+class UsernotesState:
+	"""
+	Decoded usernotes at one revision, keeping the notes built for each user so
+	diffing against the next revision can reuse them for users who didn't change
+	"""
+	def __init__(self, notes=None, revision=None, previous=None):
+		"""
+		Parameters
+		----------
+		notes: Dictionary
+			Optional. decoded usernotes JSON, with a `users` section. If not set,
+			the state is an empty page
+		revision: String
+			Optional. the revision ID the notes were decoded from
+		previous: UsernotesState
+			Optional. the state of an earlier revision, to share unchanged users
+			with
+		"""
+		if notes is None: notes = {'constants': {'users': [], 'warnings': []}, 'users': {}}
+		self.revision = revision
+		self.mods = notes['constants']['users']
+		self.warnings = notes['constants']['warnings']
+		self.users = notes['users']
+		self.__built = {}
+		if previous is not None and previous.mods == self.mods and previous.warnings == self.warnings:
+			for user, entry in self.users.items():
+				older = previous.users.get(user)
+				if older is None or older != entry: continue
+				# share the earlier revision's objects, so they're only built once
+				self.users[user] = older
+				if user in previous.__built: self.__built[user] = previous.__built[user]
+
+	def __repr__(self):
+		"""Set display for a UsernotesState object"""
+		return f"UsernotesState(revision='{self.revision}', users={len(self.users)})"
+
+	def notes(self, user):
+		"""
+		Parameters
+		----------
+		user: String
+			the username, as stored on the page
+
+		Returns
+		-------
+		List
+			ToolboxNote objects for the user's notes, newest first
+		"""
+		built = self.__built.get(user)
+		if built is None:
+			built = [
+				ToolboxNote(
+					user = user,
+					note = note['n'],
+					time = note['t'],
+					mod = self.mods[note['m']],
+					warning = self.warnings[note['w']],
+					link = note['l']
+				)
+				for note in self.users[user]['ns']
+			]
+			self.__built[user] = built
+		return built
+
+	def note_keys(self, user):
+		"""
+		Parameters
+		----------
+		user: String
+			the username, as stored on the page
+
+		Returns
+		-------
+		Counter
+			the user's notes counted by timestamp and content, with mods and 
+			warnings resolved to names so revisions with different constants 
+			compare correctly
+		"""
+		return Counter(
+			(note['t'], note['n'], self.mods[note['m']], self.warnings[note['w']], note['l'])
+			for note in self.users[user]['ns']
+		)
+
+
+def diff_usernotes(before, after, revision=None):
+	"""
+	Compare two revisions of usernotes, keyed on user and note timestamp
+
+	Parameters
+	----------
+	before: UsernotesState
+		the older revision
+	after: UsernotesState
+		the newer revision
+	revision: WikiRevision
+		Optional. the revision to attach to the events
+
+	Yields
+	------
+	ConstantsChanged, UserPurged, NoteRemoved and NoteAdded objects. Constants
+	come first, then each changed user in order of username, with removals
+	before additions.
+	"""
+	if before.mods != after.mods or before.warnings != after.warnings:
+		yield ConstantsChanged(revision, after.mods, after.warnings, before.mods, before.warnings)
+	for user in sorted(before.users.keys() | after.users.keys()):
+		older = before.users.get(user)
+		newer = after.users.get(user)
+		# unchanged users are shared between states, so this is usually an identity check
+		if older is newer: continue
+		if newer is None:
+			yield UserPurged(revision, user, before.notes(user))
+			continue
+		if older is None:
+			for note in after.notes(user): yield NoteAdded(revision, user, note)
+			continue
+		olderKeys = before.note_keys(user)
+		newerKeys = after.note_keys(user)
+		if olderKeys == newerKeys: continue
+		removed = olderKeys - newerKeys
+		added = newerKeys - olderKeys
+		for note in _matching(before.notes(user), removed): yield NoteRemoved(revision, user, note)
+		for note in _matching(after.notes(user), added): yield NoteAdded(revision, user, note)
+
+def _matching(notes, keys):
+	"""the notes whose keys are counted in `keys`, consuming the counts"""
+	for note in notes:
+		key = (note.time, note.note, note.mod, note.warning, note.link)
+		if keys[key] > 0:
+			keys[key] -= 1
+			yield note
+
+def _revision_content(sub, revision, page=None):
+	"""the content of a revision of the usernotes page, through the request scheduler"""
+	if page is None: page = sub.wiki[USERNOTES_PAGE].revision(revision)
+	return scheduled(sub, READ, lambda: page.content_md, key=(str(sub).lower(), USERNOTES_PAGE, revision))
+
+def usernote_changes(
+	sub,
+	pause_after: Optional[int] = None,
+	checkpoint: Optional[CheckpointStore] = None,
+	checkpoint_key: Optional[str] = None,
+):
+	"""
+	Yield note-level changes to a subreddit's usernotes as they are made
+
+	Each new revision of the usernotes page is decoded and compared with the
+	one before it. Users whose notes didn't change between revisions share
+	their decoded notes, so only changed users are rebuilt.
+
+	Parameters
+	----------
+	sub: praw.subreddit object
+		The subreddit to follow usernotes changes for
+	pause_after: [Optional] Integer (Default: `None`)
+		passed to the revisions stream; `None` is yielded whenever the stream
+		pauses
+	checkpoint: [Optional] CheckpointStore (Default: `None`)
+		store to resume from after a restart, and to save progress to. If no
+		checkpoint is saved, changes are followed from the page's current
+		revision
+	checkpoint_key: [Optional] String (Default: `<subreddit>/usernotes/changes`)
+		the key to save the checkpoint under
+
+	Yields
+	------
+	NoteAdded, NoteRemoved, UserPurged and ConstantsChanged objects, in
+	revision order
+	"""
+	if checkpoint is None: checkpoint = CheckpointStore()
+	if checkpoint_key is None: checkpoint_key = f"{sub.display_name}/{USERNOTES_PAGE}/changes"
+	start = checkpoint.load(checkpoint_key)
+	if start is None:
+		latest = latest_revision(sub, USERNOTES_PAGE)
+		if latest is not None:
+			start = latest["id"]
+			checkpoint.save(checkpoint_key, start)
+	state = UsernotesState()
+	if start is not None:
+		state = UsernotesState(decode_usernotes(_revision_content(sub, start)), start)
+	for revision in revisions_stream(
+		sub=sub,
+		page=USERNOTES_PAGE,
+		pause_after=pause_after,
+		checkpoint=checkpoint,
+		checkpoint_key=checkpoint_key
+	):
+		if revision is None:
+			yield None
+			continue
+		newer = UsernotesState(decode_usernotes(_revision_content(sub, revision.id, revision.page)), revision.id, state)
+		yield from diff_usernotes(state, newer, revision)
+		state = newer
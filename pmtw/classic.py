@@ -79,7 +79,7 @@ class Usernotes:
 		return l
 
 	def push_usernotes(self, reason='"Batch usernote update"', truncate=False):
-		self.__ToolboxUsernotes.save(reason=reason)
+		self.__ToolboxUsernotes.save(reason=reason, force=True)
 	
 	def warnings_types(self, local=True):
 		if local == False: self.__ToolboxUsernotes.load()
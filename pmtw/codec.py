@@ -0,0 +1,78 @@
+"""
+Encoding and decoding of the compressed blob toolbox stores usernotes in
+"""
+
+import base64
+import copy
+import json
+import zlib
+
+def inflate_blob(blob):
+	"""
+	Decompress the blob portion of a usernotes page
+
+	Parameters
+	----------
+	blob: String
+		base64 encoded, zlib compressed JSON
+
+	Returns
+	-------
+	Dictionary
+		the users section of the usernotes JSON
+	"""
+	return json.loads(zlib.decompress(base64.b64decode(blob)).decode('utf-8'))
+
+def deflate_blob(users):
+	"""
+	Compress the users section of usernotes into a blob, per toolbox's 
+	compression methods
+
+	Parameters
+	----------
+	users: Dictionary
+		the users section of the usernotes JSON
+
+	Returns
+	-------
+	String
+		base64 encoded, zlib compressed JSON
+	"""
+	return base64.b64encode(zlib.compress(json.dumps(users).encode('utf-8'), 9)).decode('utf-8')
+
+def decode_usernotes(content):
+	"""
+	Decode the content of a usernotes wiki page
+
+	Parameters
+	----------
+	content: String
+		the wiki page content
+
+	Returns
+	-------
+	Dictionary
+		the usernotes JSON, with the blob expanded into a `users` section
+	"""
+	notes = json.loads(content)
+	notes['users'] = inflate_blob(notes.pop('blob'))
+	return notes
+
+def encode_usernotes(notes):
+	"""
+	Encode usernotes JSON as the content of a usernotes wiki page
+
+	Parameters
+	----------
+	notes: Dictionary
+		the usernotes JSON, with a `users` section
+
+	Returns
+	-------
+	String
+		the wiki page content, with the users section compressed into a blob
+	"""
+	compressed_json = copy.copy(notes)
+	compressed_json.pop('users', None)
+	compressed_json['blob'] = deflate_blob(notes['users'])
+	return json.dumps(compressed_json)
@@ -5,3 +5,5 @@ USERNOTES_PAGE = "usernotes"
 SETTINGS_PAGE = "toolbox"
 MAX_WIKI_SIZE = 1048576
 DEFAULT_IDENTIFIER = "via pmtw"
+ARCHIVE_PAGE = "usernotes/archive"
+ARCHIVE_VERSION = 1
@@ -0,0 +1,132 @@
+import csv
+import gzip
+import heapq
+import io
+import json
+import os
+import tempfile
+from itertools import islice
+from operator import attrgetter
+
+# ToolboxNote attributes which can be exported
+EXPORT_FIELDS = ["user", "note", "warning", "time", "mod", "link", "url", "human_time"]
+
+EXPORT_FORMATS = ["csv", "jsonl"]
+
+
+def _sort_key(index):
+	"""sort key for a row field which may hold None mixed in with other values"""
+	return lambda row: (row[index] is not None, row[index])
+
+
+def _merge_sorted(rows, key, chunkSize):
+	"""
+	Sort rows while holding at most chunkSize of them in memory. Rows are split
+	into sorted runs which are spilled to temporary files, then the runs are 
+	merged back together.
+	"""
+	runs = []
+	try:
+		while True:
+			chunk = list(islice(rows, chunkSize))
+			if not chunk: break
+			chunk.sort(key=key)
+			run = tempfile.TemporaryFile(mode='w+', encoding='utf-8')
+			runs.append(run)
+			for row in chunk: run.write(json.dumps(row) + "\n")
+			run.seek(0)
+		yield from heapq.merge(*[(json.loads(line) for line in run) for run in runs], key=key)
+	finally:
+		for run in runs: run.close()
+
+
+def _is_text(file):
+	"""whether a file-like object expects str rather than bytes"""
+	if isinstance(file, io.TextIOBase): return True
+	if isinstance(file, (io.RawIOBase, io.BufferedIOBase)): return False
+	return 'b' not in getattr(file, 'mode', 'b')
+
+
+def export_notes(notes, file, fields=EXPORT_FIELDS, format="csv", compress=False, sortKey=None, chunkSize=10000):
+	"""
+	Stream notes out to a file, writing each row as soon as it's produced.
+
+	Parameters
+	----------
+	notes: Iterable
+		ToolboxNotes to export, e.g. from `ToolboxUsernotes.iter_notes()` or 
+		`ToolboxUsernotes.query()`
+	file: String, file-like object
+		path to write to, or an open file-like object. Compressed output needs 
+		a binary file-like object; file-like objects are left open.
+	fields: List
+		ToolboxNote attributes to export, in order. Defaults to all of them
+	format: String
+		one of: csv, jsonl
+	compress: Bool
+		if True, gzip the output
+	sortKey: String
+		Optional. field to sort rows by. Without it, rows are written in the 
+		order the notes are produced. Sorting is done by merging sorted runs 
+		spilled to temporary files, so at most `chunkSize` rows are held in 
+		memory.
+	chunkSize: Integer
+		number of rows per sorted run when sorting
+
+	Returns
+	-------
+	Integer
+		the number of notes exported
+
+	Raises
+	------
+	ValueError
+		* when a field or the sortKey is not an exportable ToolboxNote attribute
+		* when format is invalid
+		* when compressing to a text file-like object
+	"""
+	for field in fields:
+		if field not in EXPORT_FIELDS: raise ValueError(f"{field} is not a valid export field")
+	if format not in EXPORT_FORMATS: raise ValueError(f"{format} is not a valid export format. format options are {EXPORT_FORMATS}")
+	if sortKey is not None and sortKey not in fields: raise ValueError(f"{sortKey} is not one of the exported fields")
+
+	getters = [attrgetter(field) for field in fields]
+	rows = ([getter(note) for getter in getters] for note in notes)
+	if sortKey is not None: rows = _merge_sorted(rows, _sort_key(fields.index(sortKey)), chunkSize)
+
+	if isinstance(file, (str, os.PathLike)):
+		with (gzip.open(file, 'wt', encoding='utf-8', newline='') if compress else open(file, 'w', encoding='utf-8', newline='')) as text:
+			return _write_rows(rows, text, fields, format)
+
+	if compress:
+		if _is_text(file): raise ValueError("compressed exports need a binary file-like object")
+		with gzip.GzipFile(fileobj=file, mode='wb') as binary:
+			return _write_wrapped(rows, binary, fields, format)
+	if _is_text(file): return _write_rows(rows, file, fields, format)
+	return _write_wrapped(rows, file, fields, format)
+
+
+def _write_wrapped(rows, binary, fields, format):
+	"""write rows to a binary stream, without closing it"""
+	text = io.TextIOWrapper(binary, encoding='utf-8', newline='')
+	try:
+		return _write_rows(rows, text, fields, format)
+	finally:
+		text.flush()
+		text.detach()
+
+
+def _write_rows(rows, text, fields, format):
+	"""write rows to a text stream in the given format, returning the row count"""
+	count = 0
+	if format == "csv":
+		writer = csv.writer(text)
+		writer.writerow(fields)
+		for row in rows:
+			writer.writerow(row)
+			count += 1
+	else:
+		for row in rows:
+			text.write(json.dumps(dict(zip(fields, row))) + "\n")
+			count += 1
+	return count
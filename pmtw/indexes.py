@@ -0,0 +1,315 @@
+import heapq
+import json
+from bisect import bisect_left, bisect_right
+
+
+class TimeIndex:
+	"""
+	Time-ordered index over decoded usernotes. Each note is represented by a 
+	(timestamp, user) pair, kept sorted so time-range queries can bisect to 
+	their start instead of scanning every note.
+	"""
+	def __init__(self, users=None):
+		"""
+		Constructor for the TimeIndex class.
+
+		Parameters
+		----------
+		users: Dictionary
+			Optional. the `users` section of the decoded usernotes JSON to build
+			the index from
+		"""
+		self.__keys = []
+		self.__times = []
+		if users:
+			self.__keys = sorted((note['t'], user) for user, entry in users.items() for note in entry['ns'])
+			self.__times = [key[0] for key in self.__keys]
+
+	def __len__(self):
+		"""number of notes in the index"""
+		return len(self.__keys)
+
+	def __repr__(self):
+		"""Set display for a TimeIndex object"""
+		return f"TimeIndex(notes={len(self.__keys)})"
+
+	def add(self, time, user):
+		"""
+		Add a note to the index
+
+		Parameters
+		----------
+		time: Integer
+			the note's timestamp
+		user: String
+			the wiki key of the user the note is on
+		"""
+		i = bisect_right(self.__keys, (time, user))
+		self.__keys.insert(i, (time, user))
+		self.__times.insert(i, time)
+
+	def remove(self, time, user):
+		"""
+		Remove a note from the index
+
+		Parameters
+		----------
+		time: Integer
+			the note's timestamp
+		user: String
+			the wiki key of the user the note is on
+
+		Raises
+		------
+		KeyError
+			if the note isn't in the index
+		"""
+		i = bisect_left(self.__keys, (time, user))
+		if i == len(self.__keys) or self.__keys[i] != (time, user):
+			raise KeyError(f"no note timestamped {time} for {user} in the index")
+		del self.__keys[i]
+		del self.__times[i]
+
+	def between(self, after=None, before=None, reverse=False, start=None):
+		"""
+		Yields the (timestamp, user) pairs of notes strictly between two times
+
+		Parameters
+		----------
+		after: Integer
+			Optional. only yield notes newer than this unix timestamp
+		before: Integer
+			Optional. only yield notes older than this unix timestamp
+		reverse: Bool
+			if True, yield newest notes first
+		start: Tuple
+			Optional. a (timestamp, user) pair to start from, inclusive. Pairs 
+			before it, in the direction of iteration, are skipped.
+
+		Yields
+		------
+		Tuple
+			(timestamp, user) for each note in the range
+		"""
+		low = 0 if after is None else bisect_right(self.__times, after)
+		high = len(self.__times) if before is None else bisect_left(self.__times, before)
+		if start is not None:
+			if reverse: high = min(high, bisect_right(self.__keys, start))
+			else: low = max(low, bisect_left(self.__keys, start))
+		positions = range(high - 1, low - 1, -1) if reverse else range(low, high)
+		for i in positions:
+			yield self.__keys[i]
+
+
+class SizeIndex:
+	"""
+	Size accounting over decoded usernotes. Caches the serialized length of 
+	each user's entry in the blob, and estimates the size of the encoded page 
+	from a compression ratio calibrated against a known encoding, so the page
+	size can be tracked through edits without recompressing it.
+	"""
+	def __init__(self, users):
+		"""
+		Constructor for the SizeIndex class.
+
+		Parameters
+		----------
+		users: Dictionary
+			the `users` section of the decoded usernotes JSON. The index keeps a
+			reference to it, so changes made to it must be reported to `touch`
+		"""
+		self.__users = users
+		self.__sizes = {user: entry_size(user, entry) for user, entry in users.items()}
+		self.__total = sum(self.__sizes.values())
+		self.__stale = set()
+		self.pageSize = 0
+		self.ratio = 1.0
+		self.__rawBase = 0
+		self.__overheadBase = 0
+
+	def __repr__(self):
+		"""Set display for a SizeIndex object"""
+		return f"SizeIndex(users={len(self.__users)}, ratio={self.ratio:.3f})"
+
+	def touch(self, user):
+		"""
+		Mark a user's entry as changed, so its size is measured again the next
+		time it's needed
+
+		Parameters
+		----------
+		user: String
+			the wiki key of the user that was changed, added or removed
+		"""
+		size = self.__sizes.pop(user, None)
+		if size is not None: self.__total -= size
+		self.__stale.add(user)
+
+	def __refresh(self):
+		"""Private method. Measures every entry changed since the last call"""
+		for user in self.__stale:
+			entry = self.__users.get(user)
+			if entry is None: continue
+			self.__sizes[user] = entry_size(user, entry)
+			self.__total += self.__sizes[user]
+		self.__stale.clear()
+
+	def raw_size(self):
+		"""
+		Returns
+		-------
+		Integer
+			length of the users section serialized as JSON, before compression
+		"""
+		self.__refresh()
+		return self.__total if self.__sizes else 2
+
+	def user_size(self, user):
+		"""
+		Parameters
+		----------
+		user: String
+			the wiki key of the user
+
+		Returns
+		-------
+		Integer
+			length of the user's serialized entry, or 0 if the user has no notes
+		"""
+		self.__refresh()
+		return self.__sizes.get(user, 0)
+
+	def largest(self, count):
+		"""
+		Parameters
+		----------
+		count: Integer
+			number of users to return
+
+		Returns
+		-------
+		List
+			(user, serialized length) pairs for the biggest entries, biggest 
+			first
+		"""
+		self.__refresh()
+		return heapq.nlargest(count, self.__sizes.items(), key=lambda item: item[1])
+
+	def calibrate(self, pageSize, blobSize, overhead):
+		"""
+		Record a known encoding of the usernotes as the base for estimates
+
+		Parameters
+		----------
+		pageSize: Integer
+			length of the encoded wiki page
+		blobSize: Integer
+			length of the blob within the encoded page
+		overhead: Integer
+			length of the page outside the blob, as it's currently serialized
+		"""
+		self.pageSize = pageSize
+		self.__rawBase = self.raw_size()
+		self.__overheadBase = overhead
+		self.ratio = blobSize / self.__rawBase
+
+	def estimate(self, overhead, raw=0):
+		"""
+		Estimate the length of the encoded page
+
+		Parameters
+		----------
+		overhead: Integer
+			length of the page outside the blob, as it's currently serialized
+		raw: Integer
+			Optional. serialized bytes to add to the users section on top of 
+			its current contents, to estimate the page after an edit
+
+		Returns
+		-------
+		Integer
+			estimated length of the encoded wiki page, in bytes
+		"""
+		raw = self.raw_size() + raw - self.__rawBase
+		return round(self.pageSize + raw * self.ratio + overhead - self.__overheadBase)
+
+class SummaryIndex:
+	"""
+	Per-user summaries of decoded usernotes for answering "does this user 
+	have notes" quickly: each user's note count and newest note, computed 
+	when the index is built and again after their entry changes.
+	"""
+	def __init__(self, users):
+		"""
+		Constructor for the SummaryIndex class.
+
+		Parameters
+		----------
+		users: Dictionary
+			the `users` section of the decoded usernotes JSON. The index keeps a
+			reference to it, so changes made to it must be reported to `touch`
+		"""
+		self.__users = users
+		self.__summaries = {user: self.__summarize(entry) for user, entry in users.items()}
+
+	def __repr__(self):
+		"""Set display for a SummaryIndex object"""
+		return f"SummaryIndex(users={len(self.__users)})"
+
+	@staticmethod
+	def __summarize(entry):
+		"""Private method. (count, newest timestamp, newest warning index) for an entry"""
+		newest = max(entry['ns'], key=lambda note: note['t'], default=None)
+		if newest is None: return 0, None, None
+		return len(entry['ns']), newest['t'], newest['w']
+
+	def touch(self, user):
+		"""
+		Mark a user's entry as changed, so its summary is computed again the 
+		next time it's needed
+
+		Parameters
+		----------
+		user: String
+			the wiki key of the user that was changed, added or removed
+		"""
+		self.__summaries.pop(user, None)
+
+	def summary(self, user):
+		"""
+		Parameters
+		----------
+		user: String
+			the wiki key of the user
+
+		Returns
+		-------
+		Tuple
+			the user's note count, newest note timestamp and newest note 
+			warning index, or None if the user has no notes
+		"""
+		summary = self.__summaries.get(user)
+		if summary is None:
+			entry = self.__users.get(user)
+			if entry is None: return None
+			summary = self.__summaries[user] = self.__summarize(entry)
+		return summary if summary[0] else None
+
+def entry_size(user, entry):
+	"""
+	Length of a user's entry serialized as part of the users section, counting
+	its key and the separator that follows it
+
+	Parameters
+	----------
+	user: String
+		the wiki key of the user
+	entry: Dictionary
+		the user's entry, containing the `ns` list of notes
+
+	Returns
+	-------
+	Integer
+		serialized length of the entry
+	"""
+	return len(json.dumps(user)) + len(json.dumps(entry)) + 4
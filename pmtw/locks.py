@@ -0,0 +1,97 @@
+"""
+Locking for objects shared between threads which are read far more often than
+they're written
+"""
+
+import threading
+from contextlib import contextmanager
+
+class ReadWriteLock:
+	"""
+	A lock which many readers can hold at once, or one writer on its own.
+	Writers waiting for the lock hold back new readers, so a steady stream of
+	reads can't starve them. Both sides are reentrant, and a thread holding the
+	write lock may also take the read lock; a thread holding only the read lock
+	can't take the write lock, since two readers doing so would deadlock.
+	"""
+	def __init__(self):
+		"""Constructor for the ReadWriteLock class."""
+		self.__condition = threading.Condition(threading.Lock())
+		self.__readers = {}
+		self.__writer = None
+		self.__writes = 0
+		self.__waitingWriters = 0
+
+	def __repr__(self):
+		"""Set display for a ReadWriteLock object"""
+		return f"ReadWriteLock(readers={len(self.__readers)}, writing={self.__writer is not None})"
+
+	def acquire_read(self):
+		"""Wait until no writer holds or is waiting for the lock, then hold it for reading"""
+		me = threading.get_ident()
+		with self.__condition:
+			# a thread already inside doesn't queue behind waiting writers
+			if self.__writer != me and me not in self.__readers:
+				while self.__writer is not None or self.__waitingWriters:
+					self.__condition.wait()
+			self.__readers[me] = self.__readers.get(me, 0) + 1
+
+	def release_read(self):
+		"""Release a hold for reading"""
+		me = threading.get_ident()
+		with self.__condition:
+			count = self.__readers[me] - 1
+			if count: self.__readers[me] = count
+			else:
+				del self.__readers[me]
+				if not self.__readers: self.__condition.notify_all()
+
+	def acquire_write(self):
+		"""
+		Wait until no other thread holds the lock, then hold it for writing
+
+		Raises
+		------
+		RuntimeError
+			if the thread holds the lock for reading only
+		"""
+		me = threading.get_ident()
+		with self.__condition:
+			if self.__writer == me:
+				self.__writes += 1
+				return
+			if me in self.__readers: raise RuntimeError("A read lock can't be upgraded to a write lock")
+			self.__waitingWriters += 1
+			try:
+				while self.__writer is not None or self.__readers:
+					self.__condition.wait()
+			finally:
+				self.__waitingWriters -= 1
+			self.__writer = me
+			self.__writes = 1
+
+	def release_write(self):
+		"""Release a hold for writing"""
+		with self.__condition:
+			self.__writes -= 1
+			if self.__writes == 0:
+				self.__writer = None
+				self.__condition.notify_all()
+
+	@contextmanager
+	def read(self):
+		"""Context manager holding the lock for reading"""
+		self.acquire_read()
+		try:
+			yield self
+		finally:
+			self.release_read()
+
+	@contextmanager
+	def write(self):
+		"""Context manager holding the lock for writing"""
+		self.acquire_write()
+		try:
+			yield self
+		finally:
+			self.release_write()
@@ -0,0 +1,206 @@
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+
+from pmtw.constants import DEFAULT_IDENTIFIER
+from pmtw.settings import ToolboxSettings
+from pmtw.toolbox import Toolbox
+from pmtw.usernotes import ToolboxUsernotes
+
+
+class ToolboxManager:
+	"""
+	Loads Toolbox instances for many subreddits concurrently. Each subreddit's
+	settings and usernotes pages are fetched in parallel on a bounded thread 
+	pool, and each subreddit gets a Future which completes as soon as both of 
+	its pages are loaded, or fails on its own if either can't be.
+	"""
+	def __init__(self, subreddits=[], maxWorkers=8, identifier=DEFAULT_IDENTIFIER, snapshots=None):
+		"""
+		Constructor for the ToolboxManager class.
+
+		Parameters
+		----------
+		subreddits: List
+			Optional. praw.subreddit objects to start loading straight away
+		maxWorkers: Integer
+			Optional. maximum number of pages to fetch at once, defaults to 8
+		identifier: String
+			string that get's appended to all wikiedit discriptions identifying
+			pmtw as the actioner. Defaults to "via pmtw"
+		snapshots: SnapshotStore
+			Optional. local store of wiki page snapshots shared by every 
+			subreddit's Toolbox
+		"""
+		self.identifier = identifier
+		self.snapshots = snapshots
+		self.__executor = ThreadPoolExecutor(max_workers=maxWorkers, thread_name_prefix="pmtw")
+		self.__futures = {}
+		self.__lock = threading.Lock()
+		for subreddit in subreddits: self.load(subreddit)
+
+	def __repr__(self):
+		"""Set display for a ToolboxManager object"""
+		return f"ToolboxManager(subreddits={len(self.__futures)})"
+
+	def __len__(self):
+		"""number of subreddits managed"""
+		return len(self.__futures)
+
+	def __contains__(self, subreddit):
+		"""whether a subreddit is managed. Case-insensitive"""
+		return str(subreddit).lower() in self.__futures
+
+	def __getitem__(self, subreddit):
+		"""the Toolbox for a subreddit, waiting for it to load if needed"""
+		return self.get(subreddit)
+
+	def __enter__(self):
+		return self
+
+	def __exit__(self, *exc):
+		self.close()
+
+	def load(self, subreddit, reload=False):
+		"""
+		Start loading a subreddit's settings and usernotes, each on its own 
+		worker thread.
+
+		Parameters
+		----------
+		subreddit: praw.subreddit object
+			subreddit to load
+		reload: Bool
+			Optional. if True, load the subreddit again even if it's already 
+			been loaded
+
+		Returns
+		-------
+		Future
+			completes with the subreddit's Toolbox once both pages have loaded,
+			or with the exception raised loading either of them
+		"""
+		key = str(subreddit).lower()
+		with self.__lock:
+			if key in self.__futures and not reload: return self.__futures[key]
+			future = Future()
+			future.set_running_or_notify_cancel()
+			self.__futures[key] = future
+
+		toolbox = Toolbox(subreddit, lazy=True, identifier=self.identifier, snapshots=self.snapshots)
+		settings = ToolboxSettings(subreddit, identifier=self.identifier, lazy=True, snapshots=self.snapshots)
+		usernotes = ToolboxUsernotes(subreddit, identifier=self.identifier, lazy=True, snapshots=self.snapshots)
+		pages = [self.__executor.submit(settings.load), self.__executor.submit(usernotes.load)]
+		remaining = [len(pages)]
+
+		def page_done(done):
+			with self.__lock:
+				remaining[0] -= 1
+				if remaining[0]: return
+			try:
+				for page in pages:
+					if page.exception() is not None: raise page.exception()
+				usernotes.update_warnings(settings.warnings)
+				toolbox.settings = settings
+				toolbox.usernotes = usernotes
+			except BaseException as e:
+				future.set_exception(e)
+			else:
+				future.set_result(toolbox)
+
+		for page in pages: page.add_done_callback(page_done)
+		return future
+
+	def future(self, subreddit):
+		"""
+		Parameters
+		----------
+		subreddit: String, praw.subreddit object
+			subreddit to get the Future for. Case-insensitive
+
+		Returns
+		-------
+		Future
+			the Future returned when the subreddit was loaded
+
+		Raises
+		------
+		KeyError
+			if the subreddit isn't managed
+		"""
+		return self.__futures[str(subreddit).lower()]
+
+	def get(self, subreddit, timeout=None):
+		"""
+		Get a subreddit's Toolbox, waiting for it to load if needed.
+
+		Parameters
+		----------
+		subreddit: String, praw.subreddit object
+			subreddit to get the Toolbox for. Case-insensitive
+		timeout: Float
+			Optional. seconds to wait before giving up
+
+		Returns
+		-------
+		Toolbox
+			the subreddit's Toolbox
+
+		Raises
+		------
+		KeyError
+			if the subreddit isn't managed
+		Exception
+			whatever was raised loading the subreddit's pages
+		"""
+		return self.future(subreddit).result(timeout)
+
+	def as_completed(self, timeout=None):
+		"""
+		Yields subreddits as they finish loading, successfully or not.
+
+		Parameters
+		----------
+		timeout: Float
+			Optional. seconds to wait for all subreddits before raising 
+			TimeoutError
+
+		Yields
+		------
+		Tuple
+			(subreddit name, Future) for each subreddit, in order of completion
+		"""
+		with self.__lock: names = {future: name for name, future in self.__futures.items()}
+		for future in as_completed(names, timeout):
+			yield names[future], future
+
+	def toolboxes(self):
+		"""
+		Returns
+		-------
+		Dictionary
+			subreddit name -> Toolbox for every subreddit loaded successfully so
+			far
+		"""
+		with self.__lock: futures = list(self.__futures.items())
+		return {name: future.result() for name, future in futures if future.done() and future.exception() is None}
+
+	def failures(self):
+		"""
+		Returns
+		-------
+		Dictionary
+			subreddit name -> exception for every subreddit which failed to load
+		"""
+		with self.__lock: futures = list(self.__futures.items())
+		return {name: future.exception() for name, future in futures if future.done() and future.exception() is not None}
+
+	def close(self, wait=True):
+		"""
+		Shut down the worker threads.
+
+		Parameters
+		----------
+		wait: Bool
+			Optional. if True, wait for pages already being loaded to finish
+		"""
+		self.__executor.shutdown(wait=wait)
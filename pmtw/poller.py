@@ -0,0 +1,283 @@
+"""
+A single scheduler for watching wiki pages on many subreddits
+"""
+
+import heapq
+import logging
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+
+from praw.models import ListingGenerator
+from praw.models.util import BoundedSet
+
+from pmtw.ratelimit import POLL, scheduled
+from pmtw.stream import WikiRevision
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class PollState:
+	"""Scheduling state for one subreddit watched by a RevisionPoller"""
+	subreddit: Any
+	handlers: Dict[str, List[Any]] = field(default_factory=dict)
+	cursor: Optional[str] = None
+	rate: float = 0.0
+	interval: float = 0.0
+	lastPoll: Optional[float] = None
+	nextPoll: float = 0.0
+	skipExisting: bool = False
+	seen: Any = field(default_factory=lambda: BoundedSet(301))
+	failures: int = 0
+	lastError: Optional[BaseException] = None
+
+	@property
+	def name(self):
+		"""the subreddit's name, lowercased"""
+		return str(self.subreddit).lower()
+
+
+class RevisionPoller:
+	"""
+	Watches wiki pages on many subreddits with one request per subreddit per
+	poll. Each poll reads the subreddit-wide wiki revisions listing, and hands
+	the new revisions of watched pages to their handlers. How often each
+	subreddit is polled follows its observed edit rate, and all polling is kept
+	within a global request budget.
+	"""
+	def __init__(self, budget=30, minInterval=5, maxInterval=600, checkpoint=None, smoothing=0.3):
+		"""
+		Constructor for the RevisionPoller class.
+
+		Parameters
+		----------
+		budget: Float
+			Optional. maximum number of requests per minute across all
+			subreddits, defaults to 30
+		minInterval: Float
+			Optional. minimum seconds between polls of one subreddit
+		maxInterval: Float
+			Optional. maximum seconds between polls of one subreddit
+		checkpoint: CheckpointStore
+			Optional. store to resume each subreddit's polling from, and to save
+			its progress to
+		smoothing: Float
+			Optional. weight given to the latest poll when updating a
+			subreddit's estimated edit rate, between 0 and 1
+		"""
+		self.budget = budget
+		self.minInterval = minInterval
+		self.maxInterval = maxInterval
+		self.checkpoint = checkpoint
+		self.smoothing = smoothing
+		self.__states = {}
+		self.__queue = []
+
+	def __repr__(self):
+		"""Set display for a RevisionPoller object"""
+		return f"RevisionPoller(subreddits={len(self.__states)})"
+
+	def watch(self, subreddit, page, handler, skipExisting=False):
+		"""
+		Register a handler for new revisions of a wiki page
+
+		Parameters
+		----------
+		subreddit: praw.subreddit object
+			the subreddit the page belongs to
+		page: String
+			the wiki page to watch, e.g. `usernotes` or `toolbox`
+		handler: Callable
+			called with a WikiRevision for every new revision of the page,
+			oldest first
+		skipExisting: Bool
+			Optional. if True and the subreddit isn't already watched, revisions
+			made before the first poll aren't handed to handlers. Ignored when
+			resuming from a checkpoint
+		"""
+		key = str(subreddit).lower()
+		state = self.__states.get(key)
+		if state is None:
+			state = PollState(subreddit, skipExisting=skipExisting)
+			if self.checkpoint is not None:
+				state.cursor = self.checkpoint.load(self.__checkpoint_key(state))
+				if state.cursor is not None: state.skipExisting = False
+			# start out polling often, and slow down as quiet polls come in
+			state.rate = 1 / self.minInterval
+			state.nextPoll = time.monotonic()
+			self.__states[key] = state
+			heapq.heappush(self.__queue, (state.nextPoll, key))
+		state.handlers.setdefault(page, []).append(handler)
+
+	def unwatch(self, subreddit, page=None):
+		"""
+		Stop watching a page, or every page of a subreddit
+
+		Parameters
+		----------
+		subreddit: String, praw.subreddit object
+			the subreddit to stop watching
+		page: String
+			Optional. the page to stop watching. If not set, the whole subreddit
+			is dropped
+		"""
+		key = str(subreddit).lower()
+		state = self.__states.get(key)
+		if state is None: return
+		if page is not None: state.handlers.pop(page, None)
+		if page is None or not state.handlers: del self.__states[key]
+
+	def __checkpoint_key(self, state):
+		"""Private method. Checkpoint key for a subreddit's revisions listing"""
+		return f"{state.subreddit.display_name}/wiki/revisions"
+
+	def poll(self, subreddit):
+		"""
+		Poll one subreddit now, handing new revisions of watched pages to their
+		handlers
+
+		Parameters
+		----------
+		subreddit: String, praw.subreddit object
+			the subreddit to poll
+
+		Returns
+		-------
+		Integer
+			the number of revisions handed to handlers
+
+		Raises
+		------
+		Exception
+			whatever a handler or the request for the listing raised. The 
+			subreddit stays scheduled; the revision being handled, and any 
+			after it, are handed to handlers again on the next poll, and failed
+			requests are retried after a growing delay
+		"""
+		state = self.__states[str(subreddit).lower()]
+		sub = state.subreddit
+		params = None if state.cursor is None else {"before": "WikiRevision_" + state.cursor}
+		handled = 0
+		requested = False
+		try:
+			items = scheduled(sub, POLL, lambda: list(ListingGenerator(sub._reddit, f"/r/{sub.display_name}/wiki/revisions", limit=100, params=params)))
+			requested = True
+			for item in reversed(items):
+				if item["id"] in state.seen: continue
+				handlers = state.handlers.get(item["page"])
+				deliver = bool(handlers) and not state.skipExisting
+				if deliver:
+					revision = WikiRevision(
+						sub._reddit.redditor(item["author"]["data"]["name"]),
+						item["timestamp"],
+						sub.wiki[item["page"]].revision(item["id"]),
+						item["revision_hidden"],
+						item["reason"],
+						item["id"]
+					)
+					for handler in handlers: handler(revision)
+					handled += 1
+				# only once every handler has succeeded, so a revision whose 
+				# handler raised is requested and delivered again next poll
+				state.seen.add(item["id"])
+				state.cursor = item["id"]
+				if deliver and self.checkpoint is not None: self.checkpoint.save(self.__checkpoint_key(state), state.cursor)
+			state.skipExisting = False
+		finally:
+			if self.checkpoint is not None and state.cursor is not None:
+				self.checkpoint.save(self.__checkpoint_key(state), state.cursor)
+			# keep the subreddit scheduled even if the request or a handler raised
+			self.__observe(state, handled, requested)
+		return handled
+
+	def __observe(self, state, handled, requested=True):
+		"""
+		Private method. Updates a subreddit's estimated edit rate from a poll,
+		and schedules its next poll. After failed requests, the next poll is 
+		put off twice as long for each failure in a row, up to `maxInterval`.
+		"""
+		now = time.monotonic()
+		if not requested:
+			state.failures += 1
+			delay = min(self.maxInterval, (state.interval or self.minInterval) * 2 ** state.failures)
+			state.nextPoll = now + delay * self.__scale()
+			heapq.heappush(self.__queue, (state.nextPoll, state.name))
+			return
+		state.failures = 0
+		if state.lastPoll is not None and now > state.lastPoll:
+			observed = handled / (now - state.lastPoll)
+			state.rate = self.smoothing * observed + (1 - self.smoothing) * state.rate
+		state.lastPoll = now
+		# poll about as often as the subreddit is edited, within the limits
+		state.interval = min(self.maxInterval, max(self.minInterval, 1 / max(state.rate, 1e-9)))
+		state.nextPoll = now + state.interval * self.__scale()
+		heapq.heappush(self.__queue, (state.nextPoll, state.name))
+
+	def __scale(self):
+		"""
+		Private method. Factor to stretch every subreddit's poll interval by,
+		so their combined request rate stays within the budget.
+		"""
+		rate = sum(1 / (state.interval or self.minInterval) for state in self.__states.values())
+		return max(1.0, rate / (self.budget / 60))
+
+	def next_poll(self):
+		"""
+		Returns
+		-------
+		Float
+			seconds until the next subreddit is due to be polled, or None if
+			nothing is watched
+		"""
+		if not self.__states: return None
+		return max(0.0, min(state.nextPoll for state in self.__states.values()) - time.monotonic())
+
+	def run_pending(self, raiseErrors=True):
+		"""
+		Poll every subreddit which is due
+
+		Parameters
+		----------
+		raiseErrors: Bool
+			Optional. if True, the default, an error polling a subreddit is 
+			raised, leaving the other due subreddits for the next call. If 
+			False, it's logged and recorded in the subreddit's PollState as 
+			`lastError`, and the other due subreddits are still polled
+
+		Returns
+		-------
+		Integer
+			the number of revisions handed to handlers
+		"""
+		handled = 0
+		now = time.monotonic()
+		while self.__queue and self.__queue[0][0] <= now:
+			due, key = heapq.heappop(self.__queue)
+			state = self.__states.get(key)
+			# entries for dropped or rescheduled subreddits are stale
+			if state is None or due != state.nextPoll: continue
+			try:
+				handled += self.poll(state.subreddit)
+			except Exception as e:
+				if raiseErrors: raise
+				state.lastError = e
+				logger.exception("Polling r/%s failed", state.subreddit)
+		return handled
+
+	def run(self, stop=None):
+		"""
+		Poll subreddits as they come due, until `stop` is set. Errors polling 
+		a subreddit are logged and don't stop the others being polled; see 
+		`run_pending`
+
+		Parameters
+		----------
+		stop: threading.Event
+			Optional. event to stop polling. If not set, polls forever
+		"""
+		if stop is None: stop = threading.Event()
+		while not stop.is_set():
+			self.run_pending(raiseErrors=False)
+			wait = self.next_poll()
+			stop.wait(self.maxInterval if wait is None else wait)
@@ -66,7 +66,7 @@ class puni_UserNotes:
 
 	def set_json(self, reason=None, new_page=False):
 		if new_page: self.get_json()
-		self.__ToolboxUsernotes.save(reason)
+		self.__ToolboxUsernotes.save(reason, force=True)
 
 	def get_notes(self, user, lazy=False):
 		if lazy == True: fresh = False
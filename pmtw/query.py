@@ -0,0 +1,133 @@
+import json
+import re
+from dataclasses import dataclass
+from typing import List, Optional
+
+
+@dataclass
+class QueryPage:
+	"""A page of results from `ToolboxUsernotes.query()`."""
+	notes: List
+	cursor: Optional[str]
+
+	def __iter__(self):
+		return iter(self.notes)
+
+	def __len__(self):
+		return len(self.notes)
+
+
+class NoteQuery:
+	"""
+	A set of note filters, compiled once and then applied to raw notes from 
+	the decoded usernotes JSON. Mods and warnings are matched by the indexes 
+	stored in the notes, so no note has to be expanded to be tested.
+	"""
+	def __init__(self, mods=None, warnings=None, after=None, before=None, text=None, pattern=None, hasLink=None):
+		"""
+		Constructor for the NoteQuery class.
+
+		Parameters
+		----------
+		mods: Set
+			Optional. indexes into the usernotes mod constants to match
+		warnings: Set
+			Optional. indexes into the usernotes warning constants to match
+		after: Integer
+			Optional. only match notes newer than this unix timestamp
+		before: Integer
+			Optional. only match notes older than this unix timestamp
+		text: String
+			Optional. case-insensitive substring to look for in the note text
+		pattern: String, re.Pattern
+			Optional. regular expression to search for in the note text
+		hasLink: Bool
+			Optional. if True, only match notes with a link; if False, only 
+			match notes without one
+		"""
+		self.after = after
+		self.before = before
+		# cheapest checks first, so most notes are rejected before the text is
+		# looked at
+		predicates = []
+		if mods is not None: predicates.append(lambda note: note['m'] in mods)
+		if warnings is not None: predicates.append(lambda note: note['w'] in warnings)
+		if after is not None: predicates.append(lambda note: note['t'] > after)
+		if before is not None: predicates.append(lambda note: note['t'] < before)
+		if hasLink is not None: predicates.append(lambda note: bool(note['l']) == hasLink)
+		if text:
+			text = text.casefold()
+			predicates.append(lambda note: text in note['n'].casefold())
+		if pattern is not None:
+			if isinstance(pattern, str): pattern = re.compile(pattern)
+			predicates.append(lambda note: pattern.search(note['n']) is not None)
+		self.__predicates = predicates
+
+	def __repr__(self):
+		"""Set display for a NoteQuery object"""
+		return f"NoteQuery(predicates={len(self.__predicates)})"
+
+	def matches(self, note):
+		"""
+		Test a raw note against every filter
+
+		Parameters
+		----------
+		note: Dictionary
+			a note as stored in the decoded usernotes JSON
+
+		Returns
+		-------
+		Bool
+			True if the note passes all filters
+		"""
+		for predicate in self.__predicates:
+			if not predicate(note): return False
+		return True
+
+	@staticmethod
+	def encode_cursor(time, user, ordinal):
+		"""
+		Build an opaque cursor for a note's position in time order
+
+		Parameters
+		----------
+		time: Integer
+			the note's timestamp
+		user: String
+			the wiki key of the user the note is on
+		ordinal: Integer
+			position of the note among the user's notes with the same timestamp
+
+		Returns
+		-------
+		String
+			the cursor
+		"""
+		return f"{time}:{ordinal}:{user}"
+
+	@staticmethod
+	def decode_cursor(cursor):
+		"""
+		Split a cursor built by `encode_cursor` back into its parts
+
+		Parameters
+		----------
+		cursor: String
+			the cursor
+
+		Returns
+		-------
+		Tuple
+			(time, user, ordinal)
+
+		Raises
+		------
+		ValueError
+			if the cursor is malformed
+		"""
+		try:
+			time, ordinal, user = cursor.split(":", 2)
+			return json.loads(time), user, int(ordinal)
+		except (AttributeError, TypeError, ValueError):
+			raise ValueError(f"{cursor} is not a valid cursor")
@@ -0,0 +1,201 @@
+"""
+A shared scheduler for the requests pmtw makes to Reddit, so many Toolbox
+instances using one praw session don't run through its rate limit together
+"""
+
+import heapq
+import itertools
+import threading
+import time
+import weakref
+from concurrent.futures import Future
+
+# request priorities, most urgent first
+WRITE = 0
+READ = 1
+POLL = 2
+
+_schedulers = weakref.WeakKeyDictionary()
+_schedulersLock = threading.Lock()
+
+
+class RequestScheduler:
+	"""
+	Meters the requests pmtw makes through one praw session. At most
+	`maxConcurrent` requests run at once, and waiting requests go in priority
+	order: wiki writes, then reads, then background polling, oldest first within
+	each. Before a request is started, the remaining request budget praw reports
+	in `reddit.auth.limits` is checked; reads wait for the budget to reset rather
+	than dip below `readReserve`, and polls rather than dip below `pollReserve`,
+	leaving the rest of the budget for writes. Identical reads in flight at the
+	same time share one request.
+
+	Every pmtw object uses the scheduler registered for its praw session,
+	created with default settings on first use. Create one yourself to change
+	the settings.
+	"""
+	def __init__(self, reddit=None, maxConcurrent=4, readReserve=10, pollReserve=60):
+		"""
+		Constructor for the RequestScheduler class.
+
+		Parameters
+		----------
+		reddit: praw.Reddit object
+			Optional. the praw session to meter. If set, the scheduler is
+			registered for it, replacing any scheduler already registered
+		maxConcurrent: Integer
+			Optional. maximum number of requests in flight at once, defaults to 4
+		readReserve: Integer
+			Optional. number of requests in the budget that reads leave for
+			writes, defaults to 10
+		pollReserve: Integer
+			Optional. number of requests in the budget that background polling
+			leaves for reads and writes, defaults to 60
+		"""
+		self.maxConcurrent = maxConcurrent
+		self.readReserve = readReserve
+		self.pollReserve = pollReserve
+		self.__reddit = None if reddit is None else weakref.ref(reddit)
+		self.__condition = threading.Condition()
+		self.__waiting = []
+		self.__counter = itertools.count()
+		self.__active = 0
+		self.__inFlight = {}
+		self.requests = 0
+		self.shared = 0
+		if reddit is not None:
+			with _schedulersLock: _schedulers[reddit] = self
+
+	def __repr__(self):
+		"""Set display for a RequestScheduler object"""
+		return f"RequestScheduler(active={self.__active}, waiting={len(self.__waiting)})"
+
+	def run(self, priority, function, key=None):
+		"""
+		Run a request once it's its turn
+
+		Parameters
+		----------
+		priority: Integer
+			one of `pmtw.ratelimit.WRITE`, `READ` or `POLL`
+		function: Callable
+			makes the request, called with no arguments
+		key: Hashable
+			Optional. identifies a read; if a read with the same key is already
+			in flight, its result is shared instead of making another request
+
+		Returns
+		-------
+		Any
+			whatever `function` returns
+		"""
+		if key is None: return self.__run(priority, function)
+		with self.__condition:
+			future = self.__inFlight.get(key)
+			owner = future is None
+			if owner: future = self.__inFlight[key] = Future()
+			else: self.shared += 1
+		if not owner: return future.result()
+		try:
+			result = self.__run(priority, function)
+		except BaseException as e:
+			future.set_exception(e)
+			raise
+		else:
+			future.set_result(result)
+			return result
+		finally:
+			with self.__condition: del self.__inFlight[key]
+
+	def __run(self, priority, function):
+		"""Private method. Waits for a turn, then runs the request."""
+		self.__acquire(priority)
+		try:
+			self.requests += 1
+			return function()
+		finally:
+			with self.__condition:
+				self.__active -= 1
+				self.__condition.notify_all()
+
+	def __acquire(self, priority):
+		"""
+		Private method. Blocks until this request is the most urgent one
+		waiting, a slot is free, and the budget allows it.
+		"""
+		with self.__condition:
+			ticket = (priority, next(self.__counter))
+			heapq.heappush(self.__waiting, ticket)
+			while True:
+				if self.__waiting[0] == ticket and self.__active < self.maxConcurrent:
+					delay = self.__delay(priority)
+					if delay <= 0:
+						heapq.heappop(self.__waiting)
+						self.__active += 1
+						self.__condition.notify_all()
+						return
+					# check again in a while, or when a more urgent request arrives
+					self.__condition.wait(min(delay, 1))
+				else:
+					self.__condition.wait()
+
+	def __delay(self, priority):
+		"""
+		Private method. Seconds a request of the given priority should wait for
+		the budget to reset, going by the last rate limit headers praw saw.
+		"""
+		reddit = self.__reddit() if self.__reddit is not None else None
+		limits = getattr(getattr(reddit, 'auth', None), 'limits', None) or {}
+		remaining = limits.get('remaining')
+		reset = limits.get('reset_timestamp')
+		if remaining is None or reset is None: return 0
+		reserve = (0, self.readReserve, self.pollReserve)[priority]
+		# requests already in flight are spending the budget too
+		if remaining - self.__active > reserve: return 0
+		return reset - time.time()
+
+	def _bind(self, reddit):
+		"""Private method. Meters the given praw session, if none is set yet."""
+		if self.__reddit is None: self.__reddit = weakref.ref(reddit)
+
+
+def scheduler_for(reddit):
+	"""
+	Parameters
+	----------
+	reddit: praw.Reddit object
+		the praw session
+
+	Returns
+	-------
+	RequestScheduler
+		the scheduler registered for the session, created if there isn't one
+	"""
+	with _schedulersLock:
+		scheduler = _schedulers.get(reddit)
+		if scheduler is None:
+			scheduler = _schedulers[reddit] = RequestScheduler()
+			scheduler._bind(reddit)
+		return scheduler
+
+def scheduled(sub, priority, function, key=None):
+	"""
+	Run a request for a subreddit through its praw session's scheduler
+
+	Parameters
+	----------
+	sub: praw.Subreddit object
+		the subreddit the request is for
+	priority: Integer
+		one of `WRITE`, `READ` or `POLL`
+	function: Callable
+		makes the request, called with no arguments
+	key: Hashable
+		Optional. identifies a read, to share it with identical reads in flight
+
+	Returns
+	-------
+	Any
+		whatever `function` returns
+	"""
+	return scheduler_for(sub._reddit).run(priority, function, key)
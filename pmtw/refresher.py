@@ -0,0 +1,116 @@
+"""
+Background threads which keep a loaded wiki page current
+"""
+
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class RefreshStatus:
+	"""How current a background-refreshed copy of a wiki page is"""
+	interval: float
+	running: bool = False
+	lastCurrent: Optional[float] = None
+	lastCheck: Optional[float] = None
+	lastChange: Optional[float] = None
+	checks: int = 0
+	changes: int = 0
+	skipped: int = 0
+	failures: int = 0
+	lastError: Optional[BaseException] = None
+
+	@property
+	def staleness(self):
+		"""
+		seconds since the local copy was last known to match the wiki page, or
+		None if it never has been
+		"""
+		if self.lastCurrent is None: return None
+		return time.time() - self.lastCurrent
+
+
+class BackgroundRefresher:
+	"""
+	Runs a check on a daemon thread every `interval` seconds, recording the
+	outcomes in a RefreshStatus. The check returns True if it swapped in a newer
+	copy of the page, False if the local copy was already current, or None if it
+	had to skip the page because of unsaved local edits. Failed checks are
+	retried with a growing delay, up to 16 times the interval.
+	"""
+	def __init__(self, check, interval=30, name=None):
+		"""
+		Constructor for the BackgroundRefresher class.
+
+		Parameters
+		----------
+		check: Callable
+			called with no arguments on the refresher thread
+		interval: Float
+			Optional. seconds between checks, defaults to 30
+		name: String
+			Optional. name for the thread
+		"""
+		self.status = RefreshStatus(interval)
+		self.__check = check
+		self.__name = name
+		self.__stop = threading.Event()
+		self.__thread = None
+
+	def __repr__(self):
+		"""Set display for a BackgroundRefresher object"""
+		return f"BackgroundRefresher(interval={self.status.interval}, running={self.running})"
+
+	@property
+	def running(self):
+		"""True while the refresher thread is alive"""
+		return self.__thread is not None and self.__thread.is_alive()
+
+	def start(self):
+		"""Start the refresher thread, if it isn't already running"""
+		if self.running: return
+		self.__stop.clear()
+		self.__thread = threading.Thread(target=self.__run, name=self.__name, daemon=True)
+		self.__thread.start()
+		self.status.running = True
+
+	def stop(self, timeout=None):
+		"""
+		Stop the refresher thread, waiting for a check in progress to finish
+
+		Parameters
+		----------
+		timeout: Float
+			Optional. maximum seconds to wait for the thread
+		"""
+		self.__stop.set()
+		if self.__thread is not None and self.__thread is not threading.current_thread():
+			self.__thread.join(timeout)
+		self.status.running = False
+
+	def current(self):
+		"""Record that the local copy is known to match the wiki page"""
+		self.status.lastCurrent = time.time()
+
+	def __run(self):
+		"""Private method. The refresher thread's loop."""
+		failing = 0
+		while not self.__stop.wait(self.status.interval * min(16, 2 ** failing)):
+			self.status.checks += 1
+			self.status.lastCheck = time.time()
+			try:
+				changed = self.__check()
+			except Exception as e:
+				failing += 1
+				self.status.failures += 1
+				self.status.lastError = e
+				continue
+			failing = 0
+			if changed is None:
+				self.status.skipped += 1
+				continue
+			self.current()
+			if changed:
+				self.status.changes += 1
+				self.status.lastChange = self.status.lastCurrent
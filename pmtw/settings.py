@@ -1,4 +1,5 @@
 import json
+import threading
 import urllib.parse
 from dataclasses import dataclass
 from typing import Any, List
@@ -6,7 +7,9 @@ from typing import Any, List
 from prawcore.exceptions import NotFound
 
 from pmtw.constants import MAX_WIKI_SIZE, SETTINGS_PAGE, SETTINGS_VERSION, DEFAULT_IDENTIFIER
-from pmtw.stream import revisions_stream
+from pmtw.ratelimit import POLL, READ, WRITE, scheduled
+from pmtw.refresher import BackgroundRefresher
+from pmtw.stream import latest_revision, own_revision, revisions_stream
 
 class JSONEncoder(json.JSONEncoder):
 	# overload method default
@@ -242,7 +245,7 @@ class SettingsRoot:
 
 class ToolboxSettings:
 	"""Represents the Toolbox Settings page."""
-	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, lazy=False):
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, lazy=False, snapshots=None):
 		"""
 		Construtor for the ToolboxSettings class.
 
@@ -255,11 +258,19 @@ class ToolboxSettings:
 		identifier: String
 			string that get's appended to all wikiedit discriptions identifying
 			pmtw as the actioner. Defaults to "via pmtw"
+		snapshots: SnapshotStore
+			Optional. local store to start loads from, only downloading the 
+			settings page when it has changed since the stored snapshot
 		"""
 		
 		self.__subreddit = subreddit
+		self.__snapshots = snapshots
 		self.identifier = identifier
 		self.__settings = ""
+		self.__payload = None
+		self.__revision = None
+		self.__lock = threading.RLock()
+		self.__refresher = None
 		self.ver = ""
 		self.domainTags = ""
 		self.removalReasons = ""
@@ -276,31 +287,91 @@ class ToolboxSettings:
 
 	def load(self):
 		"""
-		Load Toolbox Settings from Reddit
+		Load Toolbox Settings from Reddit. If a snapshot store is set and holds
+		a snapshot of the page's latest revision, settings are loaded from it 
+		instead.
 
 		Returns
 		-------
 		String
 			Information letting the user know settings are loaded
 		"""
+		with self.__lock:
+			if self.__snapshots is not None:
+				if self.__restore(latest_revision(self.__subreddit, SETTINGS_PAGE)):
+					return "Settings loaded from snapshot"
+			return self.__fetch()
 
+	def __restore(self, latest):
+		"""
+		Private method. Loads settings from the snapshot store if it holds a 
+		snapshot of the `latest` revision of the page.
+
+		Returns
+		-------
+		Bool
+			True if settings were loaded from a snapshot
+		"""
+		if latest is None: return False
+		page = self.__snapshots.get(self.__subreddit, SETTINGS_PAGE, latest['id'])
+		if page is None: return False
+		self.__apply(page, latest['id'])
+		return True
+
+	def __download(self, priority):
+		"""
+		Private method. Downloads the settings page through the request
+		scheduler, sharing the download with any identical one in flight.
+
+		Returns
+		-------
+		Tuple
+			the page's content and revision ID
+		"""
+		def download():
+			wikipage = self.__subreddit.wiki[SETTINGS_PAGE]
+			return wikipage.content_md, wikipage.revision_id
+		return scheduled(self.__subreddit, priority, download, key=(str(self.__subreddit).lower(), SETTINGS_PAGE, 'page'))
+
+	def __fetch(self):
+		"""
+		Private method. Downloads and parses the settings page, creating it if 
+		it doesn't exist, and snapshots it if a snapshot store is set.
+		"""
+		revision = None
 		try:
-			page = self.__subreddit.wiki[SETTINGS_PAGE].content_md
+			page, revision = self.__download(READ)
 			page = json.loads(page)
 			if page["ver"] != 1: raise ValueError(f"pmtw requires settings ver {SETTINGS_VERSION}, got {page['ver']}")
 		except NotFound:
 			initialJSON = {"ver":1,"domainTags":"","removalReasons":{"pmsubject":"","logreason":"","header":"test","footer":"","removalOption":"suggest","typeReply":"reply","typeStickied":False,"typeCommentAsSubreddit":False,"typeLockComment":False,"typeAsSub":False,"autoArchive":False,"typeLockThread":False,"logsub":"","logtitle":"","bantitle":"","getfrom":"","reasons":[]},"modMacros":[],"usernoteColors":[{"key":"gooduser","text":"Good Contributor","color":"#008000"},{"key":"spamwatch","text":"Spam Watch","color":"#ff00ff"},{"key":"spamwarn","text":"Spam Warning","color":"#800080"},{"key":"abusewarn","text":"Abuse Warning","color":"#ffa500"},{"key":"ban","text":"Ban","color":"#ff0000"},{"key":"permban","text":"Permanent Ban","color":"#8b0000"},{"key":"botban","text":"Bot Ban","color":"#000000"}],"banMacros":{"banNote":"","banMessage":""}}
-			page = self.__subreddit.wiki.create(name=SETTINGS_PAGE, content=str(initialJSON))
-			self.__subreddit.wiki[SETTINGS_PAGE].mod.update(listed=False, permlevel=2)
+			scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki.create(name=SETTINGS_PAGE, content=json.dumps(initialJSON), reason=f"Initialize settings {self.identifier}"))
+			page = initialJSON
+			scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki[SETTINGS_PAGE].mod.update(listed=False, permlevel=2))
 
 		# append expected items to the json, in case the toolbox settings 
 		# don't have them, since things get added here without a bump to ver
 		for item in ["domainTags", "removalReasons", "modMacros","banMacros"]:
 			if item not in page.keys(): page[item] = ""
 
+		if self.__snapshots is not None and revision is not None:
+			self.__snapshots.put(self.__subreddit, SETTINGS_PAGE, revision, page)
+		self.__apply(page, revision)
+		return "Settings loaded"
+
+	def __apply(self, page, revision):
+		"""
+		Private method. Makes a parsed settings page the local copy.
+		"""
+		self.__install(SettingsRoot.from_dict(page), revision)
+
+	def __install(self, settings, revision, payload=None):
+		"""
+		Private method. Makes parsed settings the local copy.
+		"""
 		# Copy things over so we don't have to hit ToolboxSettings.settings
 		# for every variable
-		self.__settings = SettingsRoot.from_dict(page)
+		self.__settings = settings
 		self.ver = self.__settings.ver
 		self.domainTags = self.__settings.domainTags
 		self.removalReasons = self.__settings.removalReasons
@@ -312,22 +383,60 @@ class ToolboxSettings:
 		for color in self.usernoteColors:
 			warnings.append(color.key)
 		self.warnings = warnings
+		self.__revision = revision
+		self.__payload = str(self.__settings) if payload is None else payload
+		if self.__refresher is not None: self.__refresher.current()
 
-		return "Settings loaded"
+	def __serialize(self):
+		"""
+		Private method. Serializes the local copy of settings, as it would be
+		saved.
+		"""
+		# Copy the class variables back to the dataclasses for compression
+		self.__settings.ver = self.ver
+		self.__settings.domainTags = self.domainTags
+		self.__settings.removalReasons = self.removalReasons
+		self.__settings.modMacros = self.modMacros
+		self.__settings.usernoteColors = self.usernoteColors
+		self.__settings.banMacros = self.banMacros
+		return str(self.__settings)
+
+	def refresh(self):
+		"""
+		Reload Toolbox Settings only if the wiki page has changed since the last
+		load, by checking the page's latest revision first.
 
-	def save(self, reason="Settings update"):
+		Returns
+		-------
+		Bool
+			True if settings were reloaded, False if the local copy was current
+		"""
+		with self.__lock:
+			if self.__revision is not None or self.__snapshots is not None:
+				latest = latest_revision(self.__subreddit, SETTINGS_PAGE)
+				if latest is not None and latest['id'] == self.__revision: return False
+				if self.__snapshots is not None and self.__restore(latest): return True
+			self.__fetch()
+			return True
+
+	def save(self, reason="Settings update", force=False):
 		"""
-		Save Toolbox settings back to Reddit
+		Save Toolbox settings back to Reddit. Settings are serialized once, and
+		nothing is saved if they serialize the same as when last loaded or 
+		saved.
 
 		Parameters
 		----------
 		reason: String
 			Optional, set a custom reason for the wiki page description
+		force: Bool
+			Optional, save even if settings haven't changed
 
 		Returns
 		-------
 		String
-			Reason with identifier set when instantiating a Toolbox object
+			Reason with identifier set when instantiating a Toolbox object, or 
+			None if there was nothing to save
 
 		Raises
 		------
@@ -335,22 +444,105 @@ class ToolboxSettings:
 			If the settings page is too big to save to Reddit
 
 		"""
-		reason = f"{reason} {self.identifier}"
+		with self.__lock:
+			reason = f"{reason} {self.identifier}"
+			payload = self.__serialize()
+			if not force and payload == self.__payload: return None
+			if len(payload) > MAX_WIKI_SIZE:
+				raise OverflowError(f'Settings data {len(payload) - MAX_WIKI_SIZE} bytes too big to insert')
+			scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki[SETTINGS_PAGE].edit(content=payload,reason=reason))
+			self.__revision = own_revision(self.__subreddit, SETTINGS_PAGE, reason)
+			self.__payload = payload
+			if self.__snapshots is not None and self.__revision is not None:
+				self.__snapshots.put(self.__subreddit, SETTINGS_PAGE, self.__revision, json.loads(payload))
+			if self.__refresher is not None and self.__revision is not None: self.__refresher.current()
+			return reason
+
+	def start_refresher(self, interval=30):
+		"""
+		Start a background thread which keeps the local copy of settings 
+		current. Every `interval` seconds it checks the page's latest revision,
+		and when the page has changed, downloads and parses it off to the side 
+		and swaps it in. Reads never wait on the network. Settings with unsaved
+		changes aren't replaced.
 
-		# Copy the class variables back to the dataclasses for compression
-		self.__settings.ver = self.ver
-		self.__settings.domainTags = self.domainTags
-		self.__settings.removalReasons = self.removalReasons
-		self.__settings.modMacros = self.modMacros
-		self.__settings.usernoteColors = self.usernoteColors
-		self.__settings.banMacros = self.banMacros
+		Parameters
+		----------
+		interval: Float
+			Optional. seconds between checks, defaults to 30
+
+		Returns
+		-------
+		RefreshStatus
+			live metrics on how current the local copy is, also available as
+			`refresh_status`
+		"""
+		if self.__refresher is None:
+			self.__refresher = BackgroundRefresher(self.__background_refresh, interval, name=f"pmtw-settings-{self.__subreddit}")
+			if self.__revision is not None: self.__refresher.current()
+		self.__refresher.status.interval = interval
+		self.__refresher.start()
+		return self.__refresher.status
+
+	def stop_refresher(self, timeout=None):
+		"""
+		Stop the background refresher, if one is running
+
+		Parameters
+		----------
+		timeout: Float
+			Optional. maximum seconds to wait for a check in progress to finish
+		"""
+		if self.__refresher is not None: self.__refresher.stop(timeout)
+
+	@property
+	def refresh_status(self):
+		"""
+		RefreshStatus of the background refresher, with its `staleness` in 
+		seconds, or None if it has never been started
+		"""
+		if self.__refresher is None: return None
+		return self.__refresher.status
 
-		if len(self.__settings.__str__()) > MAX_WIKI_SIZE:
-			raise OverflowError(f'Usernote data {len(self.__settings.__str__()) - MAX_WIKI_SIZE} bytes too big to insert')
-		self.__subreddit.wiki[SETTINGS_PAGE].edit(content=self.__settings.__str__(),reason=reason)
-		return reason
+	def __background_refresh(self):
+		"""
+		Private method, run on the refresher thread. Downloads and parses the 
+		settings page if it has changed, without touching the local copy, then 
+		swaps the new copy in while holding the lock, unless settings were 
+		loaded, saved or changed meanwhile. Settings are only serialized for 
+		the unsaved changes check while holding the lock.
 
-	def stream(self, pause_after=None, skip_existing=False):
+		Returns
+		-------
+		Bool
+			True if a newer copy was swapped in, False if the local copy was 
+			current, or None if it has unsaved changes and was left alone
+		"""
+		with self.__lock:
+			if self.__serialize() != self.__payload: return None
+			current = self.__revision
+			expected = self.__payload
+		latest = latest_revision(self.__subreddit, SETTINGS_PAGE, POLL)
+		if latest is None or latest['id'] == current: return False
+		page = None
+		revision = latest['id']
+		if self.__snapshots is not None: page = self.__snapshots.get(self.__subreddit, SETTINGS_PAGE, revision)
+		if page is None:
+			page, revision = self.__download(POLL)
+			page = json.loads(page)
+			if page["ver"] != 1: raise ValueError(f"pmtw requires settings ver {SETTINGS_VERSION}, got {page['ver']}")
+			for item in ["domainTags", "removalReasons", "modMacros","banMacros"]:
+				if item not in page.keys(): page[item] = ""
+			if self.__snapshots is not None: self.__snapshots.put(self.__subreddit, SETTINGS_PAGE, revision, page)
+		settings = SettingsRoot.from_dict(page)
+		payload = str(settings)
+		with self.__lock:
+			# something else loaded, saved or changed settings while we were downloading
+			if self.__revision != current or self.__payload is not expected or self.__serialize() != self.__payload: return None
+			self.__install(settings, revision, payload)
+		return True
+
+	def stream(self, pause_after=None, skip_existing=False, checkpoint=None):
 		"""
 		Yields new WikiRevision objects as they become available
 
@@ -368,6 +560,9 @@ class ToolboxSettings:
 			When `True`, this does not yield any results from the first request 
 			thereby skipping any items that existed in the stream prior to starting 
 			the stream.
+		checkpoint: [Optional] CheckpointStore (Default: `None`)
+			store to resume the stream from after a restart, and to save its 
+			progress to
 
 		Yields
 		------
@@ -378,6 +573,7 @@ class ToolboxSettings:
 			sub=self.__subreddit,
 			page=SETTINGS_PAGE,
 			pause_after = pause_after,
-			skip_existing = skip_existing
+			skip_existing = skip_existing,
+			checkpoint = checkpoint
 		):
 			yield revision
@@ -0,0 +1,121 @@
+"""
+On-disk cache of decoded wiki pages, so short-lived processes can start from
+a local copy instead of downloading and decoding the pages from Reddit
+"""
+
+import marshal
+import sqlite3
+import threading
+
+# the marshal format changes between Python versions; snapshots written in
+# another format are ignored rather than misread
+SNAPSHOT_FORMAT = marshal.version
+
+class SnapshotStore:
+	"""
+	SQLite-backed store of decoded toolbox wiki pages, keyed by subreddit, page
+	and revision ID. Each page keeps only its latest snapshot. Snapshots are
+	serialized with marshal, which loads much faster than inflating and parsing
+	the wiki page, and the database is memory-mapped for reading. Safe to share
+	between threads, and between processes through the same file.
+	"""
+	def __init__(self, path, mmapSize=268435456):
+		"""
+		Constructor for the SnapshotStore class.
+
+		Parameters
+		----------
+		path: String
+			path of the SQLite database file, created if it doesn't exist
+		mmapSize: Integer
+			Optional. maximum number of bytes of the database to memory-map,
+			defaults to 256mb
+		"""
+		self.path = path
+		self.__lock = threading.Lock()
+		self.__db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+		self.__db.execute("PRAGMA journal_mode=WAL")
+		self.__db.execute(f"PRAGMA mmap_size={int(mmapSize)}")
+		self.__db.execute(
+			"CREATE TABLE IF NOT EXISTS snapshots ("
+			"subreddit TEXT NOT NULL, page TEXT NOT NULL, revision TEXT NOT NULL, "
+			"format INTEGER NOT NULL, data BLOB NOT NULL, PRIMARY KEY (subreddit, page))"
+		)
+
+	def __repr__(self):
+		"""Set display for a SnapshotStore object"""
+		return f"SnapshotStore(path='{self.path}')"
+
+	def get(self, subreddit, page, revision):
+		"""
+		Fetch a snapshot of a wiki page at a given revision
+
+		Parameters
+		----------
+		subreddit: String, praw.Subreddit object
+			the subreddit the page belongs to
+		page: String
+			name of the wiki page
+		revision: String
+			revision ID the snapshot must have been taken at
+
+		Returns
+		-------
+		Any
+			the decoded page, or None if there's no snapshot of that revision
+		"""
+		with self.__lock:
+			row = self.__db.execute(
+				"SELECT data FROM snapshots WHERE subreddit = ? AND page = ? AND revision = ? AND format = ?",
+				(str(subreddit).lower(), page, revision, SNAPSHOT_FORMAT)
+			).fetchone()
+		if row is None: return None
+		try:
+			return marshal.loads(row[0])
+		except (EOFError, ValueError, TypeError):
+			return None
+
+	def put(self, subreddit, page, revision, data):
+		"""
+		Store a snapshot of a wiki page, replacing any older snapshot of it
+
+		Parameters
+		----------
+		subreddit: String, praw.Subreddit object
+			the subreddit the page belongs to
+		page: String
+			name of the wiki page
+		revision: String
+			revision ID the page was loaded at
+		data: Any
+			the decoded page. Must consist only of dictionaries, lists, strings,
+			numbers, booleans and None
+		"""
+		blob = marshal.dumps(data)
+		with self.__lock:
+			self.__db.execute(
+				"INSERT OR REPLACE INTO snapshots (subreddit, page, revision, format, data) VALUES (?, ?, ?, ?, ?)",
+				(str(subreddit).lower(), page, revision, SNAPSHOT_FORMAT, blob)
+			)
+
+	def discard(self, subreddit, page=None):
+		"""
+		Remove snapshots for a subreddit
+
+		Parameters
+		----------
+		subreddit: String, praw.Subreddit object
+			the subreddit to remove snapshots for
+		page: String
+			Optional. only remove the snapshot of this page
+		"""
+		with self.__lock:
+			if page is None:
+				self.__db.execute("DELETE FROM snapshots WHERE subreddit = ?", (str(subreddit).lower(),))
+			else:
+				self.__db.execute("DELETE FROM snapshots WHERE subreddit = ? AND page = ?", (str(subreddit).lower(), page))
+
+	def close(self):
+		"""Close the database connection"""
+		with self.__lock:
+			self.__db.close()
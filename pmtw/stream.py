@@ -1,9 +1,13 @@
+import json
+import os
 import time
 from typing import Any, Generator, Optional
 from praw.models.util import BoundedSet, ExponentialCounter
 from praw.models import ListingGenerator
 from datetime import datetime
 
+from pmtw.ratelimit import POLL, READ, scheduled
+
 class WikiRevision:
 	def __init__(self, user, timestamp, page, revision_hidden, reason, id):
 		self.user = user
@@ -18,12 +22,73 @@ class WikiRevision:
 	def __repr__(self):
 		return f"WikiRevision(page='{self.page}' user='{self.user}' human_time='{self.human_time}')"
 
+class CheckpointStore:
+	"""
+	In-memory store of stream checkpoints: the ID of the newest revision each 
+	stream has handed out. Subclass it and override `load` and `save` to keep
+	checkpoints somewhere that outlives the process.
+	"""
+	def __init__(self):
+		self._checkpoints = {}
+
+	def __repr__(self):
+		return f"{type(self).__name__}(streams={len(self._checkpoints)})"
+
+	def load(self, key):
+		"""
+		Parameters
+		----------
+		key: String
+			the stream's key, `<subreddit>/<page>` by default
+
+		Returns
+		-------
+		String
+			the last saved revision ID for the stream, or None
+		"""
+		return self._checkpoints.get(key)
+
+	def save(self, key, revision):
+		"""
+		Parameters
+		----------
+		key: String
+			the stream's key, `<subreddit>/<page>` by default
+		revision: String
+			the ID of the newest revision the stream has handed out
+		"""
+		self._checkpoints[key] = revision
+
+class FileCheckpointStore(CheckpointStore):
+	"""Stream checkpoints kept in a JSON file, rewritten atomically on save"""
+	def __init__(self, path):
+		"""
+		Parameters
+		----------
+		path: String
+			path of the JSON file, created on the first save
+		"""
+		super().__init__()
+		self.path = path
+		try:
+			with open(path) as f: self._checkpoints = json.load(f)
+		except FileNotFoundError:
+			pass
+
+	def save(self, key, revision):
+		super().save(key, revision)
+		temporary = f"{self.path}.tmp"
+		with open(temporary, 'w') as f: json.dump(self._checkpoints, f)
+		os.replace(temporary, self.path)
+
 def revisions_stream(
 	sub=None,
 	page=None,
 	attribute_name: str = "id",
 	pause_after: Optional[int] = None,
 	skip_existing: bool = False,
+	checkpoint: Optional[CheckpointStore] = None,
+	checkpoint_key: Optional[str] = None,
 	**function_kwargs: Any,
 ) -> Generator[Any, None, None]:
 	"""
@@ -38,6 +103,8 @@ def revisions_stream(
 	page: String
 		the wiki page to stream from. If it's a subpage, you should pass the 
 		path in the format `<folder>/<page>`
+	attribute_name: String
+		the key of the revision listing items to tell revisions apart by
 	pause_after: [Optional] Integer (Default: `None`)
 		An integer representing the number of requests that result in no new 
 		items before this function yields `None`, effectively introducing a 
@@ -49,7 +116,14 @@ def revisions_stream(
 	skip_existing: [Optional] Boolean (Default: False)
 		When `True`, this does not yield any results from the first request 
 		thereby skipping any items that existed in the stream prior to starting 
-		the stream.
+		the stream. Ignored when resuming from a checkpoint.
+	checkpoint: [Optional] CheckpointStore (Default: `None`)
+		store to resume the stream from, and to save its progress to. A 
+		revision's ID is saved once the next item is asked for, so after a 
+		restart the stream picks up after the last revision handled, without 
+		refetching older history.
+	checkpoint_key: [Optional] String (Default: `<subreddit>/<page>`)
+		the key to save the stream's checkpoint under
 
 	additonal keyword arguments are passed to the inner function
 
@@ -59,11 +133,12 @@ def revisions_stream(
 
 	Note
 	----
-	This function internally uses an exponential delay with jitter between 
-	subsequent responses that contain no new results, up to a maximum delay of 
-	just over 16 seconds. In practice, that means that the time before pause 
-	for `pause_after=N+1` is approximately twice the time before pause for 
-	`pause_after=N`.
+	Once a revision has been seen, each request only asks for revisions newer
+	than it. This function internally uses an exponential delay with jitter 
+	between subsequent responses that contain no new results, up to a maximum 
+	delay of just over 16 seconds. In practice, that means that the time 
+	before pause for `pause_after=N+1` is approximately twice the time before 
+	pause for `pause_after=N`.
 
 
 	"""
@@ -74,10 +149,15 @@ def revisions_stream(
 		return ListingGenerator(
 			reddit=sub._reddit,
 			url=path,
+			limit=limit,
 			params=params
 		)
 
+	if checkpoint_key is None: checkpoint_key = f"{sub.display_name}/{page}"
 	before_attribute = None
+	if checkpoint is not None:
+		before_attribute = checkpoint.load(checkpoint_key)
+		if before_attribute is not None: skip_existing = False
 	exponential_counter = ExponentialCounter(max_counter=16)
 	seen_attributes = BoundedSet(301)
 	without_before_counter = 0
@@ -85,13 +165,24 @@ def revisions_stream(
 	valid_pause_after = pause_after is not None
 	while True:
 		found = False
-		newest_attribute = None
 		limit = 100
+		params = None
 		if before_attribute is None:
+			# vary the limit so repeated requests aren't served from a cache
 			limit -= without_before_counter
 			without_before_counter = (without_before_counter + 1) % 30
-		for item in reversed(list(function(limit=limit, **function_kwargs))):
-			item = WikiRevision(
+		else:
+			params = {"before": before_attribute}
+		items = scheduled(sub, POLL, lambda: list(function(limit=limit, params=params, **function_kwargs)))
+		for item in reversed(items):
+			attribute = item[attribute_name]
+			if attribute in seen_attributes: continue
+			found = True
+			seen_attributes.add(attribute)
+			# the newest revision seen is the cursor for the next request
+			before_attribute = item["id"]
+			if skip_existing: continue
+			yield WikiRevision(
 				sub._reddit.redditor(item["author"]["data"]["name"]),
 				item["timestamp"],
 				sub.wiki[item["page"]].revision(item["id"]),
@@ -99,14 +190,9 @@ def revisions_stream(
 				item["reason"],
 				item["id"]
 			)
-			attribute = getattr(item, attribute_name)
-			if attribute in seen_attributes: continue
-			found = True
-			seen_attributes.add(attribute)
-			newest_attribute = attribute
-			if not skip_existing: 
-				yield item
-		before_attribute = newest_attribute
+			if checkpoint is not None: checkpoint.save(checkpoint_key, item["id"])
+		if skip_existing and checkpoint is not None and before_attribute is not None:
+			checkpoint.save(checkpoint_key, before_attribute)
 		skip_existing = False
 		if valid_pause_after and pause_after < 0:
 			yield None
@@ -122,3 +208,59 @@ def revisions_stream(
 			else:
 				time.sleep(exponential_counter.counter())
 
+
+def latest_revision(sub, page, priority=READ):
+	"""
+	Fetch the most recent revision of a wikipage. This only requests a single 
+	item from the page's revision listing, so it's much cheaper than fetching 
+	the page itself. Identical checks in flight at the same time share one 
+	request.
+
+	Parameters
+	----------
+	sub: praw.subreddit object
+		The subreddit the wikipage belongs to
+	page: String
+		the wiki page to check
+	priority: [Optional] Integer (Default: `READ`)
+		the request's priority in the scheduler, see `pmtw.ratelimit`
+
+	Returns
+	-------
+	Dictionary
+		the latest revision, as returned by praw's `WikiPage.revisions`, or 
+		`None` if the page has no revisions
+	"""
+	return scheduled(sub, priority, lambda: _first_revision(sub, page), key=(str(sub).lower(), page, 'latest'))
+
+def _first_revision(sub, page):
+	"""the newest item of a wikipage's revision listing, or None"""
+	for revision in sub.wiki[page].revisions(limit=1):
+		return revision
+	return None
+
+def own_revision(sub, page, reason):
+	"""
+	Fetch the ID of the revision created by an edit that was just made, if 
+	nobody else has edited the page since.
+
+	Parameters
+	----------
+	sub: praw.subreddit object
+		The subreddit the wikipage belongs to
+	page: String
+		the wiki page that was edited
+	reason: String
+		the reason the edit was saved with
+
+	Returns
+	-------
+	String
+		the revision ID, or `None` if the latest revision isn't the edit
+	"""
+	# not shared with other checks, which may have started before the edit
+	revision = scheduled(sub, READ, lambda: _first_revision(sub, page))
+	if revision is None: return None
+	if str(revision["author"]) != sub._reddit.user.me().name: return None
+	if revision["reason"] != reason: return None
+	return revision["id"]
@@ -1,13 +1,14 @@
-import csv
 import time as t
 
+from pmtw.changes import usernote_changes
 from pmtw.constants import DEFAULT_IDENTIFIER
+from pmtw.export import export_notes
 from pmtw.settings import ToolboxSettings
 from pmtw.usernotes import ToolboxUsernotes
 
 
 class Toolbox:
-	def __init__(self, subreddit, lazy=False, identifier=DEFAULT_IDENTIFIER):
+	def __init__(self, subreddit, lazy=False, identifier=DEFAULT_IDENTIFIER, snapshots=None):
 		"""
 		Constructor for the Toolbox class
 
@@ -20,10 +21,14 @@ class Toolbox:
 		identifier: String
 			string that get's appended to all wikiedit discriptions identifying
 			pmtw as the actioner. Defaults to "via pmtw"
+		snapshots: SnapshotStore
+			Optional. local store of wiki page snapshots to load settings and 
+			usernotes from when they haven't changed
 		"""
 		self.settings = ''
 		self.usernotes = ''
 		self.identifier = identifier
+		self.snapshots = snapshots
 		self.__subreddit = subreddit
 		if not lazy: self._load()
 			
@@ -33,10 +38,10 @@ class Toolbox:
 
 	def _load(self):
 		"""Load settings and Usernotes"""
-		self.settings = ToolboxSettings(self.__subreddit, identifier=self.identifier)
-		self.usernotes = ToolboxUsernotes(self.__subreddit, identifier=self.identifier, settingsWarnings=self.settings.warnings)
+		self.settings = ToolboxSettings(self.__subreddit, identifier=self.identifier, snapshots=self.snapshots)
+		self.usernotes = ToolboxUsernotes(self.__subreddit, identifier=self.identifier, settingsWarnings=self.settings.warnings, snapshots=self.snapshots)
 
-	def prune_notes(self, days=180, before=None, excludeKinds=[], dryRun=False):
+	def prune_notes(self, days=180, before=None, excludeKinds=[], dryRun=False, keepLatest=None):
 		"""
 		Bulk-removes old usernotes.
 
@@ -51,6 +56,9 @@ class Toolbox:
 			specified cutoff
 		dryRun: Bool
 			Simulates removal of notes without actually affecting them.
+		keepLatest: Int
+			Optional. if set, each user's newest `keepLatest` notes are 
+			preserved, even if older than the specified cutoff
 		
 		Returns
 		-------
@@ -58,35 +66,26 @@ class Toolbox:
 			notification of how many usernotes were deleted.
 
 		"""
-		self.usernotes.load()
-		if isinstance(excludeKinds, str): excludeKinds = [excludeKinds]
+		self.usernotes.refresh()
 		if before: pruneTime = before
 		else: pruneTime = t.time() - (days * 86400)
-		users_count = 0
-		notes_count = 0
-		preserved_count = 0
-		for user in self.usernotes.list_users():
-			users_notes = self.usernotes.list_notes(user)
-			user_triggered = False
-			for note in users_notes:
-				if note.time > pruneTime: continue
-				if note.warning in excludeKinds:
-					preserved_count +=1
-					continue
-				notes_count += 1
-				user_triggered = True
-				self.remove(user, note.time, bulk_action=True)
-			if user_triggered == True: users_count += 1
+		result = self.usernotes.prune(
+			pruneTime,
+			excludeKinds=excludeKinds,
+			keepLatest=keepLatest,
+			dryRun=dryRun,
+			reason=f"bulk deleted notes older than {days} days"
+		)
 		if dryRun:
-			self.usernotes.load()
-			return f"prune would bulk delete {notes_count:,} notes on {users_count:,} users older than {days} days."
+			return f"prune would bulk delete {result.notes:,} notes on {result.users:,} users older than {days} days, saving {result.saved:,} bytes."
 		else:
-			self.usernotes.save(f"bulk deleted {notes_count:,} notes on {users_count:,} users older than {days} days")
-			return f"bulk deleted {notes_count:,} notes on {users_count:,} users older than {days} days"
+			return f"bulk deleted {result.notes:,} notes on {result.users:,} users older than {days} days, saving {result.saved:,} bytes"
 
 	def search_notes(self, query, kind="note", range="after", lazy=True):
 		"""
-		Search usernotes. 
+		Search usernotes for a single field. For searches combining several 
+		filters, regular expressions, limits or pagination, use 
+		`ToolboxUsernotes.query`.
 
 		Parameters
 		----------
@@ -111,67 +110,96 @@ class Toolbox:
 			* when range is invalid if kind="time"
 			* when kind is invalid
 		"""
-		if not lazy: self.usernotes.load()
-		notes = self.usernotes.list_all_notes()
-		results = []
-
-		for note in notes:
-			if kind == "time":
-				if range == "after" and note.time > int(query): results.append(note)
-				if range == "before" and note.time < int(query): results.append(note)
-				else: raise ValueError(f"{range} is invalid. range options are ['before', 'after']")
+		if kind not in ["note", "user", "mod", "warning", "url", "time"]:
+			raise ValueError(f"{kind} is not a valid search option")
+		if not lazy: self.usernotes.refresh()
+		if kind == "time":
+			if range == "after": return self.usernotes.query(after=int(query)).notes
+			elif range == "before": return self.usernotes.query(before=int(query)).notes
+			else: raise ValueError(f"{range} is invalid. range options are ['before', 'after']")
+		if kind == "note": return self.usernotes.query(text=query).notes
 
-			if kind == "note": search = note.note
-			elif kind == "user": search = note.user
+		results = []
+		for note in self.usernotes.iter_notes():
+			if kind == "user": search = note.user
 			elif kind == "mod": search = note.mod
 			elif kind == "warning": search = note.warning
-			elif kind == "url": search = note.url
-			else: raise ValueError(f"{kind} is not a valid search option")
+			else: search = note.url
 
 			search = str(search)
 			search = search.lower()
 			if query.lower() in search: results.append(note)
-		return results
+		return sorted(results, key = lambda x: x.time)
 
 	def export_notes(
 		self, 
 		file="",
 		fields=["user","note","warning","time","mod","link"],
-		sortKey="time"
+		sortKey="time",
+		format="csv",
+		compress=False
 	):
 		"""
-		Exports Usernotes in a CSV file.
+		Exports Usernotes to a CSV or JSON Lines file. Rows are streamed out as
+		they're produced rather than collected in memory first.
 
 		Parameters
 		----------
-		file: String
-			File name for the exported notes. Defaults to 
+		file: String, file-like object
+			File name or file-like object for the exported notes. Defaults to 
 			"usernotes-{subreddit}-{current timestamp in seconds}.csv"
 		fields: List:
 			List of fields to export. Defaults to all fields
 		sortKey: String
 			Which key in fields to sort usernotes for in the exported csv file.
-			defaults to time.
+			defaults to time. Exports sorted by time are streamed in time order 
+			straight from the usernotes; other keys are sorted in bounded 
+			memory. If None, notes are written in the order they're stored.
+		format: String
+			one of: csv, jsonl
+		compress: Bool
+			if True, gzip the exported file
 
 		Returns
 		-------
 		String
 			Notification of success
 
+		Raises
+		------
+		ValueError
+			* when a field is not a ToolboxNote attribute
+			* when format is invalid
+
 		"""
-		if file == "": file = f"usernotes-{self.__subreddit}-{int(t.time())}.csv"
-		rows = []
-		count = 0
-		for note in self.usernotes.list_all_notes():
-			row = []
-			count += 1
-			for field in fields: row.append(eval(f"note.{field}"))
-			rows.append(row)
-		try: rows = sorted(rows, key = lambda x: x[fields.index(sortKey)])
-		except: rows = sorted(rows, key = lambda x: x[0])
-		csv_dump = open(file, 'w')
-		csv_writer = csv.writer(csv_dump)
-		csv_writer.writerow(fields)
-		for row in rows: csv_writer.writerow(row)
-		csv_dump.close()
+		if file == "":
+			file = f"usernotes-{self.__subreddit}-{int(t.time())}.{format}"
+			if compress: file += ".gz"
+		if sortKey is not None and sortKey not in fields: sortKey = fields[0]
+		if sortKey == "time":
+			notes = self.usernotes.iter_query()
+			sortKey = None
+		else: notes = self.usernotes.iter_notes()
+		count = export_notes(notes, file, fields=fields, format=format, compress=compress, sortKey=sortKey)
 		return f"{count:,} usernotes exported to {file}"
+
+	def usernote_changes(self, pause_after=None, checkpoint=None):
+		"""
+		Yields note-level changes to usernotes as they are made, by decoding
+		each new revision of the usernotes page and comparing it with the one
+		before it.
+
+		Parameters
+		----------
+		pause_after: [Optional] Integer (Default: `None`)
+			passed to the revisions stream; `None` is yielded whenever the 
+			stream pauses
+		checkpoint: [Optional] CheckpointStore (Default: `None`)
+			store to resume from after a restart, and to save progress to
+
+		Yields
+		------
+		NoteAdded, NoteRemoved, UserPurged and ConstantsChanged objects
+		"""
+		for change in usernote_changes(self.__subreddit, pause_after=pause_after, checkpoint=checkpoint):
+			yield change
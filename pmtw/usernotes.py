@@ -1,561 +1,2203 @@
-import base64
-import copy
-import json
-import re
-import time as t
-import zlib
-from datetime import datetime
-
-from prawcore.exceptions import NotFound
-
-from pmtw.constants import (DEFAULT_IDENTIFIER, MAX_WIKI_SIZE, USERNOTES_PAGE,
-                            USERNOTES_VERSION)
-from pmtw.stream import revisions_stream
-
-
-class ToolboxNote:
-	"""Represents a single Toolbox Usernote."""
-	def __init__(self, user, note, warning=None, time=None, mod=None, url=None, link='', notes=None):
-		"""
-		Construtor for the ToolboxNote class.
-
-		Parameters
-		----------
-		user: String, praw.redditor object
-			User the note is being left for
-		note: String
-			the text of the usernote
-		warning: String
-			the kind of warning the ntoe should be
-		time: Integer
-			a unix timestamp in seconds. Optional, will set to current time if
-			not specified.
-		mod: String, praw.redditor
-			the moderator issuing the note. Optional, if not set will be set to
-			the user of the praw instance.
-		url: String
-			url attached to the note. If present, gets converted to a toolbox
-			link as `self.link`
-		link: String
-			the toolbox style short link. if set, will expand to a full url
-		notes: ToolboxUsernotes
-			if set to a ToolboxUsernotes instance, immediately adds the note.
-
-		"""
-		self.user = str(user)
-		self.note = note
-		self.warning = warning
-		self.time = time if time else int(t.time())
-		self.human_time = datetime.fromtimestamp(self.time).__str__()
-		self.mod = str(mod)
-		if link != '': self.link = link
-		else: self.link = self.__compress_url(url)
-		if url: self.url = url
-		else: self.url = self.__expand_link(link)
-
-		if notes != None: notes.add(self)
-
-	def __repr__(self):
-		"""praw-style representation of the note."""
-		return f"ToolboxNote(user='{self.user}', note='{self.note}', human_time='{self.human_time}')"
-
-	def __dict__(self):
-		"""represnts a dict of the note in the format it's stored uncompressed in the json"""
-		return {'t': self.time, 'n': self.note, 'm': self.mod, 'w': self.warning, 'l': self.link}
-
-	@staticmethod
-	def __expand_link(link):
-		"""
-		expand toolbox's shortlinks to full urls
-		Parameters
-		----------
-		link: String
-			toolbox formatted link to expand to a url
-		Returns
-		-------
-		String
-			an expanded link
-
-		"""
-		if not link: return None #if no link, nothing to do
-		if link == '': return None #if blank link, nothing to do
-		parts = link.split(',') # 'l,abcde,fghij' format for comments, 'l,kmlno' for links
-		if parts[0] == "m": return f'https://reddit.com/message/messages/{parts[1]}'
-		if len(parts) > 2: return f'https://reddit.com/comments/{parts[1]}/-/{parts[2]}'
-		elif len(parts) > 1: return f'https://reddit.com/{parts[1]}'
-		else: return link #modmail links are stored as full links
-
-	@staticmethod
-	def __compress_url(url):
-		"""
-		compress a url to toolbox's `l,` format, if applicable
-
-		Parameters
-		----------
-			url: String
-				url to compress
-
-		Returns
-		-------
-		String
-			the toolbox-formatted link. Recognizes a wide variety of reddit
-			links. The following is a non-exhaustive list to give examples:
-			https://www.reddit.com/r/subreddit/abcdef/comments/ghijkl/
-			http://old.reddit.com/r/subreddit/abcdef/
-			http://reddit.com/r/subreddit/abcdef
-			http://reddit.com/abcdef
-			https://redd.it/abcdef
-			reddit.com/abcdef
-
-		"""
-		if not url: return '' # If link is empty, nothing to compress
-		if url.startswith("l,") or url.startswith("m,"): return url # Link already compressed
-		if "mod.reddit" in url: return url # if link is to modmail message, nothing to compress
-		match_re = re.compile(r'(https?:\/\/([a-z]{3}\.)?)?redd\.?it(\.com)?\/(r\/[a-z]*\/)?(comments\/)?', re.IGNORECASE)
-		if not re.match(match_re, url): raise ValueError(f"cannot format {url}")
-		url = re.sub(match_re,"", url)
-		url = url.rstrip("/").split("/")
-		if len(url) == 3: return f"l,{url[0]},{url[2]}" #return comment link format "l,abcde,fghij"
-		else: return f"l,{url[0]}" # Return post link format "l,abcde"
-
-
-class ToolboxUsernotes:
-	"""Represents the Toolbox Usernotes page."""
-	
-	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, settingsWarnings=[], lazy=False):
-		"""
-		Construtor for the ToolboxUsernotes class.
-
-		Parameters
-		----------
-		subreddit: praw.Subreddit object
-			The praw object representing the subreddit to pull notes from
-		lazy: Bool
-			If False, fetch notes from Reddit on instantiation
-		identifier: String
-			string to identify all actions taken in the wiki save description
-		settingsWarnings: List
-			Note types which are in Settings which may or may not be present in 
-			the usernotes wiki page
-		"""
-		self.warnings = []
-		self.__subreddit = subreddit
-		self.__identifier = identifier
-		self.__usernotesJSON = {}
-		self.__settingsWarnings = settingsWarnings
-
-		if not lazy: self.load()
-
-	def __str__(self):
-		"""return the uncompessed json from the usernotes page as a string"""
-		return str(self.__usernotesJSON)
-
-	def __repr__(self):
-		"""Set display for a ToolboxUsernotes object"""
-		return f"ToolboxUsernotes(subreddit='{self.__subreddit}')"
-
-	def __expand_json(self, notes):
-		"""
-		Private method used to expand the blob portion of usernotes
-		
-		Parameters
-		----------
-		notes: Dictionary
-			dictionary representing the usernotes JSON
-
-		Returns
-		-------
-		Dictionary
-			dictionary representing the usernotes JSON with blob expanded
-
-
-		"""
-		json_blob = zlib.decompress(base64.b64decode(notes['blob'])).decode('utf-8') # decompress the Blob
-		notes.pop('blob', None) # remove the Blob section from the json data	
-		notes['users'] = json.loads(json_blob) # add decoded users section to json dictionary
-		self.__usernotesJSON = notes
-		return notes
-
-	def __compress_json(self, notes=None):
-		"""
-		Private method to compress json usernotes into a blob for the wiki page
-		
-		Parameters
-		----------
-		notes: Dictionary
-			usernotes wiki page in dictionary format. Works on self.__usernotesJSON
-			if an explicit object is not supplied. This variable exists largely
-			for backwards-compatibilty reasons.
-
-		Returns
-		-------
-		String
-			the compressed JSON object, per toolbox's compression methods
-		
-		"""
-		if notes == None: notes = self.__usernotesJSON
-		compressed_json = copy.copy(notes) #create a shallow copy of notes
-		compressed_json.pop('users', None) #remove the users section from the json data
-		blob_data = zlib.compress(json.dumps(notes['users']).encode('utf-8'), 9) #compress blob with zlib
-		blob = base64.b64encode(blob_data).decode('utf-8') #encode the blob in base64
-		compressed_json['blob'] = blob #insert the blob back into the json
-		return json.dumps(compressed_json)
-
-	def __get_warnings(self):
-		""""
-		Private method. Gets warnings from the usernotes json, and appends
-		other available warnings passed to the constructor
-		"""
-		self.warnings = self.__usernotesJSON['constants']['warnings'].copy()
-		if None not in self.warnings: self.warnings.append(None)
-		for usernoteColor in self.__settingsWarnings:
-			if usernoteColor not in self.warnings:
-				self.warnings.append(usernoteColor)
-		
-	def __get_mod_index(self, mod):
-		"""
-		Private method. Toolbox stores the moderator as an index for a given 
-		note, not the actual name. This method fetches the appropriate unstable 
-		index for a given mod, adding the mod to the list of mods if needed.
-
-		Parameters
-		----------
-		mod: String
-			The mod to get the list index for
-
-		Returns
-		-------
-		Integer
-			the integer index of the mod
-
-		"""
-		try:
-			mod_index = self.__usernotesJSON['constants']['users'].index(mod)
-			return mod_index
-		except ValueError:
-			self.__usernotesJSON['constants']['users'].append(mod)
-			return self.__usernotesJSON['constants']['users'].index(mod)
-
-	def __get_warning_index(self, warning):
-		"""
-		Private method. Toolbox stores warnings as an index for a given 
-		note, not the actual warning name. This method fetches the appropriate 
-		unstable index for a given warning, adding the warning to the list of 
-		warnings in the usernote page if the warning exists in settings but not
-		in usernotes.
-
-		Parameters
-		----------
-		warning: String
-			The warning to get the list index for
-
-		Returns
-		-------
-		Integer
-			the integer index of the warning
-
-		Raises
-		------
-		ValueError
-			If the input warning is not valid for these usernotes
-
-		"""
-		try:
-			warning_index = self.__usernotesJSON['constants']['warnings'].index(warning)
-			return warning_index
-		except ValueError:
-			if warning in self.warnings:
-				self.__usernotesJSON['constants']['warnings'].append(warning)
-				return self.__usernotesJSON['constants']['warnings'].index(warning)
-			else:
-				raise ValueError(f"{warning} is not a valid warning.")
-
-	def __match_username(self, username):
-		"""
-		Try to match a user with notes and get the proper capitalization for key
-		""" 
-		search_user = ""
-		for user in self.list_users():
-			if username.lower() == user.lower():
-				search_user = user
-				break
-		if search_user == "":
-			search_user = username
-		return search_user
-
-	def save(self, reason='Usernote update'):
-		"""
-		Save usernotes to Reddit, with whatever reason is specified. Will raise 
-		an OverflowError if the current data is too big for the wiki page.
-
-		Parameters
-		----------
-			reason: String
-				Optional, set a custom reason for the wiki page description
-
-		Returns
-		-------
-		String
-			Wiki page update description
-
-		Raises
-		------
-		OverflowError
-			If he text is larger than the allowed 1mb wikipage size
-		"""
-		reason = f"{reason} {self.__identifier}"
-		wikipage_data = self.__compress_json(self.__usernotesJSON)
-		if len(wikipage_data) > MAX_WIKI_SIZE:
-			raise OverflowError(f'Usernote data {len(wikipage_data) - MAX_WIKI_SIZE} bytes too big to insert')
-		self.__subreddit.wiki[USERNOTES_PAGE].edit(content=wikipage_data, reason=reason)
-		return reason
-
-	def load(self):
-		"""
-		Fetch usernotes from Reddit. Initializes a wiki page if the page doesn't 
-		currently exist.
-
-		Returns
-		-------
-		String
-			message informing of successful usernote load
-
-		Raises
-		------
-		RuntimeError
-			if the schema doesn't match the expected version.
-
-		"""
-		try:
-			usernotes = self.__subreddit.wiki[USERNOTES_PAGE].content_md
-			notes = json.loads(usernotes)
-		except NotFound:
-			initialJson = {"ver":USERNOTES_VERSION,"constants":{"users":[],"warnings":self.warnings}, "blob":""}
-			self.sub.wiki.create(name=USERNOTES_PAGE, content=initialJson)
-			self.sub.wiki[USERNOTES_PAGE].mod.update(listed=False, permlevel=2)
-			self.__expand_json(initialJson)
-		if notes['ver'] != USERNOTES_VERSION:
-			raise RuntimeError(f"Usernotes Schema mismatch. PMTAW requires {USERNOTES_VERSION}, wiki page is {notes['ver']}")
-		else:
-			self.__expand_json(notes)
-			self.__get_warnings()
-		return "Usernotes loaded"
-
-	def add(self, note, lazy=False):
-		"""
-		takes a ToolboxNote object and adds it on Reddit.
-
-		Parameters
-		----------
-		note: ToolboxNote object
-			note to add to the wiki
-		timestamp: Int
-			if set, delete note with the specified timestamp.
-			if not set, delete all usernotes for a given user
-		lazy: Bool
-			If set to False, will immediately update the wiki page. if set to 
-			True, will only modify the local usernote copy for manual saving later.
-
-		Returns
-		-------
-		String
-			string mirroring the description for the wiki update
-		Raises
-		------
-		ValueError
-			if the warning specified in the note does not exist in available 
-			warning types for the configured subreddit.
-		"""
-		if lazy == False: self.load()
-		
-		new_note = note.__dict__()
-		if new_note['m'] == 'None':
-			new_note['m'] = self.__subreddit._reddit.user.me().name
-		if new_note['w'] not in self.warnings:
-				raise ValueError(f"{new_note['w']} is not a valid warning type")
-
-		new_note['m'] = self.__get_mod_index(new_note['m'])
-		if new_note['w'] == 'None': new_note['w'] = self.__get_warning_index(None)
-		else: new_note['w'] = self.__get_warning_index(new_note['w'])
-
-		user = self.__match_username(note.user)
-		try:
-			self.__usernotesJSON['users'][user]['ns'].insert(0, new_note)
-			if lazy == False:
-				self.save(f"create new note on user '{user}'")
-				return f"create new note on user '{user}'"
-		except KeyError:
-			self.__usernotesJSON['users'][user] = {'ns': [new_note]}
-			if lazy == False:
-				self.save(f"create new note on user '{user}'")
-				return f"create new note on user '{user}'"
-
-	def remove(self, user, timestamp=-1, lazy=False):
-		"""
-		removes a specified user note, or all notes for a user. 
-
-		Parameters
-		----------
-		user: String, praw.redditor
-			user to remove notes for
-		timestamp: Int
-			Optional. if set, delete note with the specified timestamp.
-			if not set, delete all usernotes for a given user
-		lazy: Bool
-			Optional. If set to False, will immediately update the wiki page. if
-			set to True, will only modify the local usernote copy for manual 
-			saving later.
-
-		Returns
-		-------
-		String
-			string mirroring what's put on the wiki
-
-		Raises
-		------
-		KeyError
-			if the note for the given timestamp isn't found
-
-		"""
-		user = str(user)
-		user = self.__match_username(user)
-		if lazy == False: self.load()
-
-		if timestamp == -1:
-			del self.__usernotesJSON['users'][user]
-			if lazy == False: self.save(f"Deleted all notes on {user}")
-			return f"Deleted all notes on {user}"
-		else:
-			notes_on_user = self.__usernotesJSON['users'][user]['ns']
-			deleted = False
-			for i in range(len(notes_on_user)):
-				if notes_on_user[i]['t'] == timestamp:
-					notes_on_user.pop(i)
-					deleted = True
-					break
-			if deleted == False: raise KeyError(f"failed to find note timestamped {timestamp} for {user}")
-			# Delete the user from the database if there are no notes left
-			if len(notes_on_user) == 0:
-				del self.__usernotesJSON['users'][user]
-				if lazy == False: self.save(f"delete all notes on user '{user}'")
-				return f"delete all notes on user '{user}'"
-			else:
-				if lazy == False: self.save(f"delete note {timestamp} on user '{user}'")
-				return f"delete note {timestamp} on user '{user}'"
-
-	def list_users(self, lazy=True):
-		"""
-		Returns a list of all users with notes.
-
-		Parameters
-		----------
-		lazy: Bool
-			if set to False, reload a fresh copy of usernotes before listing
-
-		Returns
-		-------
-		List
-			list of strings of every user with usernotes
-		"""
-		if lazy == False: self.load()
-		return list(self.__usernotesJSON['users'].keys())
-
-	def list_notes(self, user, lazy=True, reverse=False):
-		"""
-		Returns a list of all notes for the specified user. Case-insensitive
-
-		Parameters
-		----------
-		user: String, praw.redditor
-			user to fetch notes for
-		lazy: Bool
-			if set to False, reload a fresh copy of usernotes before listing
-		reverse: Bool
-			if set to True, display newest notes first
-
-		Returns
-		-------
-		List
-			list containing ToolboxUsernotes
-
-		Raises
-		------
-		KeyError
-			if user doesn't exist in usernotes
-
-		"""	
-		if lazy == False: self.load()
-		user = str(user) #in case a praw user object is passed
-
-		user = self.__match_username(user)
-
-		try:
-			users_notes = []
-			for note in self.__usernotesJSON['users'][user]['ns']:
-				users_notes.append(
-					ToolboxNote(
-						user = user,
-						note = note['n'],
-						time = note['t'],
-						mod = self.__usernotesJSON['constants']['users'][note['m']],
-						warning = self.__usernotesJSON['constants']['warnings'][note['w']],
-						link = note['l']
-					)
-				)
-			users_notes = sorted(users_notes, key = lambda x: x.time, reverse=reverse)
-			return users_notes
-		except KeyError: return []
-
-	def list_all_notes(self, lazy=True, reverse=False):
-		"""
-		Returns a list of all notes in the wiki
-
-		Parameters
-		----------
-		lazy: Bool
-			if set to True, reload a fresh copy of usernotes before listing
-		reverse: Bool
-			If True, notes are listed newest to oldest
-		Returns
-		-------
-		List
-			list containing ToolboxUsernotes
-		"""	
-		if lazy == False: self.load()
-		notes = []
-		for user in self.list_users():
-			for note in self.list_notes(user):
-				notes.append(note)
-		return sorted(notes, key = lambda x: x.time, reverse=reverse)
-
-	def stream(self, pause_after=None, skip_existing=False):
-		"""
-		Yields new WikiRevision objects as they become available
-
-		Parameters
-		----------
-		pause_after: [Optional] Integer (Default: `None`)
-			An integer representing the number of requests that result in no new 
-			items before this function yields `None`, effectively introducing a 
-			pause into the stream. A negative value yields `None` after items 
-			from a single response have been yielded, regardless of number of new 
-			items obtained in that response. A value of `0` yields `None` after 
-			every response resulting in no new items, and a value of `None` never 
-			introduces a pause.
-		skip_existing: [Optional] Boolean (Default: False)
-			When `True`, this does not yield any results from the first request 
-			thereby skipping any items that existed in the stream prior to starting 
-			the stream.
-
-		Yields
-		------
-		WikiRevision objects
-		
-		"""
-		for revision in revisions_stream(
-			sub=self.__subreddit,
-			page=USERNOTES_PAGE,
-			pause_after = pause_after,
-			skip_existing = skip_existing
-		):
-			yield revision
+import heapq
+import json
+import random
+import re
+import threading
+import time as t
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import islice
+from typing import Optional
+
+from prawcore.exceptions import Conflict, NotFound
+
+from pmtw.archive import UsernotesArchive
+from pmtw.codec import deflate_blob, encode_usernotes, inflate_blob
+from pmtw.constants import (DEFAULT_IDENTIFIER, MAX_WIKI_SIZE, USERNOTES_PAGE,
+                            USERNOTES_VERSION)
+from pmtw.indexes import SizeIndex, SummaryIndex, TimeIndex, entry_size
+from pmtw.locks import ReadWriteLock
+from pmtw.query import NoteQuery, QueryPage
+from pmtw.ratelimit import POLL, READ, WRITE, scheduled
+from pmtw.refresher import BackgroundRefresher
+from pmtw.stream import latest_revision, own_revision, revisions_stream
+from pmtw.writebehind import SpillFile, WriteBehindWorker
+
+# matches the parts of a reddit url that get stripped when compressing it to
+# toolbox's `l,` format
+URL_PREFIX_RE = re.compile(r'(https?:\/\/([a-z]{3}\.)?)?redd\.?it(\.com)?\/(r\/[a-z]*\/)?(comments\/)?', re.IGNORECASE)
+
+# placeholder for derived fields which haven't been computed yet
+_UNSET = object()
+
+
+def _counted(count, noun):
+	"""`count` and `noun` for a wiki page description, e.g. 1 note or 2 notes"""
+	return f"{count:,} {noun}" if count == 1 else f"{count:,} {noun}s"
+
+
+class ToolboxNote:
+	"""Represents a single Toolbox Usernote."""
+	__slots__ = ('user', 'note', 'warning', 'time', 'mod', 'link', '_url', '_human_time')
+
+	def __init__(self, user, note, warning=None, time=None, mod=None, url=None, link='', notes=None):
+		"""
+		Construtor for the ToolboxNote class.
+
+		Parameters
+		----------
+		user: String, praw.redditor object
+			User the note is being left for
+		note: String
+			the text of the usernote
+		warning: String
+			the kind of warning the ntoe should be
+		time: Integer
+			a unix timestamp in seconds. Optional, will set to current time if
+			not specified.
+		mod: String, praw.redditor
+			the moderator issuing the note. Optional, if not set will be set to
+			the user of the praw instance.
+		url: String
+			url attached to the note. If present, gets converted to a toolbox
+			link as `self.link`
+		link: String
+			the toolbox style short link. if set, will expand to a full url
+		notes: ToolboxUsernotes
+			if set to a ToolboxUsernotes instance, immediately adds the note.
+
+		"""
+		self.user = str(user)
+		self.note = note
+		self.warning = warning
+		self.time = time if time else int(t.time())
+		self._human_time = _UNSET
+		self.mod = str(mod)
+		# compressing a url validates it, so that still happens up front
+		if link != '': self.link = link
+		else: self.link = self.__compress_url(url)
+		if url: self._url = url
+		else: self._url = _UNSET
+
+		if notes != None: notes.add(self)
+
+	@property
+	def human_time(self):
+		"""the note's timestamp in a human-readable format, computed on first access"""
+		if self._human_time is _UNSET:
+			self._human_time = datetime.fromtimestamp(self.time).__str__()
+		return self._human_time
+
+	@human_time.setter
+	def human_time(self, value):
+		self._human_time = value
+
+	@property
+	def url(self):
+		"""the full url for the note's link, expanded on first access"""
+		if self._url is _UNSET:
+			self._url = self.__expand_link(self.link)
+		return self._url
+
+	@url.setter
+	def url(self, value):
+		self._url = value
+
+	def __getstate__(self):
+		"""
+		State of the note for pickling and copying. Derived fields are left 
+		out until they've been computed, since the placeholder marking them 
+		wouldn't survive the round trip.
+		"""
+		state = {name: getattr(self, name) for name in ('user', 'note', 'warning', 'time', 'mod', 'link')}
+		if self._url is not _UNSET: state['_url'] = self._url
+		if self._human_time is not _UNSET: state['_human_time'] = self._human_time
+		return state
+
+	def __setstate__(self, state):
+		"""Restore a note from `__getstate__`"""
+		self._url = _UNSET
+		self._human_time = _UNSET
+		for name, value in state.items(): setattr(self, name, value)
+
+	def __repr__(self):
+		"""praw-style representation of the note."""
+		return f"ToolboxNote(user='{self.user}', note='{self.note}', human_time='{self.human_time}')"
+
+	def __dict__(self):
+		"""represnts a dict of the note in the format it's stored uncompressed in the json"""
+		return {'t': self.time, 'n': self.note, 'm': self.mod, 'w': self.warning, 'l': self.link}
+
+	@staticmethod
+	def __expand_link(link):
+		"""
+		expand toolbox's shortlinks to full urls
+		Parameters
+		----------
+		link: String
+			toolbox formatted link to expand to a url
+		Returns
+		-------
+		String
+			an expanded link
+
+		"""
+		if not link: return None #if no link, nothing to do
+		if link == '': return None #if blank link, nothing to do
+		parts = link.split(',') # 'l,abcde,fghij' format for comments, 'l,kmlno' for links
+		if parts[0] == "m": return f'https://reddit.com/message/messages/{parts[1]}'
+		if len(parts) > 2: return f'https://reddit.com/comments/{parts[1]}/-/{parts[2]}'
+		elif len(parts) > 1: return f'https://reddit.com/{parts[1]}'
+		else: return link #modmail links are stored as full links
+
+	@staticmethod
+	def __compress_url(url):
+		"""
+		compress a url to toolbox's `l,` format, if applicable
+
+		Parameters
+		----------
+			url: String
+				url to compress
+
+		Returns
+		-------
+		String
+			the toolbox-formatted link. Recognizes a wide variety of reddit
+			links. The following is a non-exhaustive list to give examples:
+			https://www.reddit.com/r/subreddit/abcdef/comments/ghijkl/
+			http://old.reddit.com/r/subreddit/abcdef/
+			http://reddit.com/r/subreddit/abcdef
+			http://reddit.com/abcdef
+			https://redd.it/abcdef
+			reddit.com/abcdef
+
+		"""
+		if not url: return '' # If link is empty, nothing to compress
+		if url.startswith("l,") or url.startswith("m,"): return url # Link already compressed
+		if "mod.reddit" in url: return url # if link is to modmail message, nothing to compress
+		if not URL_PREFIX_RE.match(url): raise ValueError(f"cannot format {url}")
+		url = URL_PREFIX_RE.sub("", url)
+		url = url.rstrip("/").split("/")
+		if len(url) == 3: return f"l,{url[0]},{url[2]}" #return comment link format "l,abcde,fghij"
+		else: return f"l,{url[0]}" # Return post link format "l,abcde"
+
+
+class UsernotesBatch:
+	"""Collects the edits made inside a `ToolboxUsernotes.batch()` block."""
+	def __init__(self, usernotes, reason, before=None):
+		"""
+		Constructor for the UsernotesBatch class. Use `ToolboxUsernotes.batch()`
+		rather than creating one directly.
+
+		Parameters
+		----------
+		usernotes: ToolboxUsernotes
+			the usernotes being edited
+		reason: String
+			start of the wiki page description for the batch
+		before: Tuple
+			the local copy of usernotes as it was when the batch started, put
+			back if the batch fails
+		"""
+		self.usernotes = usernotes
+		self.reason = reason
+		self.added = 0
+		self.removed = 0
+		self.purged = 0
+		self._before = before
+
+	def __repr__(self):
+		"""Set display for a UsernotesBatch object"""
+		return f"UsernotesBatch(added={self.added}, removed={self.removed}, purged={self.purged})"
+
+	def add(self, note):
+		"""Add a ToolboxNote as part of the batch"""
+		return self.usernotes._batched(self, self.usernotes.add, note, lazy=True)
+
+	def remove(self, user, timestamp=-1):
+		"""Remove a note, or all notes for a user, as part of the batch"""
+		return self.usernotes._batched(self, self.usernotes.remove, user, timestamp, lazy=True)
+
+	def description(self):
+		"""
+		Build the wiki page description for the batch
+
+		Returns
+		-------
+		String
+			the batch reason, followed by counts of what was changed
+		"""
+		counts = []
+		if self.added: counts.append(f"added {_counted(self.added, 'note')}")
+		if self.removed: counts.append(f"removed {_counted(self.removed, 'note')}")
+		if self.purged: counts.append(f"purged {_counted(self.purged, 'user')}")
+		if not counts: return self.reason
+		return f"{self.reason}: {', '.join(counts)}"
+
+
+@dataclass
+class PruneResult:
+	"""Summary of a `ToolboxUsernotes.prune()` run."""
+	users: int
+	notes: int
+	preserved: int
+	sizeBefore: int
+	sizeAfter: int
+	dryRun: bool
+
+	@property
+	def saved(self):
+		"""number of bytes the pruned notes took up on the wiki page"""
+		return self.sizeBefore - self.sizeAfter
+
+@dataclass
+class NoteSummary:
+	"""A user's notes at a glance, from `ToolboxUsernotes.note_summary()`."""
+	user: str
+	count: int
+	latestTime: int
+	latestWarning: Optional[str]
+
+	@property
+	def human_time(self):
+		"""time of the user's newest note, as a human-readable string"""
+		return datetime.fromtimestamp(self.latestTime).__str__()
+
+
+class ToolboxUsernotes:
+	"""
+	Represents the Toolbox Usernotes page. Instances can be shared between 
+	threads: reads run in parallel, edits and saves take turns, and reloads 
+	swap in a freshly decoded copy without making reads wait for the network.
+	"""
+	
+	def __init__(self, subreddit, identifier=DEFAULT_IDENTIFIER, settingsWarnings=[], lazy=False, archiveThreshold=None, snapshots=None, conflictRetries=3):
+		"""
+		Construtor for the ToolboxUsernotes class.
+
+		Parameters
+		----------
+		subreddit: praw.Subreddit object
+			The praw object representing the subreddit to pull notes from
+		lazy: Bool
+			If False, fetch notes from Reddit on instantiation
+		identifier: String
+			string to identify all actions taken in the wiki save description
+		settingsWarnings: List
+			Note types which are in Settings which may or may not be present in 
+			the usernotes wiki page
+		archiveThreshold: Integer
+			Optional. if set, whenever a save would make the usernotes page 
+			bigger than this many bytes, the oldest notes are first moved to 
+			archive pages until the page is back under 90% of it
+		snapshots: SnapshotStore
+			Optional. local store to start loads from, only downloading the 
+			usernotes page when it has changed since the stored snapshot
+		conflictRetries: Integer
+			Optional. how many times a save which conflicts with another edit 
+			of the page is merged and retried before giving up, defaults to 3
+		"""
+		self.warnings = []
+		self.archiveThreshold = archiveThreshold
+		self.conflictRetries = conflictRetries
+		self.__subreddit = subreddit
+		self.__identifier = identifier
+		self.__usernotesJSON = {}
+		self.__usernameIndex = {}
+		self.__modIndex = {}
+		self.__warningIndex = {}
+		self.__timeIndex = None
+		self.__sizeIndex = None
+		self.__summaryIndex = None
+		self.__pageSize = 0
+		self.__blobSize = 0
+		self.__generation = 0
+		self.__savedGeneration = 0
+		self.__encoded = None
+		self.__revision = None
+		self.__ops = []
+		self.__batch = None
+		self.__batchThread = threading.local()
+		self.__batchClosed = threading.Condition()
+		self.__archive = UsernotesArchive(subreddit, identifier)
+		self.__snapshots = snapshots
+		self.__settingsWarnings = settingsWarnings
+		self.__lock = ReadWriteLock()
+		self.__indexLock = threading.Lock()
+		self.__refresher = None
+		self.__writeBehind = None
+		self.__spill = None
+		self.__flushReason = None
+
+		if not lazy: self.load()
+
+	def __str__(self):
+		"""return the uncompessed json from the usernotes page as a string"""
+		with self.__lock.read(): return str(self.__usernotesJSON)
+
+	def __repr__(self):
+		"""Set display for a ToolboxUsernotes object"""
+		return f"ToolboxUsernotes(subreddit='{self.__subreddit}')"
+
+	def __expand_json(self, notes):
+		"""
+		Private method used to expand the blob portion of usernotes
+		
+		Parameters
+		----------
+		notes: Dictionary
+			dictionary representing the usernotes JSON
+
+		Returns
+		-------
+		Dictionary
+			dictionary representing the usernotes JSON with blob expanded
+
+
+		"""
+		with self.__lock.write():
+			self.__blobSize = len(notes['blob'])
+			notes['users'] = inflate_blob(notes.pop('blob')) # replace the Blob section with the decoded users section
+			self.__adopt(notes)
+			return notes
+
+	def __adopt(self, notes):
+		"""
+		Private method. Makes decoded usernotes JSON the local copy, rebuilding 
+		the indexes over it.
+		"""
+		self.__usernotesJSON = notes
+		self.__index_usernames()
+		self.__index_constants()
+		self.__timeIndex = None
+		self.__sizeIndex = None
+		self.__summaryIndex = None
+		self.__generation += 1
+
+	def __index_usernames(self):
+		"""
+		Private method. Builds the casefolded username -> wiki key lookup used by
+		__match_username. If the wiki holds several keys differing only in case,
+		the first one encountered wins, as it did with the old linear search.
+		"""
+		index = {}
+		for user in self.__usernotesJSON['users']:
+			index.setdefault(user.casefold(), user)
+		self.__usernameIndex = index
+
+	def __index_constants(self):
+		"""
+		Private method. Builds the name -> index lookups for the mods and 
+		warnings stored in the usernotes constants, so resolving an index 
+		doesn't have to search the lists.
+		"""
+		mods = {}
+		for i, mod in enumerate(self.__usernotesJSON['constants']['users']):
+			mods.setdefault(mod, i)
+		warnings = {}
+		for i, warning in enumerate(self.__usernotesJSON['constants']['warnings']):
+			warnings.setdefault(warning, i)
+		self.__modIndex = mods
+		self.__warningIndex = warnings
+
+	def __time_index(self):
+		"""
+		Private method. Returns the time index over the local copy of 
+		usernotes, building it on first use. The index is dropped whenever 
+		usernotes are reloaded, and kept up to date by add and remove. Readers 
+		holding only the read lock can get here together, so the build is 
+		guarded by a lock of its own.
+		"""
+		index = self.__timeIndex
+		if index is None:
+			with self.__indexLock:
+				index = self.__timeIndex
+				if index is None: index = self.__timeIndex = TimeIndex(self.__usernotesJSON['users'])
+		return index
+
+	def __size_index(self, wikipage_data=None):
+		"""
+		Private method. Returns the size index over the local copy of 
+		usernotes, building it on first use. The index is calibrated against 
+		the page as it was loaded, unless the local copy has been edited since,
+		in which case it's encoded once to calibrate against. If 
+		`wikipage_data` is passed, the index is recalibrated against it.
+		"""
+		if self.__sizeIndex is None:
+			self.__sizeIndex = SizeIndex(self.__usernotesJSON['users'])
+			if wikipage_data is None:
+				if self.dirty: wikipage_data = self.__compress_json()
+				else: self.__sizeIndex.calibrate(self.__pageSize, self.__blobSize, self.__overhead())
+		if wikipage_data is not None:
+			overhead = self.__overhead()
+			self.__sizeIndex.calibrate(len(wikipage_data), len(wikipage_data) - overhead, overhead)
+		return self.__sizeIndex
+
+	def __summary_index(self):
+		"""
+		Private method. Returns the summary index over the local copy of 
+		usernotes, building it on first use. The index is dropped whenever 
+		usernotes are reloaded, and kept up to date by every edit. Like the 
+		time index, it's built under its own lock, since readers get here too.
+		"""
+		index = self.__summaryIndex
+		if index is None:
+			with self.__indexLock:
+				index = self.__summaryIndex
+				if index is None: index = self.__summaryIndex = SummaryIndex(self.__usernotesJSON['users'])
+		return index
+
+	def __overhead(self):
+		"""
+		Private method. Length of the encoded page outside of the blob, which 
+		changes only when mods or warnings are added to the constants.
+		"""
+		page = {key: value for key, value in self.__usernotesJSON.items() if key != 'users'}
+		page['blob'] = ''
+		return len(json.dumps(page))
+
+	def __touch(self, *users):
+		"""
+		Private method. Records that the local copy has been edited, which 
+		makes it dirty and invalidates the cached encoding, and marks the 
+		changed users for remeasuring by the size index.
+		"""
+		self.__generation += 1
+		if self.__sizeIndex is not None:
+			for user in users: self.__sizeIndex.touch(user)
+		if self.__summaryIndex is not None:
+			for user in users: self.__summaryIndex.touch(user)
+
+	def __notes_at(self, keys):
+		"""
+		Private method. Finds the raw notes for (timestamp, user) pairs from the
+		time index, yielding (user, ordinal, note) for each, where ordinal is 
+		the note's position among that user's notes with the same timestamp. 
+		Identical pairs are next to each other in the index, and every note 
+		they stand for is yielded on the first of them.
+		"""
+		users = self.__usernotesJSON['users']
+		previous = None
+		for key in keys:
+			if key == previous: continue
+			previous = key
+			time, user = key
+			ordinal = 0
+			for note in users[user]['ns']:
+				if note['t'] != time: continue
+				yield user, ordinal, note
+				ordinal += 1
+
+	def __build_note(self, user, note, constants=None):
+		"""
+		Private method. Builds a ToolboxNote from a note as stored in the 
+		decoded usernotes JSON. Notes taken from an earlier copy of usernotes 
+		must be passed that copy's `constants`.
+		"""
+		if constants is None: constants = self.__usernotesJSON['constants']
+		return ToolboxNote(
+			user = user,
+			note = note['n'],
+			time = note['t'],
+			mod = constants['users'][note['m']],
+			warning = constants['warnings'][note['w']],
+			link = note['l']
+		)
+
+	def __resolve_warnings(self, warning):
+		"""
+		Private method. Resolves a warning filter (a name or list of names) to 
+		the set of indexes stored in notes, or None if there's no filter.
+		"""
+		if warning is None: return None
+		if isinstance(warning, str): warning = [warning]
+		return {self.__warningIndex[w] for w in warning if w in self.__warningIndex}
+
+	def __resolve_mods(self, mod):
+		"""
+		Private method. Resolves a mod filter (a name, praw.redditor, or list 
+		of either) to the set of indexes stored in notes, or None if there's no
+		filter.
+		"""
+		if mod is None: return None
+		if not isinstance(mod, list): mod = [mod]
+		return {self.__modIndex[str(m)] for m in mod if str(m) in self.__modIndex}
+
+	def __compress_json(self, notes=None):
+		"""
+		Private method to compress json usernotes into a blob for the wiki page
+		
+		Parameters
+		----------
+		notes: Dictionary
+			usernotes wiki page in dictionary format. Works on self.__usernotesJSON
+			if an explicit object is not supplied. This variable exists largely
+			for backwards-compatibilty reasons.
+
+		Returns
+		-------
+		String
+			the compressed JSON object, per toolbox's compression methods. The 
+			encoding of self.__usernotesJSON is cached until the next edit
+		
+		"""
+		if notes is not None: return encode_usernotes(notes)
+		if self.__encoded is None or self.__encoded[0] != self.__generation:
+			self.__encoded = (self.__generation, encode_usernotes(self.__usernotesJSON))
+		return self.__encoded[1]
+
+	def __get_warnings(self):
+		""""
+		Private method. Gets warnings from the usernotes json, and appends
+		other available warnings passed to the constructor
+		"""
+		self.warnings = self.__usernotesJSON['constants']['warnings'].copy()
+		if None not in self.warnings: self.warnings.append(None)
+		for usernoteColor in self.__settingsWarnings:
+			if usernoteColor not in self.warnings:
+				self.warnings.append(usernoteColor)
+		
+	def __get_mod_index(self, mod):
+		"""
+		Private method. Toolbox stores the moderator as an index for a given 
+		note, not the actual name. This method fetches the appropriate unstable 
+		index for a given mod, adding the mod to the list of mods if needed.
+
+		Parameters
+		----------
+		mod: String
+			The mod to get the list index for
+
+		Returns
+		-------
+		Integer
+			the integer index of the mod
+
+		"""
+		try:
+			return self.__modIndex[mod]
+		except KeyError:
+			self.__usernotesJSON['constants']['users'].append(mod)
+			self.__modIndex[mod] = len(self.__usernotesJSON['constants']['users']) - 1
+			return self.__modIndex[mod]
+
+	def __get_warning_index(self, warning):
+		"""
+		Private method. Toolbox stores warnings as an index for a given 
+		note, not the actual warning name. This method fetches the appropriate 
+		unstable index for a given warning, adding the warning to the list of 
+		warnings in the usernote page if the warning exists in settings but not
+		in usernotes.
+
+		Parameters
+		----------
+		warning: String
+			The warning to get the list index for
+
+		Returns
+		-------
+		Integer
+			the integer index of the warning
+
+		Raises
+		------
+		ValueError
+			If the input warning is not valid for these usernotes
+
+		"""
+		try:
+			return self.__warningIndex[warning]
+		except KeyError:
+			if warning in self.warnings:
+				self.__usernotesJSON['constants']['warnings'].append(warning)
+				self.__warningIndex[warning] = len(self.__usernotesJSON['constants']['warnings']) - 1
+				return self.__warningIndex[warning]
+			else:
+				raise ValueError(f"{warning} is not a valid warning.")
+
+	def __match_username(self, username):
+		"""
+		Try to match a user with notes and get the proper capitalization for key
+		""" 
+		return self.__usernameIndex.get(username.casefold(), username)
+
+	def __keep(self):
+		"""
+		Private method. Takes a copy of the local usernotes, along with the 
+		revision they were loaded from and their unsaved edits, for `__restore`.
+		Edits replace user entries rather than changing them, so only the 
+		containers need copying.
+		"""
+		notes = self.__usernotesJSON
+		constants = notes['constants']
+		notes = dict(
+			notes,
+			constants = dict(constants, users=list(constants['users']), warnings=list(constants['warnings'])),
+			users = dict(notes['users'])
+		)
+		return notes, self.__revision, self.__pageSize, self.__blobSize, list(self.__ops), self.dirty
+
+	def __restore(self, kept):
+		"""
+		Private method. Puts back a copy of usernotes taken by `__keep` exactly
+		as it was, even if the local copy has since been rebased onto a newer
+		revision. Called with the write lock held.
+		"""
+		notes, revision, pageSize, blobSize, ops, dirty = kept
+		self.__blobSize = blobSize
+		self.__adopt(notes)
+		self.__loaded(revision, pageSize)
+		self.__ops = ops
+		if dirty: self.__generation += 1
+		self.__sync_spill()
+
+	def __in_batch(self):
+		"""
+		Private method. True if a batch is open and the calling thread is 
+		making its edits.
+		"""
+		return self.__batch is not None and getattr(self.__batchThread, 'batch', None) is self.__batch
+
+	@contextmanager
+	def __joined(self, batch):
+		"""
+		Private method. Context manager making the calling thread's edits part 
+		of `batch`.
+		"""
+		previous = getattr(self.__batchThread, 'batch', None)
+		self.__batchThread.batch = batch
+		try:
+			yield
+		finally:
+			self.__batchThread.batch = previous
+
+	def _batched(self, batch, function, *args, **kwargs):
+		"""
+		Private method. Calls `function` as part of `batch`, from whichever 
+		thread. Used by UsernotesBatch, and by async batches, whose edits are 
+		made on worker threads.
+		"""
+		with self.__joined(batch):
+			return function(*args, **kwargs)
+
+	@contextmanager
+	def __editing(self):
+		"""
+		Private method. Context manager holding the write lock for an edit. If
+		another thread has a batch open, waits for it to be closed first, 
+		unless the edit is part of the batch.
+		"""
+		while True:
+			with self.__batchClosed:
+				while self.__batch is not None and not self.__in_batch(): self.__batchClosed.wait()
+			with self.__lock.write():
+				# a batch may have been opened while we were waiting for the lock
+				if self.__batch is None or self.__in_batch():
+					yield
+					return
+
+	def _open_batch(self, reason):
+		"""
+		Private method. Refreshes usernotes and opens a batch, for `batch()` 
+		and `AsyncToolboxUsernotes.batch()`.
+
+		Returns
+		-------
+		UsernotesBatch
+			the batch, to be closed with `_close_batch`
+		"""
+		if self.__in_batch(): raise RuntimeError("A batch is already in progress for these usernotes")
+		self.refresh()
+		with self.__editing():
+			batch = UsernotesBatch(self, reason, self.__keep())
+			self.__batch = batch
+			return batch
+
+	def _close_batch(self, batch, failed=False):
+		"""
+		Private method. Closes a batch opened by `_open_batch`, saving its 
+		edits, or putting back the local copy from before it if `failed` is 
+		set or the save fails.
+		"""
+		try:
+			if not failed and (batch.added or batch.removed): self._batched(batch, self.save, batch.description())
+		except BaseException:
+			failed = True
+			raise
+		finally:
+			with self.__lock.write():
+				# the save may have rebased onto a newer revision, so the old 
+				# copy is put back whole rather than undoing the batch's edits
+				if failed: self.__restore(batch._before)
+				self.__batch = None
+			with self.__batchClosed: self.__batchClosed.notify_all()
+
+	@contextmanager
+	def batch(self, reason='Bulk usernote update'):
+		"""
+		Context manager which groups many note edits into a single load and 
+		save. Usernotes are refreshed once on entry; every add and remove made 
+		inside the block, through the batch or through this object on the 
+		thread which opened it, is applied to the local copy only, and one wiki
+		edit describing all of them is saved on exit. Edits and saves made on 
+		other threads wait until the batch is closed. If an exception is raised
+		inside the block, or the save fails, the local copy is put back as it 
+		was when the block was entered, and the wiki page is left untouched.
+
+		Parameters
+		----------
+		reason: String
+			Optional, the start of the wiki page description. The number of 
+			notes added and removed is appended to it.
+
+		Yields
+		------
+		UsernotesBatch
+			object to make edits through, and which counts them
+
+		Raises
+		------
+		RuntimeError
+			if this thread already has a batch open on these usernotes
+		"""
+		batch = self._open_batch(reason)
+		# the lock isn't held between entry and exit; edits inside the block 
+		# take it, and other threads' edits wait for the batch to be closed
+		try:
+			with self.__joined(batch):
+				yield batch
+		except BaseException:
+			self._close_batch(batch, failed=True)
+			raise
+		self._close_batch(batch)
+
+	def prune(self, before, excludeKinds=[], keepLatest=None, dryRun=False, reason='Pruned usernotes'):
+		"""
+		Bulk-removes notes older than a cutoff in a single pass over the local
+		copy of usernotes, then saves once. Usernotes are not reloaded, so 
+		call `refresh()` first if the local copy may be out of date.
+
+		Parameters
+		----------
+		before: Int
+			unix timestamp (in seconds). Notes at or before this time are pruned
+		excludeKinds: List, String
+			warning types to preserve, even if older than the cutoff
+		keepLatest: Int
+			Optional. if set, each user's newest `keepLatest` notes are 
+			preserved, even if older than the cutoff
+		dryRun: Bool
+			if True, work out what would be pruned without changing anything
+		reason: String
+			Optional, the start of the wiki page description. The number of 
+			notes and users pruned is appended to it.
+
+		Returns
+		-------
+		PruneResult
+			counts of pruned users and notes, preserved notes, and the size of
+			the wiki page before and after pruning
+		"""
+		description = None
+		with self.__editing():
+			if isinstance(excludeKinds, str): excludeKinds = [excludeKinds]
+			excluded = {self.__warningIndex[kind] for kind in excludeKinds if kind in self.__warningIndex}
+			users = self.__usernotesJSON['users']
+
+			pruned = {}
+			notes_count = 0
+			preserved_count = 0
+			for user, entry in users.items():
+				notes = entry['ns']
+				protected = ()
+				if keepLatest:
+					protected = set(heapq.nlargest(keepLatest, range(len(notes)), key=lambda i: notes[i]['t']))
+				kept = []
+				for i, note in enumerate(notes):
+					if note['t'] > before:
+						kept.append(note)
+					elif note['w'] in excluded or i in protected:
+						preserved_count += 1
+						kept.append(note)
+				if len(kept) != len(notes):
+					pruned[user] = kept
+					notes_count += len(notes) - len(kept)
+
+			size_before = len(self.__compress_json())
+			if dryRun:
+				projected = dict(users)
+				for user, kept in pruned.items():
+					if kept: projected[user] = dict(projected[user], ns=kept)
+					else: del projected[user]
+				size_after = len(self.__compress_json(dict(self.__usernotesJSON, users=projected)))
+			else:
+				for user, kept in pruned.items():
+					remaining = {id(note) for note in kept}
+					for note in users[user]['ns']:
+						if id(note) not in remaining: self.__log('remove', user, note['t'])
+					if kept: users[user] = dict(users[user], ns=kept)
+					else:
+						del users[user]
+						self.__usernameIndex.pop(user.casefold(), None)
+				if pruned:
+					self.__timeIndex = None
+					self.__touch(*pruned)
+				size_after = len(self.__compress_json())
+				if self.__in_batch(): self.__batch.removed += notes_count
+				elif pruned: description = f"{reason}: removed {_counted(notes_count, 'note')} on {_counted(len(pruned), 'user')}"
+
+		if description is not None: self.save(description)
+		return PruneResult(len(pruned), notes_count, preserved_count, size_before, size_after, dryRun)
+
+	def __archive_oldest(self, target, reason='Archived old usernotes'):
+		"""
+		Private method. Moves the oldest notes to archive pages until the 
+		encoded usernotes page is no bigger than `target` bytes. The notes to 
+		move are picked with the write lock held, but the archive pages are 
+		written without it, and the notes are only removed from the local copy
+		afterwards, so a failed archive write loses nothing. Notes removed in 
+		the meantime are skipped.
+
+		Returns
+		-------
+		Integer
+			the number of notes archived
+		"""
+		with self.__editing():
+			users = self.__usernotesJSON['users']
+			wikipage_data = self.__compress_json()
+			total = len(self.__time_index())
+			count = 0
+			projected = users
+			while len(wikipage_data) > target and count < total:
+				# estimate how many notes need to go from how far over the target 
+				# the page is, overshooting a little to save encoding passes
+				count = min(total, count + max(1, int(total * (1 - target / len(wikipage_data)) * 1.1)))
+				oldest = list(islice(self.__notes_at(self.__time_index().between()), count))
+				moving = {}
+				for user, ordinal, note in oldest: moving.setdefault(user, set()).add(id(note))
+				projected = dict(users)
+				for user, ids in moving.items():
+					kept = [note for note in users[user]['ns'] if id(note) not in ids]
+					if kept: projected[user] = dict(users[user], ns=kept)
+					else: del projected[user]
+				wikipage_data = self.__compress_json(dict(self.__usernotesJSON, users=projected))
+			if count == 0: return 0
+			generation = self.__generation
+			mods = self.__usernotesJSON['constants']['users']
+			warnings = self.__usernotesJSON['constants']['warnings']
+			archived = [(user, dict(note, m=mods[note['m']], w=warnings[note['w']])) for user, ordinal, note in oldest]
+
+		self.__archive.append(archived, reason)
+
+		with self.__editing():
+			users = self.__usernotesJSON['users']
+			moved = {}
+			for user, ordinal, note in oldest:
+				if user not in users: continue
+				kept = moved.setdefault(user, list(users[user]['ns']))
+				# matched by value, in case the local copy was reloaded meanwhile
+				if note not in kept: continue
+				kept.remove(note)
+				self.__log('remove', user, note['t'])
+			for user, kept in moved.items():
+				if kept: users[user] = dict(users[user], ns=kept)
+				else:
+					del users[user]
+					self.__usernameIndex.pop(user.casefold(), None)
+			unchanged = self.__generation == generation
+			self.__timeIndex = None
+			self.__touch(*moved)
+			if unchanged: self.__encoded = (self.__generation, wikipage_data)
+		return count
+
+	def archive(self, target=None, reason='Archived old usernotes'):
+		"""
+		Moves the oldest notes to archive pages (`usernotes/archive/<n>`) until
+		the usernotes page is no bigger than `target` bytes, then saves the 
+		usernotes page. The usernotes page keeps the format the Toolbox browser
+		extension expects; archived notes can be read back through 
+		`list_notes(user, archived=True)`.
+
+		Parameters
+		----------
+		target: Integer
+			Optional. size in bytes to shrink the usernotes page to. Defaults to
+			90% of `archiveThreshold`, or of the maximum wiki page size if no 
+			threshold is set
+		reason: String
+			Optional, set a custom reason for the wiki page descriptions
+
+		Returns
+		-------
+		String
+			Wiki page update description, or None if nothing needed archiving
+
+		Raises
+		------
+		RuntimeError
+			if called inside a batch
+		"""
+		if self.__in_batch(): raise RuntimeError("Usernotes can't be archived inside a batch")
+		if target is None: target = int((self.archiveThreshold or MAX_WIKI_SIZE) * 0.9)
+		count = self.__archive_oldest(target, reason)
+		if count == 0: return None
+		return self.save(f"{reason}: moved {_counted(count, 'note')} to the archive")
+
+	@property
+	def dirty(self):
+		"""True if the local copy has edits which haven't been saved"""
+		return self.__generation != self.__savedGeneration
+
+	def page_size(self):
+		"""
+		Encodes the local copy of usernotes to measure exactly how big the 
+		usernotes page would be if saved now. Size estimates are recalibrated 
+		against the result.
+
+		Returns
+		-------
+		Integer
+			size of the encoded usernotes page, in bytes
+		"""
+		with self.__lock.write():
+			wikipage_data = self.__compress_json()
+			self.__size_index(wikipage_data)
+			return len(wikipage_data)
+
+	def estimated_size(self):
+		"""
+		Estimates how big the usernotes page would be if saved now, without 
+		compressing it. Only the users edited since the last load or save are
+		serialized again; their change in size is scaled by the compression 
+		ratio measured the last time the page was loaded or saved.
+
+		Returns
+		-------
+		Integer
+			estimated size of the encoded usernotes page, in bytes
+		"""
+		with self.__lock.write():
+			return self.__size_index().estimate(self.__overhead())
+
+	def pending_size(self):
+		"""
+		Estimates how much unsaved edits to the local copy change the size of 
+		the usernotes page.
+
+		Returns
+		-------
+		Integer
+			estimated change in bytes since the page was last loaded or saved. 
+			Negative if the edits shrink the page
+		"""
+		return self.estimated_size() - self.__pageSize
+
+	def headroom(self):
+		"""
+		Estimates how much room is left on the usernotes page.
+
+		Returns
+		-------
+		Integer
+			estimated bytes left before the usernotes page reaches the wiki page
+			size limit, including unsaved edits. Negative if the page would be 
+			too big to save
+		"""
+		return MAX_WIKI_SIZE - self.estimated_size()
+
+	def note_size(self, note):
+		"""
+		Estimates how many bytes adding a note would add to the usernotes page,
+		without adding it. Bots can compare this against `headroom()` to 
+		refuse or redirect a note before a save fails.
+
+		Parameters
+		----------
+		note: ToolboxNote object
+			note to estimate the size of
+
+		Returns
+		-------
+		Integer
+			estimated bytes the note would add to the encoded page
+		"""
+		with self.__lock.write():
+			index = self.__size_index()
+			new_note = note.__dict__()
+			constants = self.__usernotesJSON['constants']
+			extra = 0
+			if new_note['m'] not in self.__modIndex:
+				if new_note['m'] != 'None': extra += len(json.dumps(new_note['m'])) + 2
+				new_note['m'] = len(constants['users'])
+			else: new_note['m'] = self.__modIndex[new_note['m']]
+			warning = None if new_note['w'] == 'None' else new_note['w']
+			if warning not in self.__warningIndex:
+				extra += len(json.dumps(warning)) + 2
+				new_note['w'] = len(constants['warnings'])
+			else: new_note['w'] = self.__warningIndex[warning]
+
+			user = self.__match_username(note.user)
+			raw = len(json.dumps(new_note))
+			if user in self.__usernotesJSON['users']: raw += 2
+			else: raw += entry_size(user, {'ns': []})
+			return round(raw * index.ratio) + extra
+
+	def user_size(self, user):
+		"""
+		Estimates how many bytes of the usernotes page a user's notes take up.
+		Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to measure
+
+		Returns
+		-------
+		Integer
+			estimated bytes of the encoded page taken up by the user, or 0 if 
+			the user has no notes
+		"""
+		with self.__lock.write():
+			index = self.__size_index()
+			return round(index.user_size(self.__match_username(str(user))) * index.ratio)
+
+	def largest_users(self, count=10):
+		"""
+		Lists the users whose notes take up the most of the usernotes page.
+
+		Parameters
+		----------
+		count: Integer
+			Optional. number of users to list, defaults to 10
+
+		Returns
+		-------
+		List
+			(user, estimated bytes) tuples, biggest first
+		"""
+		with self.__lock.write():
+			index = self.__size_index()
+			return [(user, round(size * index.ratio)) for user, size in index.largest(count)]
+
+	def save(self, reason='Usernote update', force=False):
+		"""
+		Save usernotes to Reddit, with whatever reason is specified. Will raise 
+		an OverflowError if the current data is too big for the wiki page. 
+		Nothing is saved if the local copy hasn't been edited since it was last
+		loaded or saved.
+
+		The save is made against the revision the local copy was loaded from. 
+		If someone else has edited the page since, the latest revision is 
+		fetched, the notes added and removed since the local copy was loaded 
+		are replayed on top of it, and the save is retried after a short random
+		delay, up to `conflictRetries` times.
+
+		Parameters
+		----------
+			reason: String
+				Optional, set a custom reason for the wiki page description
+			force: Bool
+				Optional, save even if no edits have been recorded, for when the
+				usernotes JSON has been modified directly. Forced saves overwrite
+				the page without checking for other edits, since direct changes 
+				can't be replayed
+
+		Returns
+		-------
+		String
+			Wiki page update description, or None if there was nothing to save
+
+		Raises
+		------
+		OverflowError
+			If he text is larger than the allowed 1mb wikipage size, even after 
+			archiving if `archiveThreshold` is set
+		prawcore.exceptions.Conflict
+			If the page kept changing through every retry
+		"""
+		reason = f"{reason} {self.__identifier}"
+		attempt = 0
+		copy = None
+		archived = False
+		while True:
+			delay = 0
+			with self.__editing():
+				# the latest revision is downloaded without holding the lock, and
+				# only rebased onto if nothing else reloaded or saved meanwhile
+				if copy is not None and self.__revision == base: self.__rebase(copy)
+				if not force and not self.dirty: return None
+				base = self.__revision
+				if force:
+					# the JSON may have been changed directly, behind the caches' backs
+					self.__generation += 1
+					self.__sizeIndex = None
+					self.__summaryIndex = None
+				# without a known base revision, other edits can't be detected,
+				# so the page is downloaded and rebased onto first
+				ready = force or base is not None or copy is not None
+				if ready:
+					wikipage_data = self.__compress_json()
+					archiving = not archived and self.archiveThreshold and len(wikipage_data) > self.archiveThreshold
+					if not archiving and len(wikipage_data) > MAX_WIKI_SIZE:
+						raise OverflowError(f'Usernote data {len(wikipage_data) - MAX_WIKI_SIZE} bytes too big to insert')
+					generation = self.__generation
+					ops = list(self.__ops)
+			if ready and archiving:
+				# archiving takes the lock only around picking and removing notes,
+				# then the page is encoded again without them
+				self.__archive_oldest(int(self.archiveThreshold * 0.9))
+				archived = True
+				copy = None
+				continue
+			if ready:
+				# the wiki edit is made without holding the lock, so reads and 
+				# edits carry on while it's in flight
+				try:
+					previous = {} if force else {'previous': base}
+					scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki[USERNOTES_PAGE].edit(content=wikipage_data, reason=reason, **previous))
+				except Conflict:
+					# the page changed since our copy was loaded
+					if attempt >= self.conflictRetries: raise
+					delay = random.uniform(0, min(8, 2 ** attempt))
+					attempt += 1
+				else:
+					revision = own_revision(self.__subreddit, USERNOTES_PAGE, reason)
+					with self.__lock.write(): self.__saved(wikipage_data, revision, base, generation, ops)
+					return reason
+			t.sleep(delay)
+			copy = self.__decode_page(READ)
+
+	def __saved(self, wikipage_data, revision, base, generation, ops):
+		"""
+		Private method. Records that `wikipage_data`, encoded from the local 
+		copy at `generation` with `ops` logged, was saved as `revision`. If the
+		local copy was edited while the page was being written, only the edits
+		made since are kept logged, and the copy stays dirty. Called with the 
+		write lock held.
+		"""
+		if self.__generation == generation:
+			# our copy matches the page as long as nobody else has edited it since
+			self.__revision = revision
+			self.__pageSize = len(wikipage_data)
+			self.__blobSize = len(wikipage_data) - self.__overhead()
+			self.__savedGeneration = generation
+			self.__ops = []
+			self.__sync_spill()
+			if self.__writeBehind is not None: self.__writeBehind.flushed()
+			if self.__sizeIndex is not None: self.__size_index(wikipage_data)
+			self.__snapshot()
+			if self.__refresher is not None and self.__revision is not None: self.__refresher.current()
+		elif self.__revision == base and self.__ops[:len(ops)] == ops:
+			# the page holds the local copy as it was encoded, so the later edits
+			# are all that's left to save on top of it
+			self.__revision = revision
+			self.__ops = self.__ops[len(ops):]
+			self.__sync_spill()
+			if self.__writeBehind is not None: self.__writeBehind.flushed(len(self.__ops))
+		# otherwise the local copy was reloaded or rolled back meanwhile, and the 
+		# next save conflicts and rebases onto the saved page
+
+	def __rebase(self, copy):
+		"""
+		Private method. Replaces the local copy with a newer revision of the 
+		page, downloaded by `__decode_page`, and replays the notes added and 
+		removed since the local copy was loaded on top of it. Additions are 
+		matched on user, timestamp and text, and removals on user and 
+		timestamp; edits which the page already reflects are skipped, so 
+		concurrent edits by others are kept. Called with the write lock held.
+		"""
+		ops = self.__ops
+		self.__install(copy)
+		self.__replay(ops)
+		self.__sync_spill()
+
+	def __replay(self, ops):
+		"""
+		Private method. Applies logged edits to the local copy, skipping those 
+		it already reflects.
+		"""
+		users = self.__usernotesJSON['users']
+		for op in ops:
+			if op[0] == 'add':
+				note = op[1]
+				existing = users.get(self.__match_username(note.user), {'ns': []})['ns']
+				if any(n['t'] == note.time and n['n'] == note.note for n in existing): continue
+				# the warning was valid when the note was first added
+				if note.warning not in self.warnings: self.warnings.append(note.warning)
+				self.__add(note)
+			else:
+				user = self.__match_username(op[1])
+				existing = users.get(user, {'ns': []})['ns']
+				if any(n['t'] == op[2] for n in existing): self.__remove(user, op[2])
+
+	def load(self):
+		"""
+		Fetch usernotes from Reddit. Initializes a wiki page if the page doesn't 
+		currently exist. If a snapshot store is set and holds a snapshot of the
+		page's latest revision, usernotes are loaded from it instead.
+
+		The page is downloaded and decoded off to the side and swapped in 
+		afterwards, so reads carry on against the old copy in the meantime.
+
+		Unsaved edits are discarded with the old copy, except in write-behind
+		mode, where edits queued for saving are replayed onto the new copy and
+		kept in the spill file.
+
+		Returns
+		-------
+		String
+			message informing of successful usernote load
+
+		Raises
+		------
+		RuntimeError
+			if the schema doesn't match the expected version.
+
+		"""
+		copy = None
+		if self.__snapshots is not None:
+			copy = self.__from_snapshot(latest_revision(self.__subreddit, USERNOTES_PAGE))
+		message = "Usernotes loaded from snapshot"
+		if copy is None:
+			copy = self.__decode_page(READ)
+			message = "Usernotes loaded"
+		with self.__editing():
+			if self.__writeBehind is not None and self.__ops: self.__rebase(copy)
+			else: self.__install(copy)
+			self.__sync_spill()
+		return message
+
+	def __download(self, priority):
+		"""
+		Private method. Downloads the usernotes page through the request
+		scheduler, sharing the download with any identical one in flight.
+
+		Returns
+		-------
+		Tuple
+			the page's content and revision ID
+		"""
+		def download():
+			page = self.__subreddit.wiki[USERNOTES_PAGE]
+			return page.content_md, page.revision_id
+		return scheduled(self.__subreddit, priority, download, key=(str(self.__subreddit).lower(), USERNOTES_PAGE, 'page'))
+
+	def __decode_page(self, priority):
+		"""
+		Private method. Downloads and decodes the usernotes page without 
+		touching the local copy, creating the page if it doesn't exist.
+
+		Returns
+		-------
+		Tuple
+			a copy of usernotes for `__install`: the decoded JSON, its revision
+			ID, the page and blob sizes, and whether it came from a snapshot
+		"""
+		try:
+			usernotes, revision = self.__download(priority)
+			notes = json.loads(usernotes)
+		except NotFound:
+			initialJson = {"ver":USERNOTES_VERSION,"constants":{"users":[],"warnings":[]}, "blob":deflate_blob({})}
+			usernotes = json.dumps(initialJson)
+			scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki.create(name=USERNOTES_PAGE, content=usernotes, reason=f"Initialize usernotes {self.__identifier}"))
+			scheduled(self.__subreddit, WRITE, lambda: self.__subreddit.wiki[USERNOTES_PAGE].mod.update(listed=False, permlevel=2))
+			revision = None
+			notes = initialJson
+		if notes['ver'] != USERNOTES_VERSION:
+			raise RuntimeError(f"Usernotes Schema mismatch. PMTAW requires {USERNOTES_VERSION}, wiki page is {notes['ver']}")
+		blobSize = len(notes['blob'])
+		notes['users'] = inflate_blob(notes.pop('blob'))
+		return notes, revision, len(usernotes), blobSize, False
+
+	def __from_snapshot(self, latest):
+		"""
+		Private method. Reads a copy of usernotes for `__install` from the 
+		snapshot store, if it holds a snapshot of the `latest` revision of the
+		page, or returns None.
+		"""
+		if latest is None: return None
+		snapshot = self.__snapshots.get(self.__subreddit, USERNOTES_PAGE, latest['id'])
+		if snapshot is None: return None
+		pageSize, blobSize, notes = snapshot
+		return notes, latest['id'], pageSize, blobSize, True
+
+	def __install(self, copy):
+		"""
+		Private method. Makes a copy from `__decode_page` or `__from_snapshot`
+		the local copy, and records the revision it matches. Called with the 
+		write lock held.
+		"""
+		notes, revision, pageSize, blobSize, snapshotted = copy
+		self.__blobSize = blobSize
+		self.__adopt(notes)
+		self.__loaded(revision, pageSize)
+		if not snapshotted: self.__snapshot()
+
+	def __snapshot(self):
+		"""
+		Private method. Stores the local copy in the snapshot store, if one is
+		set and the copy matches a known revision of the page.
+		"""
+		if self.__snapshots is None or self.__revision is None: return
+		self.__snapshots.put(
+			self.__subreddit,
+			USERNOTES_PAGE,
+			self.__revision,
+			(self.__pageSize, self.__blobSize, self.__usernotesJSON)
+		)
+
+	def __loaded(self, revision, pageSize):
+		"""
+		Private method. Records that the local copy now matches the given 
+		revision of the usernotes page.
+		"""
+		self.__get_warnings()
+		self.__revision = revision
+		self.__pageSize = pageSize
+		self.__savedGeneration = self.__generation
+		self.__ops = []
+		self.__archive.clear()
+		if self.__refresher is not None: self.__refresher.current()
+
+	def refresh(self):
+		"""
+		Reload usernotes only if the wiki page has changed since the last load. 
+		Checking the page's latest revision is much cheaper than downloading 
+		and decoding the page, so the local copy is reused whenever it's still 
+		current. A changed page is downloaded and decoded off to the side and 
+		swapped in afterwards, so reads don't wait for it.
+
+		Edits which haven't been saved yet are replayed onto the reloaded copy,
+		as when a save conflicts, unless the usernotes JSON was changed directly.
+
+		Returns
+		-------
+		Bool
+			True if usernotes were reloaded, False if the local copy was current
+		"""
+		base = self.__revision
+		latest = None
+		if base is not None or self.__snapshots is not None:
+			latest = latest_revision(self.__subreddit, USERNOTES_PAGE)
+			if latest is not None and latest['id'] == base: return False
+		copy = None
+		if self.__snapshots is not None: copy = self.__from_snapshot(latest)
+		if copy is None: copy = self.__decode_page(READ)
+		with self.__lock.write():
+			# another thread saved or reloaded while we were downloading, and 
+			# its copy is at least as new as ours
+			if self.__revision != base: return True
+			if self.__ops: self.__rebase(copy)
+			else: self.__install(copy)
+			return True
+
+	def start_refresher(self, interval=30):
+		"""
+		Start a background thread which keeps the local copy of usernotes 
+		current. Every `interval` seconds it checks the page's latest revision, 
+		and when the page has changed, downloads and decodes it off to the side
+		and swaps it in. Reads never wait on the network. The local copy isn't
+		replaced while it has unsaved edits or a batch is open.
+
+		Parameters
+		----------
+		interval: Float
+			Optional. seconds between checks, defaults to 30
+
+		Returns
+		-------
+		RefreshStatus
+			live metrics on how current the local copy is, also available as
+			`refresh_status`
+		"""
+		if self.__refresher is None:
+			self.__refresher = BackgroundRefresher(self.__background_refresh, interval, name=f"pmtw-usernotes-{self.__subreddit}")
+			if self.__revision is not None: self.__refresher.current()
+		self.__refresher.status.interval = interval
+		self.__refresher.start()
+		return self.__refresher.status
+
+	def stop_refresher(self, timeout=None):
+		"""
+		Stop the background refresher, if one is running
+
+		Parameters
+		----------
+		timeout: Float
+			Optional. maximum seconds to wait for a check in progress to finish
+		"""
+		if self.__refresher is not None: self.__refresher.stop(timeout)
+
+	@property
+	def refresh_status(self):
+		"""
+		RefreshStatus of the background refresher, with its `staleness` in 
+		seconds, or None if it has never been started
+		"""
+		if self.__refresher is None: return None
+		return self.__refresher.status
+
+	def __background_refresh(self):
+		"""
+		Private method, run on the refresher thread. Downloads and decodes the 
+		usernotes page if it has changed, without touching the local copy, then
+		swaps the new copy in while holding the write lock.
+
+		Returns
+		-------
+		Bool
+			True if a newer copy was swapped in, False if the local copy was 
+			current, or None if it has unsaved edits and was left alone
+		"""
+		if self.dirty or self.__batch is not None: return None
+		latest = latest_revision(self.__subreddit, USERNOTES_PAGE, POLL)
+		if latest is None or latest['id'] == self.__revision: return False
+		generation = self.__generation
+		copy = None
+		if self.__snapshots is not None: copy = self.__from_snapshot(latest)
+		if copy is None: copy = self.__decode_page(POLL)
+		with self.__lock.write():
+			# something else loaded or edited usernotes while we were downloading
+			if self.__generation != generation or self.dirty or self.__batch is not None: return None
+			self.__install(copy)
+		return True
+
+	def start_write_behind(self, interval=30, maxPending=100, maxQueue=1000, spillPath=None, reason='Queued usernote updates'):
+		"""
+		Switch to write-behind mode. Notes added and removed without `lazy` are
+		applied to the local copy straight away, but only queued for saving; a 
+		background worker flushes everything queued as one save once edits 
+		have waited `interval` seconds, or as soon as `maxPending` are queued.
+
+		Parameters
+		----------
+		interval: Float
+			Optional. seconds edits may wait before being flushed, defaults to 30
+		maxPending: Integer
+			Optional. number of queued edits which triggers a flush straight 
+			away, defaults to 100
+		maxQueue: Integer
+			Optional. number of queued edits past which add and remove flush
+			the queue themselves before queuing more, slowing callers down to 
+			the rate saves can be made at. Defaults to 1000
+		spillPath: String
+			Optional. file to append each queued edit to, so edits survive a 
+			crash. If the file holds edits from an earlier run, they're queued 
+			again
+		reason: String
+			Optional, the start of the wiki page description for flushes. The 
+			number of notes added and removed is appended to it.
+
+		Returns
+		-------
+		WriteBehindStatus
+			live state of the queue, also available as `write_behind_status`
+		"""
+		if not self.__usernotesJSON: self.load()
+		with self.__lock.write():
+			self.__flushReason = reason
+			if self.__writeBehind is None:
+				self.__writeBehind = WriteBehindWorker(self.flush, interval, maxPending, maxQueue, name=f"pmtw-writebehind-{self.__subreddit}")
+			status = self.__writeBehind.status
+			status.interval, status.maxPending, status.maxQueue = interval, maxPending, maxQueue
+			if spillPath is not None and (self.__spill is None or self.__spill.path != spillPath):
+				if self.__spill is not None: self.__spill.close()
+				self.__spill = SpillFile(spillPath)
+				recovered = [self.__from_spill(edit) for edit in self.__spill.read()]
+				if recovered: self.__replay(recovered)
+				self.__sync_spill()
+			self.__writeBehind.queued(len(self.__ops))
+			self.__writeBehind.start()
+			return status
+
+	def stop_write_behind(self, flush=True, timeout=None):
+		"""
+		Leave write-behind mode, stopping the background worker
+
+		Parameters
+		----------
+		flush: Bool
+			Optional. if True, the default, queued edits are saved before 
+			returning. Otherwise they stay in the local copy, and in the spill
+			file if one is set, for a later save
+		timeout: Float
+			Optional. maximum seconds to wait for a flush in progress to finish
+
+		Returns
+		-------
+		String
+			Wiki page update description of the final flush, or None if nothing
+			was saved
+		"""
+		if self.__writeBehind is None: return None
+		self.__writeBehind.stop(timeout)
+		reason = self.flush() if flush else None
+		with self.__lock.write():
+			self.__writeBehind = None
+			if self.__spill is not None:
+				self.__spill.close()
+				self.__spill = None
+			return reason
+
+	def flush(self):
+		"""
+		Save every queued edit now, as one wiki edit. Does nothing inside a 
+		batch, which saves on exit.
+
+		Returns
+		-------
+		String
+			Wiki page update description, or None if there was nothing to save
+		"""
+		with self.__lock.write():
+			if self.__batch is not None or not self.dirty: return None
+			added = sum(1 for op in self.__ops if op[0] == 'add')
+			removed = len(self.__ops) - added
+		return self.save(f"{self.__flushReason or 'Queued usernote updates'}: added {_counted(added, 'note')} and removed {_counted(removed, 'note')}")
+
+	@property
+	def pending(self):
+		"""number of edits made since usernotes were last loaded or saved"""
+		return len(self.__ops)
+
+	@property
+	def write_behind_status(self):
+		"""
+		WriteBehindStatus of the write-behind queue, or None if write-behind 
+		mode isn't on
+		"""
+		if self.__writeBehind is None: return None
+		return self.__writeBehind.status
+
+	def __backpressure(self):
+		"""
+		Private method. Flushes the write-behind queue from the caller's thread
+		when it has grown past its limit.
+		"""
+		if self.__batch is None and len(self.__ops) >= self.__writeBehind.status.maxQueue: self.flush()
+
+	def __log(self, *op):
+		"""
+		Private method. Records an edit made to the local copy since it was 
+		loaded, for replaying onto a newer revision of the page, and queues it
+		in write-behind mode.
+		"""
+		self.__ops.append(op)
+		if self.__spill is not None: self.__spill.append(self.__to_spill(op))
+		if self.__writeBehind is not None: self.__writeBehind.queued(len(self.__ops))
+
+	def __sync_spill(self):
+		"""
+		Private method. Rewrites the spill file to hold exactly the edits still
+		logged, after some were saved, discarded or rolled back.
+		"""
+		if self.__spill is not None: self.__spill.rewrite([self.__to_spill(op) for op in self.__ops])
+		if self.__writeBehind is not None: self.__writeBehind.status.pending = len(self.__ops)
+
+	@staticmethod
+	def __to_spill(op):
+		"""Private method. Converts a logged edit to a JSON-safe dictionary."""
+		if op[0] == 'add':
+			note = op[1]
+			return {'op': 'add', 'user': note.user, 'note': note.note, 'warning': note.warning, 'time': note.time, 'mod': note.mod, 'link': note.link}
+		return {'op': 'remove', 'user': op[1], 'time': op[2]}
+
+	@staticmethod
+	def __from_spill(edit):
+		"""Private method. Converts a spilled edit back to a logged edit."""
+		if edit['op'] == 'add':
+			return ('add', ToolboxNote(edit['user'], edit['note'], warning=edit['warning'], time=edit['time'], mod=edit['mod'], link=edit['link']))
+		return ('remove', edit['user'], edit['time'])
+
+	def update_warnings(self, settingsWarnings):
+		"""
+		Replace the note types taken from Toolbox settings, for when settings 
+		are loaded after usernotes.
+
+		Parameters
+		----------
+		settingsWarnings: List
+			Note types which are in Settings which may or may not be present in
+			the usernotes wiki page
+		"""
+		with self.__lock.write():
+			self.__settingsWarnings = settingsWarnings
+			if self.__usernotesJSON: self.__get_warnings()
+
+	def add(self, note, lazy=False):
+		"""
+		takes a ToolboxNote object and adds it on Reddit.
+
+		Parameters
+		----------
+		note: ToolboxNote object
+			note to add to the wiki
+		timestamp: Int
+			if set, delete note with the specified timestamp.
+			if not set, delete all usernotes for a given user
+		lazy: Bool
+			If set to False, will immediately update the wiki page, merging the
+			note into any changes made to the page since usernotes were loaded.
+			if set to True, will only modify the local usernote copy for manual
+			saving later. Always treated as True inside a batch.
+
+		Returns
+		-------
+		String
+			string mirroring the description for the wiki update
+		Raises
+		------
+		ValueError
+			if the warning specified in the note does not exist in available 
+			warning types for the configured subreddit.
+		"""
+		if lazy == False and self.__writeBehind is not None:
+			self.__backpressure()
+			lazy = True
+		if self.__in_batch(): lazy = True
+		# conflicting saves are merged, so there's no need to reload first
+		if lazy == False and not self.__usernotesJSON: self.refresh()
+		with self.__editing():
+			user = self.__add(note)
+			if self.__in_batch(): self.__batch.added += 1
+		if lazy == False:
+			self.save(f"create new note on user '{user}'")
+			return f"create new note on user '{user}'"
+
+	def __add(self, note):
+		"""
+		Private method. Adds a ToolboxNote to the local copy of usernotes, and
+		logs the edit. Called with the write lock held.
+
+		Returns
+		-------
+		String
+			the user the note was added to, as stored on the page
+		"""
+		new_note = note.__dict__()
+		if new_note['m'] == 'None':
+			new_note['m'] = self.__subreddit._reddit.user.me().name
+		if new_note['w'] not in self.warnings:
+				raise ValueError(f"{new_note['w']} is not a valid warning type")
+
+		new_note['m'] = self.__get_mod_index(new_note['m'])
+		if new_note['w'] == 'None': new_note['w'] = self.__get_warning_index(None)
+		else: new_note['w'] = self.__get_warning_index(new_note['w'])
+
+		user = self.__match_username(note.user)
+		self.__touch(user)
+		self.__log('add', note)
+		if self.__timeIndex is not None: self.__timeIndex.add(new_note['t'], user)
+		users = self.__usernotesJSON['users']
+		if user in users:
+			# replaced rather than changed in place, for readers iterating the old entry
+			users[user] = dict(users[user], ns=[new_note] + users[user]['ns'])
+		else:
+			users[user] = {'ns': [new_note]}
+			self.__usernameIndex[user.casefold()] = user
+		return user
+
+	def remove(self, user, timestamp=-1, lazy=False):
+		"""
+		removes a specified user note, or all notes for a user. 
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to remove notes for
+		timestamp: Int
+			Optional. if set, delete note with the specified timestamp.
+			if not set, delete all usernotes for a given user
+		lazy: Bool
+			Optional. If set to False, will immediately update the wiki page. if
+			set to True, will only modify the local usernote copy for manual 
+			saving later. Always treated as True inside a batch.
+
+		Returns
+		-------
+		String
+			string mirroring what's put on the wiki
+
+		Raises
+		------
+		KeyError
+			if the note for the given timestamp isn't found
+
+		"""
+		user = str(user)
+		if lazy == False and self.__writeBehind is not None:
+			self.__backpressure()
+			lazy = True
+		if self.__in_batch(): lazy = True
+		# reloaded before taking the lock, so reads carry on during the download
+		if lazy == False: self.refresh()
+		with self.__editing():
+			count, description = self.__remove(self.__match_username(user), timestamp)
+			if self.__in_batch():
+				self.__batch.removed += count
+				if timestamp == -1: self.__batch.purged += 1
+		if lazy == False: self.save(description)
+		return description
+
+	def __remove(self, user, timestamp=-1):
+		"""
+		Private method. Removes a note, or all notes for a user, from the 
+		local copy of usernotes, and logs the edit. Called with the write lock
+		held.
+
+		Returns
+		-------
+		Tuple
+			the number of notes removed, and a description of the removal
+		"""
+		if timestamp == -1:
+			# raises KeyError for an unknown user before anything is marked changed
+			removed = self.__usernotesJSON['users'].pop(user)
+			self.__touch(user)
+			self.__usernameIndex.pop(user.casefold(), None)
+			for note in removed['ns']: self.__log('remove', user, note['t'])
+			if self.__timeIndex is not None:
+				for note in removed['ns']: self.__timeIndex.remove(note['t'], user)
+			return len(removed['ns']), f"Deleted all notes on {user}"
+		else:
+			notes_on_user = list(self.__usernotesJSON['users'][user]['ns'])
+			deleted = False
+			for i in range(len(notes_on_user)):
+				if notes_on_user[i]['t'] == timestamp:
+					notes_on_user.pop(i)
+					deleted = True
+					break
+			if deleted == False: raise KeyError(f"failed to find note timestamped {timestamp} for {user}")
+			# replaced rather than changed in place, for readers iterating the old entry
+			self.__usernotesJSON['users'][user] = dict(self.__usernotesJSON['users'][user], ns=notes_on_user)
+			self.__touch(user)
+			self.__log('remove', user, timestamp)
+			if self.__timeIndex is not None: self.__timeIndex.remove(timestamp, user)
+			# Delete the user from the database if there are no notes left
+			if len(notes_on_user) == 0:
+				del self.__usernotesJSON['users'][user]
+				self.__usernameIndex.pop(user.casefold(), None)
+				return 1, f"delete all notes on user '{user}'"
+			else:
+				return 1, f"delete note {timestamp} on user '{user}'"
+
+	def has_notes(self, user, lazy=True):
+		"""
+		Checks whether a user has notes, without building any. Users without 
+		notes are turned away by the casefolded username index, which makes 
+		this cheap enough to call for every comment. Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to check
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before checking
+
+		Returns
+		-------
+		Bool
+			True if the user has notes on the usernotes page
+		"""
+		if lazy == False: self.refresh()
+		user = str(user)
+		with self.__lock.read():
+			name = self.__usernameIndex.get(user.casefold())
+			if name is None: return False
+			return self.__summary_index().summary(name) is not None
+
+	def note_summary(self, user, lazy=True):
+		"""
+		Summarizes a user's notes without building them. Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to summarize
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before summarizing
+
+		Returns
+		-------
+		NoteSummary
+			the user's note count and the time and warning of their newest 
+			note, or None if the user has no notes
+		"""
+		if lazy == False: self.refresh()
+		user = str(user)
+		with self.__lock.read():
+			name = self.__usernameIndex.get(user.casefold())
+			if name is None: return None
+			summary = self.__summary_index().summary(name)
+			if summary is None: return None
+			count, latestTime, latestWarning = summary
+			return NoteSummary(name, count, latestTime, self.__usernotesJSON['constants']['warnings'][latestWarning])
+
+	def list_users(self, lazy=True):
+		"""
+		Returns a list of all users with notes.
+
+		Parameters
+		----------
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before listing
+
+		Returns
+		-------
+		List
+			list of strings of every user with usernotes
+		"""
+		if lazy == False: self.refresh()
+		with self.__lock.read(): return list(self.__usernotesJSON['users'].keys())
+
+	def list_notes(self, user, lazy=True, reverse=False, archived=False):
+		"""
+		Returns a list of all notes for the specified user. Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to fetch notes for
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before listing
+		reverse: Bool
+			if set to True, display newest notes first
+		archived: Bool
+			if set to True, include the user's notes from archive pages. Only 
+			the archive pages holding notes for the user are fetched
+
+		Returns
+		-------
+		List
+			list containing ToolboxUsernotes
+
+		Raises
+		------
+		KeyError
+			if user doesn't exist in usernotes
+
+		"""	
+		if lazy == False: self.refresh()
+		notes = list(self.iter_notes(user))
+		if archived: notes.extend(self.__archived_notes(user, notes))
+		return sorted(notes, key = lambda x: x.time, reverse=reverse)
+
+	def list_archived_notes(self, user, reverse=False):
+		"""
+		Returns a list of the specified user's notes from the archive pages. 
+		Only the archive pages holding notes for the user are fetched. 
+		Case-insensitive
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			user to fetch notes for
+		reverse: Bool
+			if set to True, display newest notes first
+
+		Returns
+		-------
+		List
+			list containing ToolboxNotes
+		"""
+		return sorted(self.__archived_notes(user), key = lambda x: x.time, reverse=reverse)
+
+	def __archived_notes(self, user, current=[]):
+		"""
+		Private method. Builds ToolboxNotes for a user's archived notes, leaving
+		out any that are also in `current`, as happens when a save fails after 
+		its notes were archived.
+		"""
+		seen = {(note.time, note.note) for note in current}
+		notes = []
+		for name, note in self.__archive.notes_for(str(user)):
+			if (note['t'], note['n']) in seen: continue
+			notes.append(ToolboxNote(name, note['n'], warning=note['w'], time=note['t'], mod=note['m'], link=note['l']))
+		return notes
+
+	def list_all_notes(self, lazy=True, reverse=False):
+		"""
+		Returns a list of all notes in the wiki
+
+		Parameters
+		----------
+		lazy: Bool
+			if set to True, reload a fresh copy of usernotes before listing
+		reverse: Bool
+			If True, notes are listed newest to oldest
+		Returns
+		-------
+		List
+			list containing ToolboxUsernotes
+		"""	
+		if lazy == False: self.refresh()
+		return sorted(self.iter_notes(), key = lambda x: x.time, reverse=reverse)
+
+	def iter_users(self, lazy=True):
+		"""
+		Yields every user who had notes when iteration started, one at a time.
+		Notes can be added and removed while the generator is in use.
+
+		Parameters
+		----------
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before iterating
+
+		Yields
+		------
+		String
+			username of each user with usernotes
+		"""
+		if lazy == False: self.refresh()
+		with self.__lock.read(): users = list(self.__usernotesJSON['users'])
+		yield from users
+
+	def iter_notes(self, user=None, warning=None, mod=None, lazy=True):
+		"""
+		Yields notes straight from the decoded usernotes, building each 
+		ToolboxNote only once it has passed the filters. Notes are yielded in 
+		the order they're stored in the wiki, not sorted by time, from the 
+		notes as they were when iteration started; notes can be added and 
+		removed while the generator is in use.
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			Optional. Only yield notes for this user. Case-insensitive
+		warning: String, List
+			Optional. Only yield notes of this warning type, or of any of the 
+			warning types in a list
+		mod: String, praw.redditor, List
+			Optional. Only yield notes left by this mod, or by any of the mods 
+			in a list
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before iterating
+
+		Yields
+		------
+		ToolboxNote
+			each note matching the filters
+		"""
+		if lazy == False: self.refresh()
+		with self.__lock.read():
+			# user entries are replaced rather than edited, so a shallow copy 
+			# of the users holds still while the notes are built
+			users = self.__usernotesJSON['users']
+			constants = dict(self.__usernotesJSON['constants'])
+			if user is None: entries = list(users.items())
+			else:
+				name = self.__match_username(str(user))
+				entries = [(name, users[name])] if name in users else []
+
+			# resolve the filters to the indexes stored in the notes once, rather 
+			# than expanding every note to compare names
+			warning = self.__resolve_warnings(warning)
+			mod = self.__resolve_mods(mod)
+		if warning == set() or mod == set(): return
+
+		for name, entry in entries:
+			for note in entry['ns']:
+				if warning is not None and note['w'] not in warning: continue
+				if mod is not None and note['m'] not in mod: continue
+				yield self.__build_note(name, note, constants)
+
+	def notes_between(self, after=None, before=None, reverse=False, lazy=True):
+		"""
+		Returns notes in a time range, using a time-ordered index rather than 
+		scanning every note.
+
+		Parameters
+		----------
+		after: Integer
+			Optional. only return notes newer than this unix timestamp
+		before: Integer
+			Optional. only return notes older than this unix timestamp
+		reverse: Bool
+			If True, notes are listed newest to oldest
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before listing
+
+		Returns
+		-------
+		List
+			list containing ToolboxNotes, in chronological order
+		"""
+		if lazy == False: self.refresh()
+		with self.__lock.read():
+			keys = self.__time_index().between(after, before, reverse)
+			return [self.__build_note(user, note) for user, ordinal, note in self.__notes_at(keys)]
+
+	def newest_notes(self, count, lazy=True):
+		"""
+		Returns the newest notes across all users, newest first.
+
+		Parameters
+		----------
+		count: Integer
+			number of notes to return
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before listing
+
+		Returns
+		-------
+		List
+			list containing up to `count` ToolboxNotes
+		"""
+		if lazy == False: self.refresh()
+		notes = []
+		with self.__lock.read():
+			for user, ordinal, note in self.__notes_at(self.__time_index().between(reverse=True)):
+				if len(notes) == count: break
+				notes.append(self.__build_note(user, note))
+		return notes
+
+	def query(self, user=None, mod=None, warning=None, after=None, before=None, text=None, pattern=None, hasLink=None, reverse=False, limit=None, cursor=None, lazy=True):
+		"""
+		Search notes with any combination of filters in a single pass. Filters 
+		are compiled once, checked against the raw notes, and only notes that 
+		pass all of them are built into ToolboxNotes. Notes are visited in time
+		order through the time index, so the scan stops as soon as `limit` 
+		results are found.
+
+		Parameters
+		----------
+		user: String, praw.redditor
+			Optional. only match notes for this user. Case-insensitive
+		mod: String, praw.redditor, List
+			Optional. only match notes left by this mod, or any mod in a list
+		warning: String, List
+			Optional. only match notes of this warning type, or any in a list
+		after: Integer
+			Optional. only match notes newer than this unix timestamp
+		before: Integer
+			Optional. only match notes older than this unix timestamp
+		text: String
+			Optional. case-insensitive substring to look for in the note text
+		pattern: String, re.Pattern
+			Optional. regular expression to search for in the note text
+		hasLink: Bool
+			Optional. if True, only match notes with a link; if False, only 
+			match notes without one
+		reverse: Bool
+			If True, results are ordered newest to oldest
+		limit: Integer
+			Optional. maximum number of notes to return
+		cursor: String
+			Optional. the cursor from a previous page of results, to continue 
+			from where that page ended. Other arguments should be the same as 
+			for the previous page.
+		lazy: Bool
+			if set to False, reload a fresh copy of usernotes before searching
+
+		Returns
+		-------
+		QueryPage
+			`notes`, a list of matching ToolboxNotes, and `cursor`, which can be
+			passed back to fetch the next page. `cursor` is None once there are 
+			no more results.
+
+		Raises
+		------
+		ValueError
+			if the cursor is malformed
+		"""
+		if lazy == False: self.refresh()
+		# a cursor is the (timestamp, user, ordinal) of the last note returned;
+		# the scan starts at its (timestamp, user) pair and skips notes up to 
+		# and including it
+		position = None
+		if cursor is not None: position = NoteQuery.decode_cursor(cursor)
+
+		notes = []
+		with self.__lock.read():
+			for name, ordinal, note in self.__query(user, mod, warning, after, before, text, pattern, hasLink, reverse, position):
+				notes.append(self.__build_note(name, note))
+				if limit is not None and len(notes) >= limit:
+					return QueryPage(notes, NoteQuery.encode_cursor(note['t'], name, ordinal))
+		return QueryPage(notes, None)
+
+	def iter_query(self, user=None, mod=None, warning=None, after=None, before=None, text=None, pattern=None, hasLink=None, reverse=False, lazy=True):
+		"""
+		Generator counterpart to `query`, yielding every matching note in time 
+		order without building them all first. Takes the same filters as 
+		`query`. The matches are found when iteration starts, so notes can be 
+		added and removed while the generator is in use.
+
+		Yields
+		------
+		ToolboxNote
+			each note matching the filters
+		"""
+		if lazy == False: self.refresh()
+		with self.__lock.read():
+			constants = dict(self.__usernotesJSON['constants'])
+			matches = [(name, note) for name, ordinal, note in self.__query(user, mod, warning, after, before, text, pattern, hasLink, reverse)]
+		for name, note in matches:
+			yield self.__build_note(name, note, constants)
+
+	def __query(self, user, mod, warning, after, before, text, pattern, hasLink, reverse, position=None):
+		"""
+		Private method. Yields (user, ordinal, note) for every raw note 
+		matching the filters, in time order, starting after `position` if set.
+		"""
+		mods = self.__resolve_mods(mod)
+		warnings = self.__resolve_warnings(warning)
+		if mods == set() or warnings == set(): return
+		compiled = NoteQuery(mods, warnings, after, before, text, pattern, hasLink)
+
+		if user is None:
+			start = position[:2] if position is not None else None
+			keys = self.__time_index().between(after, before, reverse, start=start)
+		else:
+			name = self.__match_username(str(user))
+			entry = self.__usernotesJSON['users'].get(name, {'ns': []})
+			times = {note['t'] for note in entry['ns']}
+			keys = sorted(((time, name) for time in times), reverse=reverse)
+
+		for name, ordinal, note in self.__notes_at(keys):
+			if position is not None:
+				key = (note['t'], name)
+				if key == position[:2]:
+					if ordinal <= position[2]: continue
+				elif (key > position[:2]) == reverse: continue
+			if compiled.matches(note): yield name, ordinal, note
+
+	def stream(self, pause_after=None, skip_existing=False, checkpoint=None):
+		"""
+		Yields new WikiRevision objects as they become available
+
+		Parameters
+		----------
+		pause_after: [Optional] Integer (Default: `None`)
+			An integer representing the number of requests that result in no new 
+			items before this function yields `None`, effectively introducing a 
+			pause into the stream. A negative value yields `None` after items 
+			from a single response have been yielded, regardless of number of new 
+			items obtained in that response. A value of `0` yields `None` after 
+			every response resulting in no new items, and a value of `None` never 
+			introduces a pause.
+		skip_existing: [Optional] Boolean (Default: False)
+			When `True`, this does not yield any results from the first request 
+			thereby skipping any items that existed in the stream prior to starting 
+			the stream.
+		checkpoint: [Optional] CheckpointStore (Default: `None`)
+			store to resume the stream from after a restart, and to save its 
+			progress to
+
+		Yields
+		------
+		WikiRevision objects
+		
+		"""
+		for revision in revisions_stream(
+			sub=self.__subreddit,
+			page=USERNOTES_PAGE,
+			pause_after = pause_after,
+			skip_existing = skip_existing,
+			checkpoint = checkpoint
+		):
+			yield revision
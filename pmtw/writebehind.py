@@ -0,0 +1,200 @@
+"""
+Write-behind support for usernotes: a worker thread which flushes queued edits
+in the background, and a file which keeps queued edits across crashes
+"""
+
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+@dataclass
+class WriteBehindStatus:
+	"""The state of a write-behind queue"""
+	interval: float
+	maxPending: int
+	maxQueue: int
+	pending: int = 0
+	running: bool = False
+	flushes: int = 0
+	failures: int = 0
+	lastFlush: Optional[float] = None
+	lastError: Optional[BaseException] = None
+
+
+class SpillFile:
+	"""
+	Queued edits kept in a JSON Lines file, so they survive the process
+	crashing before they're flushed. Each edit is appended and fsynced as it's
+	queued; the file is rewritten atomically when the queue shrinks.
+	"""
+	def __init__(self, path):
+		"""
+		Parameters
+		----------
+		path: String
+			path of the file, created on the first edit
+		"""
+		self.path = path
+		self.__file = None
+
+	def __repr__(self):
+		"""Set display for a SpillFile object"""
+		return f"SpillFile(path='{self.path}')"
+
+	def read(self):
+		"""
+		Returns
+		-------
+		List
+			the edits in the file, oldest first. A line left half-written by a
+			crash is ignored
+		"""
+		edits = []
+		try:
+			with open(self.path) as f:
+				for line in f:
+					try:
+						edits.append(json.loads(line))
+					except ValueError:
+						break
+		except FileNotFoundError:
+			pass
+		return edits
+
+	def append(self, edit):
+		"""
+		Parameters
+		----------
+		edit: Dictionary
+			the edit to add to the file
+		"""
+		if self.__file is None: self.__file = open(self.path, 'a')
+		self.__file.write(json.dumps(edit) + "\n")
+		self.__file.flush()
+		os.fsync(self.__file.fileno())
+
+	def rewrite(self, edits):
+		"""
+		Replace the contents of the file
+
+		Parameters
+		----------
+		edits: List
+			the edits still queued
+		"""
+		self.close()
+		temporary = f"{self.path}.tmp"
+		with open(temporary, 'w') as f:
+			for edit in edits: f.write(json.dumps(edit) + "\n")
+			f.flush()
+			os.fsync(f.fileno())
+		os.replace(temporary, self.path)
+
+	def close(self):
+		"""Close the file, if it's open"""
+		if self.__file is not None:
+			self.__file.close()
+			self.__file = None
+
+
+class WriteBehindWorker:
+	"""
+	Daemon thread which calls `flush` whenever edits have been queued for
+	`interval` seconds, or as soon as `maxPending` edits are queued. Failed
+	flushes leave the edits queued, and are retried with a growing delay.
+	"""
+	def __init__(self, flush, interval=30, maxPending=100, maxQueue=1000, name=None):
+		"""
+		Constructor for the WriteBehindWorker class.
+
+		Parameters
+		----------
+		flush: Callable
+			called with no arguments on the worker thread to save queued edits
+		interval: Float
+			Optional. seconds edits may wait before being flushed
+		maxPending: Integer
+			Optional. number of queued edits which triggers a flush straight away
+		maxQueue: Integer
+			Optional. number of queued edits past which callers flush themselves
+		name: String
+			Optional. name for the thread
+		"""
+		self.status = WriteBehindStatus(interval, maxPending, maxQueue)
+		self.__flush = flush
+		self.__name = name
+		self.__wake = threading.Event()
+		self.__stop = threading.Event()
+		self.__thread = None
+
+	def __repr__(self):
+		"""Set display for a WriteBehindWorker object"""
+		return f"WriteBehindWorker(pending={self.status.pending}, running={self.status.running})"
+
+	def start(self):
+		"""Start the worker thread, if it isn't already running"""
+		if self.__thread is not None and self.__thread.is_alive(): return
+		self.__stop.clear()
+		self.__thread = threading.Thread(target=self.__run, name=self.__name, daemon=True)
+		self.__thread.start()
+		self.status.running = True
+
+	def stop(self, timeout=None):
+		"""
+		Stop the worker thread, waiting for a flush in progress to finish
+
+		Parameters
+		----------
+		timeout: Float
+			Optional. maximum seconds to wait for the thread
+		"""
+		self.__stop.set()
+		self.__wake.set()
+		if self.__thread is not None and self.__thread is not threading.current_thread():
+			self.__thread.join(timeout)
+		self.status.running = False
+
+	def queued(self, pending):
+		"""
+		Record the number of queued edits, waking the worker if it has reached
+		`maxPending`
+
+		Parameters
+		----------
+		pending: Integer
+			the number of edits now queued
+		"""
+		self.status.pending = pending
+		if pending >= self.status.maxPending: self.__wake.set()
+
+	def flushed(self, pending=0):
+		"""
+		Record a successful flush
+
+		Parameters
+		----------
+		pending: Integer
+			Optional. the number of edits still queued
+		"""
+		self.status.pending = pending
+		self.status.flushes += 1
+		self.status.lastFlush = time.time()
+
+	def __run(self):
+		"""Private method. The worker thread's loop."""
+		failing = 0
+		while not self.__stop.is_set():
+			self.__wake.wait(self.status.interval * min(16, 2 ** failing))
+			self.__wake.clear()
+			if self.__stop.is_set(): break
+			if self.status.pending == 0: continue
+			try:
+				self.__flush()
+				failing = 0
+			except Exception as e:
+				failing += 1
+				self.status.failures += 1
+				self.status.lastError = e
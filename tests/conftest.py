@@ -0,0 +1,93 @@
+"""
+An in-memory stand-in for the parts of a praw subreddit pmtw uses, so
+usernotes can be loaded, edited and saved without talking to Reddit
+"""
+
+import itertools
+import json
+from types import SimpleNamespace
+
+import pytest
+from prawcore.exceptions import NotFound
+
+from pmtw.codec import deflate_blob
+
+_revisionIds = itertools.count(1)
+
+
+class FakeWikiPage:
+	def __init__(self, wiki, name):
+		self.wiki = wiki
+		self.name = name
+		self.mod = SimpleNamespace(update=lambda **settings: None)
+
+	def __latest(self):
+		history = self.wiki.history.get(self.name)
+		if not history: raise NotFound(SimpleNamespace(status_code=404, headers={}, text=''))
+		return history[-1]
+
+	@property
+	def content_md(self):
+		return self.__latest()['content']
+
+	@property
+	def revision_id(self):
+		return self.__latest()['id']
+
+	def edit(self, content, reason=None, **other_settings):
+		self.wiki.push(self.name, content, reason)
+
+	def revisions(self, limit=None):
+		history = list(reversed(self.wiki.history.get(self.name, [])))
+		return iter(history[:limit])
+
+
+class FakeWiki:
+	def __init__(self, subreddit):
+		self.subreddit = subreddit
+		self.history = {}
+
+	def __getitem__(self, name):
+		return FakeWikiPage(self, name)
+
+	def push(self, name, content, reason=None):
+		self.history.setdefault(name, []).append({
+			'id': str(next(_revisionIds)),
+			'content': content,
+			'reason': reason,
+			'author': self.subreddit._reddit.user.me().name
+		})
+
+	def create(self, name, content, reason=None, **other_settings):
+		self.push(name, content, reason)
+		return self[name]
+
+
+class FakeReddit:
+	def __init__(self):
+		me = SimpleNamespace(name='testmod')
+		self.user = SimpleNamespace(me=lambda: me)
+		self.auth = SimpleNamespace(limits={})
+
+
+class FakeSubreddit:
+	def __init__(self, name='testsub'):
+		self.display_name = name
+		self._reddit = FakeReddit()
+		self.wiki = FakeWiki(self)
+
+	def __str__(self):
+		return self.display_name
+
+
+@pytest.fixture
+def subreddit():
+	"""A fake subreddit whose usernotes page has notes on two users"""
+	sub = FakeSubreddit()
+	users = {
+		'User0': {'ns': [{'n': 'first', 't': 1000, 'm': 0, 'w': 0, 'l': ''}]},
+		'User1': {'ns': [{'n': 'second', 't': 1010, 'm': 0, 'w': 1, 'l': 'l,abc,def'}]}
+	}
+	page = {'ver': 6, 'constants': {'users': ['modA'], 'warnings': ['spamwatch', 'ban']}, 'blob': deflate_blob(users)}
+	sub.wiki.push('usernotes', json.dumps(page), 'init')
+	return sub
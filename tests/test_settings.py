@@ -0,0 +1,23 @@
+import json
+
+from pmtw import ToolboxSettings
+from pmtw.settings import DomainTag
+
+
+def test_refresher_keeps_a_save_made_during_its_download(subreddit):
+	settings = ToolboxSettings(subreddit)
+	page = json.loads(subreddit.wiki.history['toolbox'][-1]['content'])
+	page['domainTags'] = [{'name': 'external.example', 'color': '#ff0000'}]
+	subreddit.wiki.push('toolbox', json.dumps(page), 'someone else')
+
+	download = settings._ToolboxSettings__download
+	def racing_download(priority):
+		downloaded = download(priority)
+		settings.domainTags = [DomainTag('ours.example', '#00ff00')]
+		settings.save('ours')
+		return downloaded
+	settings._ToolboxSettings__download = racing_download
+
+	assert settings._ToolboxSettings__background_refresh() is None
+	assert settings.domainTags == [DomainTag('ours.example', '#00ff00')]
+	assert settings.save('again') is None
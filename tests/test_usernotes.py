@@ -0,0 +1,114 @@
+import copy
+import pickle
+import threading
+
+from pmtw import ToolboxNote, ToolboxUsernotes
+from pmtw.indexes import SummaryIndex, TimeIndex
+
+
+def test_load_keeps_queued_write_behind_edits(subreddit, tmp_path):
+	spill = tmp_path / "spill.jsonl"
+	usernotes = ToolboxUsernotes(subreddit)
+	usernotes.start_write_behind(interval=3600, maxPending=1000, spillPath=str(spill))
+	try:
+		usernotes.add(ToolboxNote("User2", "queued", warning="ban", mod="modA", time=2000))
+		usernotes.remove("User0", 1000)
+		usernotes.load()
+
+		assert usernotes.pending == 2
+		assert len(spill.read_text().splitlines()) == 2
+		assert [note.note for note in usernotes.list_notes("User2")] == ["queued"]
+		assert "User0" not in usernotes.list_users()
+	finally:
+		usernotes.stop_write_behind()
+
+	saved = ToolboxUsernotes(subreddit)
+	assert [note.note for note in saved.list_notes("User2")] == ["queued"]
+	assert "User0" not in saved.list_users()
+
+
+def test_note_survives_pickle_and_deepcopy():
+	note = ToolboxNote("User0", "text", warning="ban", mod="modA", time=1000, link="l,abc,def")
+	expected = (note.url, note.human_time)
+	for copied in (
+		pickle.loads(pickle.dumps(ToolboxNote("User0", "text", warning="ban", mod="modA", time=1000, link="l,abc,def"))),
+		copy.deepcopy(ToolboxNote("User0", "text", warning="ban", mod="modA", time=1000, link="l,abc,def")),
+		pickle.loads(pickle.dumps(note))
+	):
+		assert (copied.user, copied.note, copied.warning, copied.time, copied.mod, copied.link) == ("User0", "text", "ban", 1000, "modA", "l,abc,def")
+		assert (copied.url, copied.human_time) == expected
+
+
+def test_edits_during_a_save_are_kept_for_the_next(subreddit):
+	usernotes = ToolboxUsernotes(subreddit)
+	wiki = subreddit.wiki
+	push = wiki.push
+
+	def slow_push(name, content, reason=None):
+		# another thread edits while the first save's wiki edit is in flight
+		if name == 'usernotes' and reason.startswith('first'):
+			editor = threading.Thread(target=usernotes.add, args=(ToolboxNote("User3", "during", mod="modA", time=3000), True))
+			editor.start()
+			editor.join(5)
+			assert not editor.is_alive()
+		push(name, content, reason)
+
+	wiki.push = slow_push
+	usernotes.add(ToolboxNote("User2", "before", mod="modA", time=2000), lazy=True)
+	usernotes.save("first")
+	wiki.push = push
+
+	assert usernotes.dirty and usernotes.pending == 1
+	assert usernotes.save("second") is not None
+	saved = ToolboxUsernotes(subreddit)
+	assert [note.note for note in saved.list_notes("User2")] == ["before"]
+	assert [note.note for note in saved.list_notes("User3")] == ["during"]
+	assert len(wiki.history['usernotes']) == 3
+
+
+def test_time_index_is_built_once_by_concurrent_readers(subreddit, monkeypatch):
+	usernotes = ToolboxUsernotes(subreddit)
+	builds = []
+	started = threading.Barrier(4)
+
+	class SlowTimeIndex(TimeIndex):
+		def __init__(self, users=None):
+			builds.append(threading.get_ident())
+			threading.Event().wait(0.05)
+			super().__init__(users)
+
+	monkeypatch.setattr("pmtw.usernotes.TimeIndex", SlowTimeIndex)
+	results = []
+	def read():
+		started.wait()
+		results.append([note.note for note in usernotes.notes_between()])
+	readers = [threading.Thread(target=read) for i in range(4)]
+	for reader in readers: reader.start()
+	for reader in readers: reader.join(5)
+
+	assert len(builds) == 1
+	assert results == [["first", "second"]] * 4
+
+
+def test_summary_index_is_built_once_by_concurrent_readers(subreddit, monkeypatch):
+	usernotes = ToolboxUsernotes(subreddit)
+	builds = []
+	started = threading.Barrier(4)
+
+	class SlowSummaryIndex(SummaryIndex):
+		def __init__(self, users):
+			builds.append(threading.get_ident())
+			threading.Event().wait(0.05)
+			super().__init__(users)
+
+	monkeypatch.setattr("pmtw.usernotes.SummaryIndex", SlowSummaryIndex)
+	results = []
+	def read():
+		started.wait()
+		results.append(usernotes.has_notes("user1"))
+	readers = [threading.Thread(target=read) for i in range(4)]
+	for reader in readers: reader.start()
+	for reader in readers: reader.join(5)
+
+	assert len(builds) == 1
+	assert results == [True] * 4